@@ -0,0 +1,170 @@
+import os
+import os.path
+import json
+from datetime import datetime
+from math import isnan
+
+from constants import *
+import utils
+
+
+
+
+"""
+Class for a persistent running accumulator of the daily statistics.
+With each new measurement, the running minimum, maximum, trapezoidal
+time integral, and integral of the unix time (for the time centroid)
+of every quantity are updated. At midnight, the statistics of the
+finished day are kept, so that the daily mode only has to read them
+instead of reading and parsing the data of the last 24 hours.
+The measurement at the first time of a new day is included in the
+statistics of both days, so that the finished day covers full 24 hours.
+
+The accumulator is stored as a JSON file in PATH_DATA. The statistics of
+one day are stored as a dict with the following keys:
+ * 'date': date of the day, formatted as %Y-%m-%d
+ * 'unix_time_last': unix time of the last measurement
+ * 'values_last': dict, last measured value of each quantity
+ * 'min', 'max', 'integral', 'duration', 'integral_time': dicts, statistics
+   of each quantity (the quantities are keyed by their names in DICT_IDX_COLUMNS)
+
+Members:
+    filepath    string, path of the JSON file of the accumulator
+    current     dict, statistics of the current day (None if there are no data yet)
+    finished    list of dicts, statistics of the last finished days
+"""
+class DailyAccumulator:
+
+    """
+    Constructor, sets the file path and reads the accumulator if it exists.
+
+    @param filename     string, name of the JSON file in PATH_DATA
+    """
+    def __init__(self, filename=FILE_DAILY_ACCUMULATOR):
+        self.filepath = os.path.join(PATH_DATA, filename)
+        self.current = None
+        self.finished = []
+
+        if os.path.isfile(self.filepath):
+            with open(self.filepath, 'r') as file_accumulator:
+                accumulator = json.load(file_accumulator)
+            self.current = accumulator['current']
+            self.finished = accumulator['finished']
+
+
+
+    """
+    Writes the accumulator to its file. The file is replaced atomically.
+
+    @return     int, number of bytes written
+    """
+    def write(self):
+        data = json.dumps({'current': self.current, 'finished': self.finished})
+        with open(self.filepath + '.tmp', 'w') as file_accumulator:
+            file_accumulator.write(data)
+            utils.sync_file(file_accumulator)
+        os.replace(self.filepath + '.tmp', self.filepath)
+        return len(data)
+
+
+
+    """
+    Starts the statistics of a new day with a single measurement.
+
+    @param date         string, date of the day, formatted as %Y-%m-%d
+    @param unix_time    float, unix time of the measurement
+    @param values       dict, maps the column indices (IDX_*) to the values
+    """
+    def start_day(self, date, unix_time, values):
+        self.current = {'date': date,
+                        'unix_time_last': unix_time,
+                        'values_last': {},
+                        'min': {},
+                        'max': {},
+                        'integral': {},
+                        'duration': {},
+                        'integral_time': {}}
+
+        for index, column in DICT_IDX_COLUMNS.items():
+            self.current['values_last'][column] = None
+            self.current['min'][column] = None
+            self.current['max'][column] = None
+            self.current['integral'][column] = 0.
+            self.current['duration'][column] = 0.
+            self.current['integral_time'][column] = 0.
+        self.add_measurement(unix_time, values)
+
+
+
+    """
+    Adds a measurement to the statistics of the current day. The segment
+    from the last measurement is only integrated, if both values exist
+    and the time between them does not exceed TIME_GAP_MAX.
+
+    @param unix_time    float, unix time of the measurement
+    @param values       dict, maps the column indices (IDX_*) to the values
+    """
+    def add_measurement(self, unix_time, values):
+        day = self.current
+        dt = unix_time - day['unix_time_last']
+
+        for index, column in DICT_IDX_COLUMNS.items():
+            value = values[index]
+            value_last = day['values_last'][column]
+            if isnan(value):
+                day['values_last'][column] = None
+                continue
+
+            if value_last is not None and 0. < dt <= TIME_GAP_MAX:
+                day['integral'][column] += 0.5*(value_last + value)*dt
+                day['duration'][column] += dt
+                day['integral_time'][column] += 0.5*(day['unix_time_last'] + unix_time)*dt
+
+            day['min'][column] = value if day['min'][column] is None else min(day['min'][column], value)
+            day['max'][column] = value if day['max'][column] is None else max(day['max'][column], value)
+            day['values_last'][column] = value
+
+        day['unix_time_last'] = unix_time
+
+
+
+    """
+    Updates the accumulator with a new measurement. If the measurement
+    belongs to a new day, the statistics of the current day are finished
+    (including this measurement) and a new day is started.
+
+    @param unix_time    float, unix time of the measurement
+    @param values       dict, maps the column indices (IDX_*) to the values
+    """
+    def update(self, unix_time, values):
+        date = datetime.fromtimestamp(unix_time).strftime('%Y-%m-%d')
+
+        if self.current is None:
+            self.start_day(date, unix_time, values)
+            return
+
+        self.add_measurement(unix_time, values)
+        if date != self.current['date']:
+            self.finished = (self.finished + [self.current])[-NUMBER_OF_ACCUMULATED_DAYS:]
+            self.start_day(date, unix_time, values)
+
+
+
+    """
+    Returns the statistics of a quantity for a finished day.
+
+    @param date     string, date of the day, formatted as %Y-%m-%d
+    @param index    int, column index (IDX_*) of the quantity
+
+    @return         dict with the keys 'min', 'max', 'avg', and 'unix_time_avg',
+                    None if there are no statistics for the given day and quantity
+    """
+    def get_day_stats(self, date, index):
+        column = DICT_IDX_COLUMNS[index]
+        for day in self.finished:
+            if day['date'] == date and day['duration'][column] > 0.:
+                return {'min': day['min'][column],
+                        'max': day['max'][column],
+                        'avg': day['integral'][column]/day['duration'][column],
+                        'unix_time_avg': day['integral_time'][column]/day['duration'][column]}
+        return None
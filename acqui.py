@@ -1,11 +1,90 @@
-from subprocess import check_output 
+from subprocess import check_output
+import os
+import time
+import fcntl
+import logging
+import threading
 
 #Import library for BMP085 barometric pressure/temperature/altitude Sensor.
-#These libraries must be installed manually. 
+#These libraries must be installed manually.
 #Adjust those imports if you use different sensors.
 import Adafruit_BMP.BMP085 as BMP085
 
 from constants import *
+import aggregate
+
+
+
+"""
+Returns the sea-level pressure for a pressure measured at a given altitude
+(with the same barometric formula as the BMP085 library).
+
+@param pressure     float, pressure measured at the altitude
+@param altitude     float, altitude in m
+
+@return             float, sea-level pressure (in the unit of pressure)
+"""
+def get_sealevel_pressure(pressure, altitude):
+    return pressure/pow(1.0 - altitude/44330.0, 5.255)
+
+
+
+"""
+Returns the compensated temperature and pressure of the BMP085 for a raw 
+temperature and a raw pressure value, with the calibration data of the sensor
+and the same integer arithmetic as the BMP085 library (see the datasheet).
+Thus, a measurement only needs one conversion of each value, whereas 
+read_pressure of the library converts the temperature again.
+
+@param bmp085           BMP085 object, provides the calibration data and the mode
+@param temperature_raw  int, raw temperature value (UT)
+@param pressure_raw     int, raw pressure value (UP)
+
+@return temperature     float, temperature (in degC)
+@return pressure        int, pressure (in Pa)
+"""
+def get_bmp085_compensated_values(bmp085, temperature_raw, pressure_raw):
+    x1 = ((temperature_raw - bmp085.cal_AC6)*bmp085.cal_AC5) >> 15
+    x2 = (bmp085.cal_MC << 11)//(x1 + bmp085.cal_MD)
+    b5 = x1 + x2
+    temperature = ((b5 + 8) >> 4)/10.0
+
+    b6 = b5 - 4000
+    x1 = (bmp085.cal_B2*(b6*b6) >> 12) >> 11
+    x2 = (bmp085.cal_AC2*b6) >> 11
+    x3 = x1 + x2
+    b3 = (((bmp085.cal_AC1*4 + x3) << bmp085._mode) + 2)//4
+    x1 = (bmp085.cal_AC3*b6) >> 13
+    x2 = (bmp085.cal_B1*((b6*b6) >> 12)) >> 16
+    x3 = ((x1 + x2) + 2) >> 2
+    b4 = (bmp085.cal_AC4*(x3 + 32768)) >> 15
+    b7 = (pressure_raw - b3)*(50000 >> bmp085._mode)
+    if b7 < 0x80000000:
+        pressure = (b7*2)//b4
+    else:
+        pressure = (b7//b4)*2
+    x1 = (pressure >> 8)*(pressure >> 8)
+    x1 = (x1*3038) >> 16
+    x2 = (-7357*pressure) >> 16
+    pressure = pressure + ((x1 + x2 + 3791) >> 4)
+    return temperature, pressure
+
+
+
+"""
+Returns the CRC-16 (Modbus) checksum of the given bytes, as used by the AM2321.
+
+@param data     bytes, data to compute the checksum of
+
+@return         int, checksum
+"""
+def get_crc16(data):
+    crc = 0xFFFF
+    for byte in data:
+        crc ^= byte
+        for bit in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+    return crc
 
 
 
@@ -15,13 +94,24 @@ to make it compliant with the sensors that you are using.
 
 Members:
     temperature         float, temperature value (in degC)
-    pressure_raw        float, raw pressure value 
-                        that is measured by the sensor (in hPa)
+    pressure_raw        float, raw pressure value
+                        that is measured by the sensor (in hPa), i.e.,
+                        the uncompensated value of the sensor divided by 100
     pressure_sea_level  float, corrected sea-level pressure value (in hPa)
     rel_humidity        float, relative humidity value (in %)
+    bmp085              BMP085 object, is opened at the first measurement
+                        and reused by the following ones
+    threads             dict, maps the names of the sensors to the threads 
+                        of their last reading
+    unix_time           float, unix time of the measurement (the middle
+                        between the start and the end of the acquisition)
+    spreads             dict, maps the column indices (IDX_*) of the measured
+                        quantities to the spread of their samples (see BURST_SAMPLES)
+    counts              dict, maps the column indices (IDX_*) of the measured
+                        quantities to the number of their samples
 """
 class DataAcquisition:
-    
+
     """
     Constructor, initiates all class members with 0.
     """
@@ -30,32 +120,192 @@ class DataAcquisition:
         self.pressure_raw = 0.
         self.pressure_sea_level = 0.
         self.rel_humidity = 0.
+        self.bmp085 = None
+        self.threads = {}
+        self.unix_time = 0.
+        self.spreads = {}
+        self.counts = {}
+
+
+
+    """
+    Reads temperature and pressure from the BMP085. The raw values are read
+    once and compensated here (see get_bmp085_compensated_values), so that
+    a sample takes two conversions of the sensor. The raw pressure is the 
+    uncompensated value of the sensor (as it has always been stored), 
+    the sea-level pressure is derived from the compensated pressure.
+
+    @return temperature     float, temperature (in degC)
+    @return pressure_raw    float, raw pressure value of the sensor divided by 100
+    @return pressure        float, compensated pressure at the sensor (in hPa)
+    """
+    def read_bmp085(self):
+        if self.bmp085 is None:
+            self.bmp085 = BMP085.BMP085()
+        temperature_raw = self.bmp085.read_raw_temp()
+        pressure_raw = self.bmp085.read_raw_pressure()
+        temperature, pressure = get_bmp085_compensated_values(self.bmp085, temperature_raw, pressure_raw)
+        return temperature, pressure_raw/100, pressure/100 #in hPa
+
+
+
+    """
+    Reads the relative humidity from the AM2321 directly over the I2C bus
+    (see the datasheet of the AM2321 for the protocol).
+
+    @return     float, relative humidity (in %)
+    """
+    def read_am2321_native(self):
+        file_descriptor = os.open('/dev/i2c-' + str(AM2321_I2C_BUS), os.O_RDWR)
+        try:
+            fcntl.ioctl(file_descriptor, I2C_SLAVE, AM2321_I2C_ADDRESS)
+            # the sensor sleeps between measurements and does not acknowledge the wake-up
+            try:
+                os.write(file_descriptor, b'\x00')
+            except OSError:
+                pass
+            time.sleep(0.001)
+            # read 4 registers from address 0x00: humidity and temperature
+            os.write(file_descriptor, bytes([0x03, 0x00, 0x04]))
+            time.sleep(0.002)
+            data = os.read(file_descriptor, 8)
+        finally:
+            os.close(file_descriptor)
+
+        if len(data) != 8 or data[0] != 0x03 or get_crc16(data[:6]) != data[6] | data[7] << 8:
+            raise OSError(LOG_ERROR_AM2321_DATA + data.hex())
+        return (data[2] << 8 | data[3])/10.
 
 
+
+    """
+    Reads the relative humidity from the AM2321 with the external am2321 program.
+
+    @return     float, relative humidity (in %)
+    """
+    def read_am2321_subprocess(self):
+        output_am2321 = check_output([os.path.join(PATH_SENSORS, './am2321/am2321')],
+                                     timeout=TIME_ACQUISITION_MAX).decode('utf-8')[:-1]
+        values_am2321 = output_am2321.split(" ")
+        #T_am2321 = float(values_am2321[0])    # unused
+        return float(values_am2321[1])
+
+
+
+    """
+    Reads the relative humidity from the AM2321. If the sensor cannot be read
+    directly over the I2C bus (or if AM2321_NATIVE is not set), 
+    the external am2321 program is used instead.
+
+    @return     float, relative humidity (in %)
+    """
+    def read_am2321(self):
+        if AM2321_NATIVE:
+            try:
+                return self.read_am2321_native()
+            except OSError as error:
+                logging.warning(LOG_WARNING_AM2321_FALLBACK + str(error))
+        return self.read_am2321_subprocess()
+
+
+
+    """
+    Takes BURST_SAMPLES samples of a sensor, which are evenly spread over 
+    BURST_INTERVAL. Samples that cannot be read are skipped, if no sample
+    can be read, the error of the last one is raised.
+
+    @param read     method, reads one sample of the sensor
+
+    @return         list, samples of the sensor
     """
-    In this method, the actual data measurement takes place. 
+    def read_burst(self, read):
+        samples = []
+        error = None
+        time_start = time.time()
+        for i in range(BURST_SAMPLES):
+            if i > 0:
+                time.sleep(max(0., time_start + i*BURST_INTERVAL/(BURST_SAMPLES - 1) - time.time()))
+            try:
+                samples.append(read())
+            except Exception as exception:
+                error = exception
+        if len(samples) == 0:
+            raise error
+        return samples
+
+
+
+    """
+    Reduces the samples of a quantity to one value (see BURST_METHOD)
+    and sets the spread and number of the samples.
+
+    @param index    int, column index (IDX_*) of the quantity
+    @param samples  float list, samples of the quantity
+
+    @return         float, value of the quantity (NaN if there are no samples)
+    """
+    def aggregate_samples(self, index, samples):
+        (value, self.spreads[index], self.counts[index]) = aggregate.get_robust_stats(samples, BURST_METHOD, BURST_TRIM)
+        return float(value)
+
+
+
+    """
+    In this method, the actual data measurement takes place.
     Modify this method if you use other sensors.
 
-    Measures temperature (in degC), raw pressure (in hPa), 
+    Measures temperature (in degC), raw pressure (in hPa),
     sea level pressure (in hPa), and relative humidity (in %).
-    
+    Both sensors are read at the same time on separate threads.
+    Each sensor is read BURST_SAMPLES times and the samples are
+    reduced to one value, so that single noisy samples are suppressed
+    (the daemon writes the previous measurement meanwhile, see do_daemon_mode).
+    If a sensor does not respond within TIME_ACQUISITION_MAX (plus BURST_INTERVAL),
+    or if it fails, its values are set to NaN. A sensor whose reading 
+    of an earlier measurement is still running is not read again 
+    (its values are NaN as well), so that a sensor is never 
+    accessed by two threads at the same time.
+
     Used sensors: BMP085 for temperature and pressure values,
                   AM2321 for relative humidities
     """
     def measure_data(self):
-        # BMP085 data
-        bmp085 = BMP085.BMP085()
-        self.temperature = bmp085.read_temperature()
-        #p_bmp085 = bmp085.read_pressure()/100 #in hPa
-        self.pressure_raw = bmp085.read_raw_pressure()/100 #in hPa
-        self.pressure_sea_level = bmp085.read_sealevel_pressure(ALTITUDE)/100 #in hPa
-        
-        # AM2321 data
-        output_am2321 = check_output([os.path.join(PATH_SENSORS, './am2321/am2321')]).decode('utf-8')[:-1]
-        values_am2321 = output_am2321.split(" ")
-        #T_am2321 = float(values_am2321[0])    # unused
-        self.rel_humidity = float(values_am2321[1])
-    
-    
-    
+        if BURST_SAMPLES < 1:
+            raise ValueError(LOG_ERROR_BURST_SAMPLES + str(BURST_SAMPLES))
+
+        readings = {}
+        def read_sensor(name, read):
+            try:
+                readings[name] = self.read_burst(read)
+            except Exception as error:
+                readings[name] = error
+
+        threads = []
+        for (name, read) in (('BMP085', self.read_bmp085), ('AM2321', self.read_am2321)):
+            if name in self.threads and self.threads[name].is_alive():
+                readings[name] = RuntimeError(LOG_ERROR_SENSOR_BUSY)
+                continue
+            # daemon threads, so that a sensor that does not respond cannot block the exit of the script
+            self.threads[name] = threading.Thread(target=read_sensor, args=(name, read), daemon=True)
+            threads.append(self.threads[name])
+        time_max = TIME_ACQUISITION_MAX + (BURST_INTERVAL if BURST_SAMPLES > 1 else 0)
+        time_start = time.time()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(max(0., time_start + time_max - time.time()))
+        time_end = time.time()
+        self.unix_time = 0.5*(time_start + time_end)
+
+        for name in ('BMP085', 'AM2321'):
+            reading = readings.get(name, TimeoutError(LOG_ERROR_SENSOR_TIMEOUT))
+            if isinstance(reading, Exception):
+                logging.error(LOG_ERROR_SENSOR + name + ': ' + repr(reading))
+                readings[name] = []
+
+        self.temperature = self.aggregate_samples(IDX_TEMPERATURE, [sample[0] for sample in readings['BMP085']])
+        self.pressure_raw = self.aggregate_samples(IDX_PRESSURE_RAW, [sample[1] for sample in readings['BMP085']])
+        self.pressure_sea_level = self.aggregate_samples(IDX_PRESSURE_SEA, [get_sealevel_pressure(sample[2], ALTITUDE) for sample in readings['BMP085']])
+        self.rel_humidity = self.aggregate_samples(IDX_HUMIDITY_REL, readings['AM2321'])
 
+        logging.info(LOG_ACQUISITION_LATENCY.format(time_end - time_start))
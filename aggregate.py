@@ -0,0 +1,281 @@
+import numpy as np
+
+
+
+
+"""
+Vectorized time-weighted aggregation of data series.
+
+The values between two consecutive measurements are interpolated
+linearly (trapezoidal rule). Segments whose boundaries contain a
+missing value (NaN) or whose time span exceeds a given maximum gap
+are not bridged, i.e., they contribute neither to the integrals
+nor to the covered duration.
+"""
+
+
+
+
+"""
+Returns the time spans of the segments between consecutive measurements
+for every column, with a time span of 0 for segments that must not be bridged.
+
+@param unix_times       float numpy array, unix times of the measurements
+@param data             2D float numpy array, one row per column of data
+@param time_gap_max     float, maximum time span of a segment to be bridged,
+                        if None, all segments without missing values are bridged
+
+@return                 2D float numpy array, time spans of the segments
+                        (one row per column of data)
+"""
+def get_segment_weights(unix_times, data, time_gap_max=None):
+    dt = np.diff(unix_times)
+    is_valid = ~np.isnan(data[:, :-1]) & ~np.isnan(data[:, 1:])
+    if time_gap_max is not None:
+        is_valid &= dt <= time_gap_max
+    return np.where(is_valid, dt, 0.)
+
+
+
+"""
+Returns the time integrals of the given (per segment) values.
+Values of segments with weight 0 are ignored, even if they are NaN.
+
+@param segment_values   2D float numpy array, mean values of the segments
+@param weights          2D float numpy array, time spans of the segments
+
+@return                 float numpy array, one integral per column
+"""
+def integrate_segments(segment_values, weights):
+    return np.sum(np.where(weights > 0., segment_values, 0.)*weights, axis=1)
+
+
+
+"""
+Computes the time-weighted statistics of several columns of data
+in a single vectorized pass.
+
+@param unix_times       float list or numpy array, unix times of the measurements
+@param data             2D float list or numpy array, one row per column of data,
+                        missing values are NaN
+@param time_gap_max     float, maximum time between two measurements
+                        that is still bridged by the trapezoidal rule,
+                        if None, all segments without missing values are bridged
+
+@return                 dict, maps the following keys to float numpy arrays
+                        (one entry per column of data):
+                         * 'mean': time average
+                         * 'min': minimum value
+                         * 'max': maximum value
+                         * 'std': time-weighted standard deviation
+                         * 'integral': time integral (in value*seconds,
+                           e.g., divide by 3600 for degree hours)
+                         * 'duration': time covered by bridged segments
+                         * 'unix_time_avg': time average of the unix times
+                           (centroid of the covered time)
+                        with less than two measurements, the statistics are NaN
+                        (and the integral and the duration 0)
+"""
+def get_time_weighted_stats(unix_times, data, time_gap_max=None):
+    unix_times = np.asarray(unix_times, dtype=float)
+    data = np.atleast_2d(np.asarray(data, dtype=float))
+    if len(unix_times) < 2:
+        nan = np.full(len(data), np.nan)
+        zero = np.zeros(len(data))
+        return {'mean': nan, 'min': nan, 'max': nan, 'std': nan,
+                'integral': zero, 'duration': zero, 'unix_time_avg': nan}
+
+    weights = get_segment_weights(unix_times, data, time_gap_max)
+    duration = weights.sum(axis=1)
+
+    integral = integrate_segments(0.5*(data[:, :-1] + data[:, 1:]), weights)
+    integral_time = integrate_segments(np.broadcast_to(0.5*(unix_times[:-1] + unix_times[1:]), weights.shape), weights)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = integral/duration
+        deviation = (data - mean[:, np.newaxis])**2
+        variance = integrate_segments(0.5*(deviation[:, :-1] + deviation[:, 1:]), weights)/duration
+        unix_time_avg = integral_time/duration
+
+    return {'mean': mean,
+            # NaN for columns without any value (without the warning of np.nanmin)
+            'min': np.fmin.reduce(data, axis=1),
+            'max': np.fmax.reduce(data, axis=1),
+            'std': np.sqrt(variance),
+            'integral': integral,
+            'duration': duration,
+            'unix_time_avg': unix_time_avg}
+
+
+
+"""
+Reduces a data series to the minimum and maximum values within each of
+a given number of equally long time bins (e.g., one bin per pixel column
+of a plot). Since a plotted line covers the whole range between the minimum 
+and the maximum of a pixel column anyway, the plot looks the same, 
+but the extremes are kept. Gaps (NaN values) are kept as well.
+
+@param unix_times       float numpy array, sorted unix times of the series
+@param values           float numpy array, values of the series
+@param number_of_bins   int, number of time bins
+
+@return unix_times      float numpy array, unix times of the reduced series
+@return values          float numpy array, values of the reduced series
+"""
+def get_min_max_envelope(unix_times, values, number_of_bins):
+    unix_times = np.asarray(unix_times, dtype=float)
+    values = np.asarray(values, dtype=float)
+    if len(unix_times) <= 2*number_of_bins:
+        return unix_times, values
+
+    time_span = unix_times[-1] - unix_times[0]
+    # all samples at the same time (e.g., a single row after an import) cannot be binned
+    if time_span <= 0:
+        return unix_times, values
+    bins = np.minimum(((unix_times - unix_times[0])*(number_of_bins/time_span)).astype(int), number_of_bins - 1)
+    # the times are sorted, so each bin is a contiguous range
+    starts = np.flatnonzero(np.r_[True, bins[1:] != bins[:-1]])
+
+    is_nan = np.isnan(values)
+    idx_min = np.lexsort((np.where(is_nan, np.inf, values), bins))[starts]
+    idx_max = np.lexsort((-np.where(is_nan, -np.inf, values), bins))[starts]
+    idx_gaps = np.flatnonzero(is_nan & ~np.r_[False, is_nan[:-1]])
+
+    keep = np.unique(np.concatenate((idx_min, idx_max, idx_gaps)))
+    return unix_times[keep], values[keep]
+
+
+
+"""
+Reduces an envelope (lower and upper bounds of a data series) to the
+minimum of the lower and the maximum of the upper bounds within each of 
+a given number of equally long time bins. Bins without any bounds are NaN.
+
+@param unix_times       float numpy array, sorted unix times of the bounds
+@param lower            float numpy array, lower bounds
+@param upper            float numpy array, upper bounds
+@param number_of_bins   int, number of time bins
+
+@return unix_times      float numpy array, unix times of the centers of the bins
+@return lower           float numpy array, lower bounds of the bins
+@return upper           float numpy array, upper bounds of the bins
+"""
+def get_binned_envelope(unix_times, lower, upper, number_of_bins):
+    unix_times = np.asarray(unix_times, dtype=float)
+    lower = np.asarray(lower, dtype=float)
+    upper = np.asarray(upper, dtype=float)
+    if len(unix_times) <= number_of_bins:
+        return unix_times, lower, upper
+
+    time_span = unix_times[-1] - unix_times[0]
+    if time_span <= 0:
+        return unix_times, lower, upper
+    bins = np.minimum(((unix_times - unix_times[0])*(number_of_bins/time_span)).astype(int), number_of_bins - 1)
+    starts = np.flatnonzero(np.r_[True, bins[1:] != bins[:-1]])
+
+    with np.errstate(invalid='ignore'):
+        lower_binned = np.minimum.reduceat(np.where(np.isnan(lower), np.inf, lower), starts)
+        upper_binned = np.maximum.reduceat(np.where(np.isnan(upper), -np.inf, upper), starts)
+    unix_times_binned = unix_times[0] + (bins[starts] + 0.5)*(time_span/number_of_bins)
+
+    return (unix_times_binned,
+            np.where(np.isinf(lower_binned), np.nan, lower_binned),
+            np.where(np.isinf(upper_binned), np.nan, upper_binned))
+
+
+
+"""
+Returns a robust estimate of a burst of samples of one quantity:
+the median or the trimmed mean (the mean without the given fraction 
+of the lowest and of the highest samples). Missing samples (NaN) are ignored.
+
+@param values       float list, samples of the burst
+@param method       string, 'median' or 'trimmed_mean'
+@param trim         float, fraction of samples to be cut at each end for the trimmed mean
+
+@return value       float, robust estimate of the value (NaN if there are no samples)
+@return spread      float, median absolute deviation of the samples from their median
+@return count       int, number of samples
+"""
+def get_robust_stats(values, method, trim):
+    values = np.sort(np.asarray(values, dtype=float))
+    values = values[~np.isnan(values)]
+    count = len(values)
+    if count == 0:
+        return np.nan, np.nan, 0
+
+    median = np.median(values)
+    spread = np.median(np.abs(values - median))
+    if method == 'median':
+        return median, spread, count
+
+    number_trimmed = min(int(trim*count), (count - 1)//2)
+    return np.mean(values[number_trimmed:count-number_trimmed]), spread, count
+
+
+
+"""
+Places several data series with their own unix times (e.g., the series of 
+several stations) on one common time grid, so that they can be plotted
+with the same unix times. Every value is put into the grid point that is 
+nearest to its unix time, grid points without a value are NaN
+(also for series without any values).
+
+@param series       list, one tuple (unix_times, values) of sorted 
+                    float numpy arrays for each series
+@param time_step    float, time between two grid points in seconds
+
+@return unix_times  float numpy array, unix times of the grid points
+@return data        list of float numpy arrays, values of each series on the grid
+"""
+def get_common_grid(series, time_step):
+    series = [(np.asarray(unix_times, dtype=float), np.asarray(values, dtype=float)) 
+              for (unix_times, values) in series]
+    series_filled = [unix_times for (unix_times, values) in series if len(unix_times) > 0]
+    if len(series_filled) == 0:
+        return np.empty(0), [np.empty(0) for field in series]
+
+    unix_time_start = min(unix_times[0] for unix_times in series_filled)
+    unix_time_end = max(unix_times[-1] for unix_times in series_filled)
+    number_of_points = int(np.rint((unix_time_end - unix_time_start)/time_step)) + 1
+
+    data = []
+    for (unix_times, values) in series:
+        field = np.full(number_of_points, np.nan)
+        field[np.rint((unix_times - unix_time_start)/time_step).astype(int)] = values
+        data.append(field)
+    return unix_time_start + np.arange(number_of_points)*time_step, data
+
+
+
+"""
+Resamples data series to time bins of a given length, which begin at
+multiples of the length (so that the bins do not depend on the first time).
+Each bin holds the mean of the values of its time, missing values (NaN)
+are ignored. Bins without any row are left out.
+
+@param unix_times   float numpy array, sorted unix times of the series
+@param data         list of float numpy arrays, values of the series
+@param time_step    float, length of the bins in seconds
+
+@return unix_times  float numpy array, unix times of the centers of the bins
+@return data        list of float numpy arrays, mean values of the bins
+"""
+def get_resampled_means(unix_times, data, time_step):
+    unix_times = np.asarray(unix_times, dtype=float)
+    if len(unix_times) == 0:
+        return unix_times, [np.asarray(values, dtype=float) for values in data]
+
+    bins = np.floor(unix_times/time_step).astype(np.int64)
+    # the times are sorted, so each bin is a contiguous range
+    starts = np.flatnonzero(np.r_[True, bins[1:] != bins[:-1]])
+
+    means = []
+    for values in data:
+        values = np.asarray(values, dtype=float)
+        is_nan = np.isnan(values)
+        count = np.add.reduceat(~is_nan, starts)
+        total = np.add.reduceat(np.where(is_nan, 0., values), starts)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means.append(np.where(count > 0, total/count, np.nan))
+    return (bins[starts] + 0.5)*time_step, means
@@ -0,0 +1,395 @@
+#!/usr/bin/python3
+
+"""
+Benchmark of the data acquisition, data files, and plots with synthetic data.
+
+The benchmark runs in a temporary directory, which replaces PATH_HOME and PATH_HTML,
+so the data of the weather station are not touched. The sensors are replaced by
+FakeDataAcquisition and the SMTP server by FakeSMTP, so neither hardware nor network
+is needed. For each dataset and stage, the time, the peak of the memory allocated
+by Python (including NumPy arrays), and the bytes read and written are reported.
+
+Run it with the datasets to be benchmarked (all by default), e.g.:
+    ./benchmark.py 1day 1year --repeat 3 --json baseline.json
+"""
+
+import os
+import sys
+import json
+import time
+import types
+import shutil
+import logging
+import argparse
+import tempfile
+import tracemalloc
+import smtplib
+from datetime import datetime
+import numpy as np
+
+import config
+
+# all paths of the project are derived from PATH_HOME and PATH_HTML,
+# so they have to be replaced before any other module of the project is imported
+# (the directory itself is only created when the benchmark runs)
+PATH_BENCHMARK = os.path.join(tempfile.gettempdir(), 'weather_benchmark_' + str(os.getpid()))
+config.PATH_HOME = os.path.join(PATH_BENCHMARK, 'home')
+config.PATH_HTML = os.path.join(PATH_BENCHMARK, 'html')
+
+from constants import *
+
+# time between two measurements of the daily files of the high-rate dataset in seconds
+TIME_DATA_HIGH_RATE = 1
+# datasets: time span of the continuous data and time between two measurements
+# of the daily files (the continuous store always has one slot per TIME_DATA)
+DATASETS = {'1day': [TIME_DAY, TIME_DATA],
+            '1year': [TIME_YEAR, TIME_DATA],
+            '5years': [5*TIME_YEAR, TIME_DATA],
+            'highrate': [TIME_YEAR, TIME_DATA_HIGH_RATE]}
+
+
+
+
+"""
+Class that replaces the sensors. The values are synthetic
+daily and yearly cycles with some noise.
+
+Members:
+    see DataAcquisition
+"""
+class FakeDataAcquisition:
+
+    """
+    Constructor, initiates all class members with 0.
+    """
+    def __init__(self):
+        self.temperature = 0.
+        self.pressure_raw = 0.
+        self.pressure_sea_level = 0.
+        self.rel_humidity = 0.
+        self.unix_time = 0.
+        self.spreads = {index : 0. for index in BURST_INDICES}
+        self.counts = {index : 1 for index in BURST_INDICES}
+
+
+
+    """
+    Sets the synthetic values of the current time.
+    """
+    def measure_data(self):
+        self.unix_time = datetime.now().timestamp()
+        values = get_synthetic_values(np.array([self.unix_time]))
+        self.temperature = float(values[IDX_TEMPERATURE][0])
+        self.pressure_raw = float(values[IDX_PRESSURE_RAW][0])
+        self.pressure_sea_level = float(values[IDX_PRESSURE_SEA][0])
+        self.rel_humidity = float(values[IDX_HUMIDITY_REL][0])
+
+
+
+
+"""
+Class that replaces smtplib.SMTP. Instead of sending the mails,
+only their number and size are counted.
+
+Members:
+    host        string, host of the SMTP server
+    sent_bytes  int, size of all mails sent by this class (class member)
+"""
+class FakeSMTP:
+
+    sent_bytes = 0
+
+    def __init__(self, host='', port=0):
+        self.host = host
+
+    def starttls(self):
+        pass
+
+    def login(self, user, password):
+        pass
+
+    def sendmail(self, sender, recipents, message):
+        FakeSMTP.sent_bytes += len(message)
+
+    def quit(self):
+        pass
+
+
+
+
+"""
+Returns synthetic values for the given times.
+
+@param unix_times   numpy array, unix times
+
+@return             dict, maps the column indices (IDX_*) to numpy arrays
+"""
+def get_synthetic_values(unix_times):
+    random = np.random.default_rng(int(unix_times[0]))
+    phase_day = 2*np.pi*unix_times/TIME_DAY
+    phase_year = 2*np.pi*unix_times/TIME_YEAR
+    noise = lambda scale: scale*random.standard_normal(len(unix_times))
+
+    temperature = 10. - 8.*np.cos(phase_year) - 4.*np.cos(phase_day) + noise(0.3)
+    pressure_raw = 990. + 8.*np.sin(2*np.pi*unix_times/(5*TIME_DAY)) + noise(0.2)
+    humidity_rel = np.clip(70. + 15.*np.cos(phase_day) + noise(2.), 0., 100.)
+    humidity_abs = 6.112*np.exp(17.67*temperature/(temperature+243.5))*humidity_rel*2.1674/(273.15+temperature)
+
+    return {IDX_TEMPERATURE: np.round(temperature, 1),
+            IDX_PRESSURE_RAW: np.round(pressure_raw, 2),
+            IDX_PRESSURE_SEA: np.round(pressure_raw + ALTITUDE/8.3, 2),
+            IDX_HUMIDITY_REL: np.round(humidity_rel, 1),
+            IDX_HUMIDITY_ABS: np.round(humidity_abs, 2)}
+
+
+
+"""
+Writes data lines in the format of the DataFileWriter.
+
+@param file_data    text file object, opened for writing
+@param unix_times   numpy array, unix times of the lines
+@param values       dict, maps the column indices (IDX_*) to numpy arrays
+"""
+def write_data_lines(file_data, unix_times, values):
+    formats = {IDX_TEMPERATURE: '{0:0.1f}', IDX_PRESSURE_RAW: '{0:0.2f}', IDX_PRESSURE_SEA: '{0:0.2f}',
+               IDX_HUMIDITY_REL: '{0:0.1f}', IDX_HUMIDITY_ABS: '{0:0.2f}'}
+    for i, unix_time in enumerate(unix_times):
+        line_values = ['']*NUMBER_OF_INDICES
+        date_time = datetime.fromtimestamp(unix_time)
+        line_values[IDX_DATE] = date_time.strftime('%Y-%m-%d')
+        line_values[IDX_TIME] = date_time.strftime('%H:%M:%S')
+        for index, value_format in formats.items():
+            line_values[index] = value_format.format(values[index][i])
+        line_values[IDX_UNIX_TIME] = str(round(unix_time))
+        file_data.write('\t'.join(line_values) + '\n')
+
+
+
+"""
+Creates a synthetic dataset in the formats of the project: the daily files,
+the continuous text file, the continuous data store, the rollup tiers,
+the daily accumulator, the file of daily min, avg, and max values, and the html file.
+
+@param time_span        int, time span of the data until now in seconds
+@param time_data_daily  int, time between two measurements of the daily files in seconds
+"""
+def create_dataset(time_span, time_data_daily):
+    from store import DataStore
+    from rollup import RollupStore
+    from accumulator import DailyAccumulator
+
+    for path in (PATH_DATA, PATH_LOGS, PATH_IMAGES_MAIL, PATH_IMAGES_WEB, PATH_CACHE):
+        os.makedirs(path, exist_ok=True)
+    with open(os.path.join(PATH_HTML, FILE_HTML), 'w') as file_html:
+        file_html.write('<html><body>\nLast Update: \n</body></html>\n')
+
+    unix_time_now = datetime.now().timestamp()
+    unix_times = np.arange(unix_time_now - time_span, unix_time_now - TIME_DATA/2, TIME_DATA)
+    values = get_synthetic_values(unix_times)
+
+    with open(os.path.join(PATH_DATA, FILE_CONTINUOUS), 'w') as file_data:
+        write_data_lines(file_data, unix_times, values)
+    DataStore(DIR_CONTINUOUS).import_rows(unix_times, values)
+    for tier in ROLLUP_TIERS:
+        RollupStore(tier).import_rows(unix_times, values)
+
+    # daily files (for the high-rate dataset only the ones of yesterday and today)
+    dates = np.array([datetime.fromtimestamp(unix_time).strftime('%Y-%m-%d') for unix_time in unix_times])
+    is_high_rate = time_data_daily != TIME_DATA
+    for date in np.unique(dates)[-2:] if is_high_rate else np.unique(dates):
+        if not is_high_rate:
+            unix_times_day = unix_times[dates == date]
+            values_day = {index: field[dates == date] for index, field in values.items()}
+        else:
+            unix_time_midnight = datetime.strptime(date, '%Y-%m-%d').timestamp()
+            unix_times_day = np.arange(unix_time_midnight, min(unix_time_midnight + TIME_DAY, unix_time_now), time_data_daily)
+            values_day = get_synthetic_values(unix_times_day)
+        with open(os.path.join(PATH_DATA, date + '_weather.txt'), 'w') as file_data:
+            write_data_lines(file_data, unix_times_day, values_day)
+
+    # daily min, avg, and max values of all days before yesterday
+    with open(os.path.join(PATH_DATA, FILE_T_MIN_AVG_MAX), 'w') as file_data:
+        for date in np.unique(dates)[:-2]:
+            temperatures = values[IDX_TEMPERATURE][dates == date]
+            line_values = ['']*NUMBER_OF_INDICES_AVG
+            unix_time_avg = unix_times[dates == date].mean()
+            line_values[IDX_DATE] = date
+            line_values[IDX_TIME] = datetime.fromtimestamp(unix_time_avg).strftime('%H:%M')
+            line_values[IDX_MIN] = str(temperatures.min())
+            line_values[IDX_AVG] = '{0:0.1f}'.format(temperatures.mean())
+            line_values[IDX_MAX] = str(temperatures.max())
+            line_values[IDX_UNIX_TIME_AVG] = str(round(unix_time_avg))
+            file_data.write('\t'.join(line_values) + '\n')
+
+    accumulator = DailyAccumulator()
+    for i in np.flatnonzero(unix_times >= unix_time_now - 2*TIME_DAY):
+        accumulator.update(unix_times[i], {index: float(field[i]) for index, field in values.items()})
+    accumulator.write()
+
+
+
+"""
+Returns the I/O counters of the current process.
+
+@return     dict, bytes read and written from storage ('read_bytes', 'write_bytes') and
+            by system calls ('rchar', 'wchar'), empty if /proc/self/io is not available
+"""
+def get_io_counters():
+    try:
+        with open('/proc/self/io', 'r') as file_io:
+            counters = dict(line.split(': ') for line in file_io.read().splitlines())
+    except OSError:
+        return {}
+    return {key: int(counters[key]) for key in ('rchar', 'wchar', 'read_bytes', 'write_bytes')}
+
+
+
+"""
+Runs a stage and measures its time, peak memory, and I/O.
+
+@param stage        function without parameters
+@param repeat       int, number of runs, the minimum time and maximum peak memory are reported
+
+@return             dict, 'time' in seconds, 'peak_memory' in bytes, and the I/O counters of the last run
+"""
+def measure(stage, repeat):
+    result = {'time': float('inf'), 'peak_memory': 0}
+    for run in range(repeat):
+        io_start = get_io_counters()
+        tracemalloc.start()
+        time_start = time.perf_counter()
+        stage()
+        result['time'] = min(result['time'], time.perf_counter() - time_start)
+        result['peak_memory'] = max(result['peak_memory'], tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        io_end = get_io_counters()
+        result.update({key: io_end[key] - io_start[key] for key in io_end})
+    return result
+
+
+
+"""
+Returns the stages of the benchmark.
+
+@return     list, one tuple (name, function) for each stage
+"""
+def get_stages():
+    import main
+    import utils
+    from reader import DataFileReader
+    from writer import (DataFileWriter, BufferedDataWriter)
+    from plot import PlotCreation
+    from scheduler import PlotJobScheduler
+
+    indices = [IDX_TEMPERATURE, IDX_PRESSURE_SEA, IDX_HUMIDITY_REL]
+    # the render cache and the refresh intervals would skip the plots of all runs but the first
+    parameters_year = PARAMETERS_YEAR[:5] + [0]
+
+    def read_store():
+        DataFileReader(DIR_CONTINUOUS, indices, TIME_YEAR).read_data()
+
+    def read_text():
+        DataFileReader(FILE_CONTINUOUS, indices, TIME_YEAR).read_data()
+
+    writer = DataFileWriter(FakeDataAcquisition())
+    def write_text():
+        BufferedDataWriter([writer]).write_data_continuous(FILE_CONTINUOUS, TIME_YEAR)
+
+    def write_sample():
+        DataFileWriter(FakeDataAcquisition()).write_to_files()
+
+    # one minute of measurements at 1 Hz, written in one batch
+    def write_batch():
+        BufferedDataWriter([DataFileWriter(FakeDataAcquisition()) for i in range(60)]).write_to_files()
+
+    reader = DataFileReader(DIR_CONTINUOUS, [IDX_TEMPERATURE], TIME_DAY)
+    reader.read_data()
+    def time_avg():
+        utils.get_time_avg(reader.unix_times, reader.data[0])
+
+    reader_year = DataFileReader(DIR_CONTINUOUS, [IDX_PRESSURE_SEA], TIME_YEAR)
+    reader_year.read_data()
+    def create_plot():
+        shutil.rmtree(PATH_CACHE, ignore_errors=True)
+        PlotCreation(reader_year.unix_times, reader_year.data, PATH_IMAGES_WEB, PREFIX_365D, IMAGE_FORMAT_WEB,
+                     PARAMETERS_PRESSURE_SEA, parameters_year).create_plot()
+
+    # the plots are rendered in this process, so that they are measured
+    scheduler = PlotJobScheduler(processes=1)
+    def continuous_mode():
+        shutil.rmtree(PATH_CACHE, ignore_errors=True)
+        shutil.rmtree(PATH_IMAGES_WEB, ignore_errors=True)
+        os.makedirs(PATH_IMAGES_WEB)
+        main.do_continuous_mode(scheduler)
+
+    def daily_mode():
+        shutil.rmtree(PATH_CACHE, ignore_errors=True)
+        main.do_daily_mode(scheduler)
+
+    return [('DataFileReader.read_data (store, 365d)', read_store),
+            ('DataFileReader.read_data (text, 365d)', read_text),
+            ('BufferedDataWriter.write_data_continuous', write_text),
+            ('DataFileWriter.write_to_files (1 sample)', write_sample),
+            ('BufferedDataWriter.write_to_files (60 samples)', write_batch),
+            ('utils.get_time_avg (24h)', time_avg),
+            ('PlotCreation.create_plot (365d)', create_plot),
+            ('do_continuous_mode', continuous_mode),
+            ('do_daily_mode', daily_mode)]
+
+
+
+"""
+Runs the benchmark for one dataset.
+
+@param name     string, name of the dataset (see DATASETS)
+@param repeat   int, number of runs of each stage
+
+@return         list, one dict for each stage with its name and results
+"""
+def run_dataset(name, repeat):
+    shutil.rmtree(config.PATH_HOME, ignore_errors=True)
+    shutil.rmtree(config.PATH_HTML, ignore_errors=True)
+    create_dataset(*DATASETS[name])
+
+    results = []
+    for (stage, function) in get_stages():
+        result = measure(function, repeat)
+        result.update({'dataset': name, 'stage': stage})
+        results.append(result)
+        print('{0:10} {1:48} {2:9.3f} s {3:9.1f} MiB {4:10.1f} KiB read {5:10.1f} KiB written'.format(
+              name, stage, result['time'], result['peak_memory']/2**20,
+              result.get('rchar', 0)/2**10, result.get('wchar', 0)/2**10))
+    return results
+
+
+
+"""
+Run this script with the names of the datasets to be benchmarked
+(1day, 1year, 5years, highrate; all by default). Options:
+
+--repeat N      number of runs of each stage (default: 1)
+--json FILE     writes the results to a JSON file (e.g., as baseline)
+"""
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark with synthetic data.')
+    parser.add_argument('datasets', nargs='*', default=list(DATASETS), choices=list(DATASETS))
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--json', default=None)
+    arguments = parser.parse_args()
+
+    # no sensors and no mails
+    sys.modules['acqui'] = types.SimpleNamespace(DataAcquisition=FakeDataAcquisition)
+    smtplib.SMTP = FakeSMTP
+
+    os.makedirs(PATH_BENCHMARK, mode=0o700)
+    try:
+        results = []
+        for name in arguments.datasets:
+            results += run_dataset(name, arguments.repeat)
+        logging.shutdown()
+    finally:
+        shutil.rmtree(PATH_BENCHMARK, ignore_errors=True)
+
+    if arguments.json is not None:
+        with open(arguments.json, 'w') as file_json:
+            json.dump(results, file_json, indent=2)
@@ -0,0 +1,155 @@
+#!/usr/bin/python3
+
+"""
+Client that sends measurements to the server of another weather station
+(see './main.py server'). It reads the sensors of this station or, as a
+stand-in for real stations (e.g., for tests), creates synthetic measurements
+of any number of stations.
+
+The measurements are sent in batches. If the server cannot be reached, they are
+kept (at most CLIENT_BACKLOG_MAX per station) and sent with the next batch.
+
+Run it with the URL of the server, e.g.:
+    ./client.py http://weather-host:8080/ingest --station garden --sensors
+    ./client.py http://localhost:8080/ingest --station test --stations 30 --interval 60
+"""
+
+import sys
+import json
+import math
+import time
+import argparse
+import urllib.request
+import urllib.error
+from collections import deque
+
+from constants import *
+
+
+
+
+"""
+Returns synthetic values of a station with a daily cycle, which is
+shifted a little for every station, so that the stations can be told apart.
+
+@param unix_time    float, unix time of the measurement
+@param number       int, number of the station
+
+@return             dict, maps the column names to the values
+"""
+def get_synthetic_reading(unix_time, number):
+    phase = 2*math.pi*(unix_time % TIME_DAY)/TIME_DAY
+    return {DICT_IDX_COLUMNS[IDX_TEMPERATURE]: round(15. + number - 5.*math.cos(phase), 1),
+            DICT_IDX_COLUMNS[IDX_PRESSURE_RAW]: round(985. + 0.1*number + 2.*math.sin(phase), 1),
+            DICT_IDX_COLUMNS[IDX_PRESSURE_SEA]: round(1013. + 0.1*number + 2.*math.sin(phase), 1),
+            DICT_IDX_COLUMNS[IDX_HUMIDITY_REL]: round(60. - number + 15.*math.cos(phase), 1)}
+
+
+
+"""
+Returns the values measured by the sensors of this station.
+
+@param sensor_data  DataAcquisition object
+
+@return             dict, maps the column names to the values (None if missing)
+"""
+def get_sensor_reading(sensor_data):
+    sensor_data.measure_data()
+    values = {IDX_TEMPERATURE: sensor_data.temperature,
+              IDX_PRESSURE_RAW: sensor_data.pressure_raw,
+              IDX_PRESSURE_SEA: sensor_data.pressure_sea_level,
+              IDX_HUMIDITY_REL: sensor_data.rel_humidity}
+    # NaN is not valid JSON
+    return {DICT_IDX_COLUMNS[index]: None if math.isnan(value) else value for index, value in values.items()}
+
+
+
+"""
+Sends a batch of measurements to the server.
+
+@param url          string, URL of the ingestion of the server
+@param readings     list of dicts, measurements to be sent
+@param token        string, token of the stations (see INGEST_TOKEN), empty for none
+
+@return             boolean, 'True' if the measurements have been accepted
+                    or rejected for good, 'False' if they should be sent again
+"""
+def send_readings(url, readings, token):
+    body = json.dumps({'readings': readings}).encode('utf-8')
+    headers = {'Content-Type': 'application/json'}
+    if token:
+        headers['X-Station-Token'] = token
+    request = urllib.request.Request(url, body, headers, method='POST')
+    try:
+        with urllib.request.urlopen(request, timeout=TIME_HTTP_TIMEOUT) as response:
+            response.read()
+        return True
+    except urllib.error.HTTPError as error:
+        # invalid measurements would be rejected again
+        print('Server rejected {0} measurement(s): {1} {2}'.format(len(readings), error.code, error.read().decode('utf-8', 'replace')), file=sys.stderr)
+        return error.code < 500
+    except (urllib.error.URLError, OSError) as error:
+        print('Server not reached: {0}'.format(error), file=sys.stderr)
+        return False
+
+
+
+"""
+Sends the kept measurements to the server in requests of at most
+CLIENT_REQUEST_READINGS_MAX measurements, until a request fails.
+
+@param url          string, URL of the ingestion of the server
+@param backlog      deque of dicts, measurements that have not been sent yet
+@param token        string, token of the stations, empty for none
+"""
+def send_backlog(url, backlog, token):
+    while len(backlog) > 0:
+        readings = [backlog[i] for i in range(min(len(backlog), CLIENT_REQUEST_READINGS_MAX))]
+        if not send_readings(url, readings, token):
+            return
+        for reading in readings:
+            backlog.popleft()
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Sends measurements to the server of a weather station.')
+    parser.add_argument('url', nargs='?', default='http://localhost:{0}{1}'.format(SERVER_PORT, URL_INGEST))
+    parser.add_argument('--station', default='station', help='ID of the station (prefix of the IDs for several stations)')
+    parser.add_argument('--stations', type=int, default=1, help='number of synthetic stations')
+    parser.add_argument('--sensors', action='store_true', help='read the sensors instead of synthetic values')
+    parser.add_argument('--interval', type=float, default=TIME_DATA, help='time between two measurements in seconds')
+    parser.add_argument('--count', type=int, default=0, help='number of measurements per station, 0 for no limit')
+    parser.add_argument('--batch', type=int, default=1, help='number of measurements per station sent together')
+    parser.add_argument('--token', default=INGEST_TOKEN)
+    arguments = parser.parse_args()
+
+    if arguments.stations == 1:
+        stations = [arguments.station]
+    else:
+        stations = ['{0}{1:02d}'.format(arguments.station, i) for i in range(arguments.stations)]
+    sensor_data = None
+    if arguments.sensors:
+        from acqui import DataAcquisition
+        sensor_data = DataAcquisition()
+        stations = stations[:1]
+
+    backlog = deque(maxlen=CLIENT_BACKLOG_MAX*len(stations))
+    number_of_measurements = 0
+    unix_time_next = time.time()
+    try:
+        while arguments.count == 0 or number_of_measurements < arguments.count:
+            time.sleep(max(0., unix_time_next - time.time()))
+            unix_time = time.time()
+            unix_time_next += arguments.interval
+            for number, station in enumerate(stations):
+                reading = get_sensor_reading(sensor_data) if sensor_data is not None else get_synthetic_reading(unix_time, number)
+                reading.update({'station': station, COLUMN_UNIX_TIME: round(unix_time, 3)})
+                backlog.append(reading)
+            number_of_measurements += 1
+
+            if number_of_measurements % arguments.batch == 0:
+                send_backlog(arguments.url, backlog, arguments.token)
+    except KeyboardInterrupt:
+        pass
+    send_backlog(arguments.url, backlog, arguments.token)
@@ -3,12 +3,159 @@ PATH_HTML = '/var/www/html'
 
 ALTITUDE = 217.0
 
+# if True, the AM2321 is read directly over the I2C bus with the given number,
+# otherwise (or if that fails) the am2321 program in PATH_SENSORS is used
+AM2321_NATIVE = True
+AM2321_I2C_BUS = 1
+
+# time between two measurements in seconds (e.g., 1 for 1 Hz), 
+# the measurements take place at the multiples of this time
+TIME_DATA = 15*60
+
+# time span of the measurements kept in the continuous data store in seconds,
+# the store has one slot per measurement, so reduce it for short TIME_DATA 
+# (e.g., to 8 days for 1 Hz), the rollups keep the long-term data anyway
+TIME_STORE_MAX = 365*24*60*60
+
+# the measurements are kept in memory and written in batches, as soon as
+# FLUSH_SAMPLES measurements have been taken or TIME_FLUSH seconds have passed
+# since the last write (only for the daemon, other modes write at once),
+# FSYNC_POLICY 'flush' forces the data to the storage at each write,
+# 'none' leaves that to the operating system (fewer writes to SD cards,
+# but the data of the last seconds may be lost on a power failure)
+FLUSH_SAMPLES = 1
+TIME_FLUSH = 60
+FSYNC_POLICY = 'flush'
+
+# time between two plot updates of the daemon in seconds
+TIME_PLOT = 15*60
+
+# address and port of the server that receives the measurements
+# of other stations (see './main.py server' and client.py),
+# if INGEST_TOKEN is not empty, the stations have to send it
+SERVER_HOST = '0.0.0.0'
+SERVER_PORT = 8080
+INGEST_TOKEN = ''
+
+# the measurements received from the stations are written in one batch
+# for all stations, as soon as INGEST_FLUSH_SAMPLES measurements
+# have been received or TIME_FLUSH seconds have passed
+INGEST_FLUSH_SAMPLES = 500
+
+# at most INGEST_BUFFER_MAX received measurements are kept in memory, if the writes
+# cannot keep up, further requests are rejected until the measurements have been written
+# (the stations keep their measurements and send them again)
+INGEST_BUFFER_MAX = 20*INGEST_FLUSH_SAMPLES
+
+# if True, the plots of every station are rendered (like the ones of this station),
+# the quantities of all stations are also drawn together in one plot per quantity 
+# (overlay plots) for the stations in OVERLAY_STATIONS (None for all stations)
+PLOT_STATIONS = True
+OVERLAY_STATIONS = None
+
+# the server answers queries of the data (see query.py) from a copy of the continuous 
+# data store in memory, which is updated at most every TIME_QUERY_CHECK seconds,
+# for at most QUERY_INDICES_MAX stations, and keeps the responses 
+# to the last QUERY_CACHE_ENTRIES queries until new data are written
+TIME_QUERY_CHECK = 1
+QUERY_INDICES_MAX = 8
+QUERY_CACHE_ENTRIES = 256
+
+# if True, the daemon also runs the server (see './main.py server'), so that 
+# the web page is notified of new measurements and plots of this station at once,
+# at most EVENT_CLIENTS_MAX browsers can be connected to the events at the same time
+DAEMON_SERVER = False
+EVENT_CLIENTS_MAX = 64
+
+# URL of the events of the server, with which the web page is updated
+# (e.g., 'http://weather-host:8080/events', see events.js), empty for none
+URL_EVENTS_PAGE = ''
+
+# if True, a gzip-compressed copy (index.html.gz) of the web page is written as well,
+# which web servers can send without compressing the page again (e.g., gzip_static of nginx)
+WRITE_HTML_GZIP = True
+
+# an index.html in PATH_HTML that has not been rendered from index_template.html
+# (e.g., the page of an earlier version) is kept and the rendered page is written
+# to index_rendered.html instead, unless REPLACE_HTML_PAGE is True
+REPLACE_HTML_PAGE = False
+
+# maximum time to wait for the sensors in seconds (in addition to BURST_INTERVAL), 
+# the values of sensors that do not respond in time are stored as missing
+TIME_ACQUISITION_MAX = 5
+
+# number of samples of each sensor per measurement, which are spread 
+# over BURST_INTERVAL seconds and reduced to one value by BURST_METHOD 
+# ('median' or 'trimmed_mean', without the BURST_TRIM fraction of 
+# the lowest and of the highest samples), at least 1
+BURST_SAMPLES = 1
+BURST_INTERVAL = 10
+BURST_METHOD = 'median'
+BURST_TRIM = 0.2
+
+# if True, the spread (median absolute deviation) and the number 
+# of the samples of each measurement are stored as well
+STORE_BURST_STATS = False
+
+# if True, the continuous data are also exported to a tab-separated
+# text file (FILE_CONTINUOUS) in addition to the binary store
+EXPORT_CONTINUOUS_TEXT = False
+
+# if True, plots of 31 days and more only contain 
+# the minimum and maximum values per pixel column
+DOWNSAMPLE_PLOTS = True
+
+# if True, the figure templates of the plots are pickled 
+# so that they can be reused by the following runs
+CACHE_FIGURE_TEMPLATES = False
+
+# if True, the plot data are exported to PATH_HTML/data, so that 
+# the plots can be drawn by the browser (see viewer.html)
+EXPORT_PLOT_DATA = False
+
+# if False, no images of the continuous data are rendered
+# (e.g., if only the exported plot data are used)
+RENDER_PLOT_IMAGES = True
+
+# format of the images of the web page for each time span ('svg', 'png', or 'webp'),
+# the raster formats are rendered with IMAGE_DPI dots per inch
+IMAGE_FORMATS_WEB = {'24h': 'svg', '48h': 'svg', '7d': 'svg', '31d': 'svg', '365d': 'svg'}
+IMAGE_DPI = 100
+
+# the coordinates of the svg images are rounded to SVG_DECIMALS decimal places
+# (which is still far below a pixel), and a compressed copy of every svg image
+# is written: 'gz' for <image>.svg.gz (e.g., for gzip_static of nginx), 'svgz'
+# for <image>.svgz, or None for no copy
+SVG_DECIMALS = 1
+IMAGE_COMPRESSION = 'gz'
+
+# minimum time in seconds between two renderings of a plot 
+# of 24 hours, 48 hours, 7 days, 31 days, and 365 days,
+# plots are not rendered more often even if their data have changed
+REFRESH_INTERVAL_DAY = 0
+REFRESH_INTERVAL_2DAYS = 0
+REFRESH_INTERVAL_WEEK = 0
+REFRESH_INTERVAL_MONTH = 60*60
+REFRESH_INTERVAL_YEAR = 6*60*60
+
+# if True, the durations, rows, and bytes of the stages of each run are written
+# in the textfile format of Prometheus to the metrics folder 
+# (they are always written to the log)
+WRITE_METRICS = True
+
+# number of processes to render the plots in parallel,
+# None for one process per CPU core
+PLOT_PROCESSES = None
+
 COLOR_TEMPERATURE = 'darkgoldenrod'
 COLOR_PRESSURE_RAW = 'darkslategray'
 COLOR_PRESSURE_SEA = 'firebrick'
 COLOR_HUMIDITY_REL = 'mediumblue'
 COLOR_HUMIDITY_ABS = 'darkblue'
 
+# colors of the stations in the overlay plots (repeated for more stations)
+COLORS_OVERLAY = ['firebrick', 'mediumblue', 'darkgoldenrod', 'seagreen', 'darkorchid', 'darkslategray', 'chocolate', 'deepskyblue']
+
 LINESTYLE_TEMPERATURE = 'solid'
 LINESTYLE_PRESSURE_RAW = 'solid'
 LINESTYLE_PRESSURE_SEA = 'solid'
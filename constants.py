@@ -13,14 +13,38 @@ PATH_DATA = os.path.join(PATH_WEATHER, 'data')
 PATH_LOGS = os.path.join(PATH_WEATHER, 'logs')
 PATH_IMAGES_MAIL = os.path.join(PATH_WEATHER, 'images')
 PATH_IMAGES_WEB = os.path.join(PATH_HTML, 'images')
+PATH_CACHE = os.path.join(PATH_WEATHER, 'cache')
+PATH_EXPORT = os.path.join(PATH_HTML, 'data')
+PATH_METRICS = os.path.join(PATH_WEATHER, 'metrics')
+PATH_IMAGES_STATIONS = os.path.join(PATH_IMAGES_WEB, 'stations')
 # filenames
 FILE_CONTINUOUS = 'continuous_weather.txt'
 FILE_T_MIN_AVG_MAX = 'T_min_avg_max.txt'
 FILE_HTML = 'index.html'
+FILE_HTML_RENDERED = 'index_rendered.html'
+FILE_HTML_TEMPLATE = 'index_template.html'
 FILE_LOG = 'weather.log'
+FILE_DAILY_ACCUMULATOR = 'daily_accumulator.json'
+FILE_EXPORT_MANIFEST = 'manifest.json'
+FILE_EXPORT_VIEWER = 'viewer.html'
+FILE_EVENTS_SCRIPT = 'events.js'
+# directory of the binary store for the continuous data
+DIR_CONTINUOUS = 'continuous_weather'
+# directory in PATH_DATA with one subdirectory for the data of each other station
+DIR_STATIONS = 'stations'
+# valid station IDs, and the label of this station in the overlay plots
+STATION_ID_PATTERN = r'[A-Za-z0-9_-]{1,32}'
+STATION_LOCAL = 'local'
+FILE_STORE_HEADER = 'header.json'
 # image formats
 IMAGE_FORMAT_WEB = 'svg'
 IMAGE_FORMAT_MAIL = 'pdf'
+IMAGE_FORMATS_RASTER = ('png', 'webp', 'jpg')
+# width of the images in pixels (matplotlib's default size of 6.4 inch at 100 dpi),
+# downsampled plots contain two values per pixel column
+PLOT_WIDTH_PIXELS = 640
+# opacity of shaded envelopes (e.g. min and max of rollup tiers)
+ALPHA_ENVELOPE = 0.3
 # file prefixed
 PREFIX_24H = '24h'
 PREFIX_48H = '48h'
@@ -29,16 +53,106 @@ PREFIX_31D = '31d'
 PREFIX_365D = '365d'
 PREFIX_31D_AVG = '31d_AVG'
 PREFIX_365D_AVG = '365d_AVG'
+PREFIX_OVERLAY = 'overlay'
 # logging
+LOG_SUCCESS_ACQUISITION = 'Successfully acquired and stored data.'
 LOG_SUCCESS_AVERAGE_PLOTS = 'Successfully created average plots.'
 LOG_SUCCESS_RAW_DATA_PLOTS = 'Successfully created raw data plots.'
 LOG_SUCCESS_E_MAILS = 'Successfully sent e-mails.'
+LOG_ERROR_PLOT = 'Failed to create plot: '
+LOG_METRICS = 'Metrics: '
+LOG_ACQUISITION_LATENCY = 'Acquisition latency: {0:.3f} s'
+LOG_ERROR_SENSOR = 'Failed to read sensor '
+LOG_ERROR_SENSOR_TIMEOUT = 'No response within TIME_ACQUISITION_MAX'
+LOG_ERROR_SENSOR_BUSY = 'The reading of an earlier measurement is still running'
+LOG_ERROR_BURST_SAMPLES = 'BURST_SAMPLES must be at least 1, but is '
+LOG_ERROR_AM2321_DATA = 'Invalid data from AM2321: '
+LOG_WARNING_AM2321_FALLBACK = 'Using the am2321 program, reading the AM2321 over I2C failed: '
+LOG_ERROR_JOB = 'Failed to run job: '
+LOG_DAEMON_START = 'Daemon started.'
+LOG_DAEMON_STOP = 'Daemon stopped.'
+LOG_WARNING_MISSED_TICKS = 'Missed {0} acquisition(s), catching up.'
+LOG_WARNING_STORE_RESIZED = 'Store resized to the configured slot time and capacity: '
+LOG_WARNING_NO_DAILY_VALUES = 'No measurements to compute the daily values of '
+LOG_WARNING_PAGE_KEPT = 'Kept {0}, which has not been rendered from the template, the page is written to {1} (see REPLACE_HTML_PAGE).'
+LOG_SERVER_START = 'Server started on port {0}.'
+LOG_SERVER_STOP = 'Server stopped.'
+LOG_ERROR_HTTP = 'Failed to handle request: '
+LOG_SUCCESS_INGEST = 'Wrote {0} measurement(s) of {1} station(s).'
+LOG_ERROR_INGEST = 'Failed to write the measurements of station '
+LOG_WARNING_EVENT_CLIENT = 'Disconnected a client of the events that does not keep up.'
 # xlabels
 XLABEL_DAY = 'Daily Hour'
 XLABEL_WEEK = 'Weekday'
 XLABEL_MONTH = ''
-# time between two measurements in seconds
-TIME_DATA = 15*60
+# I2C address of the AM2321 and request code of the I2C device files to set the address
+AM2321_I2C_ADDRESS = 0x5C
+I2C_SLAVE = 0x0703
+# maximum time between two measurements that is
+# still interpolated for time averages in seconds
+TIME_GAP_MAX = 2*TIME_DATA
+# time over which the trends of the web page are computed in seconds
+# (e.g., the 3 hour pressure tendency)
+TIME_TREND = 3*60*60
+# HTTP server: URL path of the ingestion of measurements, maximum size of a request body
+# in bytes, maximum number of headers of a request, and maximum time to wait 
+# for a request of an open connection in seconds
+URL_INGEST = '/ingest'
+HTTP_BODY_MAX = 1024*1024
+HTTP_HEADERS_MAX = 100
+TIME_HTTP_TIMEOUT = 30
+# maximum time that received measurements may be ahead of the clock of the server in seconds
+TIME_INGEST_AHEAD_MAX = 5*60
+# time after which a station may send its measurements again if the server has
+# rejected them because its buffer is full (Retry-After) in seconds
+TIME_INGEST_RETRY = 60
+# maximum number of measurements (per station) kept by the client while the server
+# cannot be reached, and maximum number of measurements sent in one request
+CLIENT_BACKLOG_MAX = 24*60
+CLIENT_REQUEST_READINGS_MAX = 1000
+# HTTP server: URL paths of the queries of the latest measurement and of a time range,
+# maximum number of rows of a range query (larger ranges have to be resampled),
+# and time span of a range query without start in seconds
+URL_QUERY_LATEST = '/api/latest'
+URL_QUERY_RANGE = '/api/range'
+QUERY_ROWS_MAX = 100000
+TIME_QUERY_DEFAULT = 24*60*60
+# HTTP server: URL path of the server-sent events, maximum number of events 
+# waiting to be sent to a client (a client that falls further behind is disconnected),
+# time between two keep-alive comments, and time until a client reconnects in seconds
+URL_EVENTS = '/events'
+EVENT_QUEUE_MAX = 32
+TIME_EVENT_HEARTBEAT = 30
+TIME_EVENT_RETRY = 10
+# time of the daily job after local midnight in seconds (00:05)
+TIME_DAILY_JOB = 5*60
+# maximum time the daemon waits before checking the clock again in seconds
+TIME_DAEMON_POLL = 60
+# number of finished days kept by the daily accumulator
+NUMBER_OF_ACCUMULATED_DAYS = 7
+# binary store: data type and file extension of the column files
+STORE_DTYPE = '<f8'
+STORE_FILE_EXTENSION = '.bin'
+# metrics in the textfile format of Prometheus: file extension and
+# one list [metric name, key of the stage records, description] for each metric
+METRICS_FILE_EXTENSION = '.prom'
+METRICS_STAGES = [['weather_stage_duration_seconds', 'duration', 'Total duration of the stage in the last run.'],
+                  ['weather_stage_rows', 'rows', 'Number of data rows of the stage in the last run.'],
+                  ['weather_stage_bytes', 'bytes', 'Number of bytes read or written by the stage in the last run.'],
+                  ['weather_stage_count', 'count', 'Number of times the stage has been run in the last run.'],
+                  ['weather_stage_failures', 'failed', 'Number of times the stage has failed in the last run.']]
+# comment appended to the rendered web page, an index.html without it is not replaced (see REPLACE_HTML_PAGE)
+HTML_MARKER = '<!-- rendered from index_template.html -->'
+# file extension of the render keys of the plots in PATH_CACHE
+RENDER_KEY_EXTENSION = '.render'
+# start method of the plot worker processes (see PlotJobScheduler), the processes
+# are not forked from the current process, since it may run other threads
+PLOT_START_METHOD = 'spawn'
+# exported plot data: data type and file extension of the data files,
+# and maximum length of a data file relative to its window before it is compacted
+EXPORT_DTYPE = '<f4'
+EXPORT_FILE_EXTENSION = '.f32'
+EXPORT_COMPACTION_FACTOR = 2
 # maximum time span between first and last
 # times for 24 hours plots in seconds
 TIME_DAY = 24*60*60
@@ -63,42 +177,57 @@ TIME_MONTH = 31*TIME_DAY
 TIME_MINOR_TICKS_MONTH = TIME_DAY
 TIME_MAJOR_TICKS_MONTH = 7*TIME_DAY
 TIME_MAJOR_TICK_LABELS_MONTH = 7*TIME_DAY
+# plots of at least this time span are downsampled
+TIME_DOWNSAMPLE_MIN = TIME_MONTH
 # maximum time span between first and last
 # times for 365 days plots in seconds
 TIME_YEAR = 365*TIME_DAY
 TIME_MINOR_TICKS_YEAR = TIME_WEEK
 TIME_MAJOR_TICKS_YEAR = 4*TIME_WEEK
 TIME_MAJOR_TICK_LABELS_YEAR = 4*TIME_WEEK
+# rollup tiers of the continuous data, ordered from the coarsest
+# to the finest: name of the store directory, time covered 
+# by one slot in seconds, and number of slots
+TIME_HOUR = 60*60
+ROLLUP_TIER_WEEK = ['rollup_week', TIME_WEEK, 50*53]
+ROLLUP_TIER_DAY = ['rollup_day', TIME_DAY, 10*366]
+ROLLUP_TIER_HOUR = ['rollup_hour', TIME_HOUR, 2*366*24]
+ROLLUP_TIERS = [ROLLUP_TIER_WEEK, ROLLUP_TIER_DAY, ROLLUP_TIER_HOUR]
 # parameter collection for plots for days, weeks, and years
 PARAMETERS_DAY = [XLABEL_DAY,
                   TIME_DAY,
                   TIME_MINOR_TICKS_DAY,
                   TIME_MAJOR_TICKS_DAY,
-                  TIME_MAJOR_TICK_LABELS_DAY]
+                  TIME_MAJOR_TICK_LABELS_DAY,
+                  REFRESH_INTERVAL_DAY]
 
 PARAMETERS_2DAYS = [XLABEL_DAY,
                     TIME_2DAYS,
                     TIME_MINOR_TICKS_2DAYS,
                     TIME_MAJOR_TICKS_2DAYS,
-                    TIME_MAJOR_TICK_LABELS_2DAYS]
+                    TIME_MAJOR_TICK_LABELS_2DAYS,
+                    REFRESH_INTERVAL_2DAYS]
 
 PARAMETERS_WEEK = [XLABEL_WEEK,
                    TIME_WEEK,
                    TIME_MINOR_TICKS_WEEK,
                    TIME_MAJOR_TICKS_WEEK,
-                   TIME_MAJOR_TICK_LABELS_WEEK]
+                   TIME_MAJOR_TICK_LABELS_WEEK,
+                   REFRESH_INTERVAL_WEEK]
 
 PARAMETERS_MONTH = [XLABEL_MONTH,
                     TIME_MONTH,
                     TIME_MINOR_TICKS_MONTH,
                     TIME_MAJOR_TICKS_MONTH,
-                    TIME_MAJOR_TICK_LABELS_MONTH]
+                    TIME_MAJOR_TICK_LABELS_MONTH,
+                    REFRESH_INTERVAL_MONTH]
 
 PARAMETERS_YEAR = [XLABEL_MONTH,
                    TIME_YEAR,
                    TIME_MINOR_TICKS_YEAR,
                    TIME_MAJOR_TICKS_YEAR,
-                   TIME_MAJOR_TICK_LABELS_YEAR]
+                   TIME_MAJOR_TICK_LABELS_YEAR,
+                   REFRESH_INTERVAL_YEAR]
 
 # indices of fields to be plotted from the 2D array of all data
 IDX_DATE = 0
@@ -108,14 +237,46 @@ IDX_PRESSURE_RAW = 3
 IDX_PRESSURE_SEA = 4
 IDX_HUMIDITY_REL = 5
 IDX_HUMIDITY_ABS = 6
+IDX_UNIX_TIME = 7
 
-NUMBER_OF_INDICES = 7
+NUMBER_OF_INDICES = 8
+
+# column names of the binary store for the continuous data
+COLUMN_UNIX_TIME = 'unix_time'
+
+DICT_IDX_COLUMNS = {
+    IDX_TEMPERATURE : 'temperature',
+    IDX_PRESSURE_RAW : 'pressure_raw',
+    IDX_PRESSURE_SEA : 'pressure_sea',
+    IDX_HUMIDITY_REL : 'humidity_rel',
+    IDX_HUMIDITY_ABS : 'humidity_abs'
+}
+
+STORE_COLUMNS = [COLUMN_UNIX_TIME] + list(DICT_IDX_COLUMNS.values())
+
+# directory of the store of the spread and number of the samples of each
+# measured quantity, if the measurements are bursts of samples (see STORE_BURST_STATS)
+DIR_BURST = 'continuous_burst'
+BURST_INDICES = [IDX_TEMPERATURE, IDX_PRESSURE_RAW, IDX_HUMIDITY_REL]
+BURST_STATISTICS = ['spread', 'count']
+
+BURST_COLUMNS = [COLUMN_UNIX_TIME] + [DICT_IDX_COLUMNS[index] + '_' + statistic 
+                                      for index in BURST_INDICES
+                                      for statistic in BURST_STATISTICS]
+
+# statistics stored for each quantity in the rollup tiers
+ROLLUP_STATISTICS = ['min', 'max', 'sum', 'count']
+
+ROLLUP_COLUMNS = [COLUMN_UNIX_TIME] + [column + '_' + statistic 
+                                       for column in DICT_IDX_COLUMNS.values() 
+                                       for statistic in ROLLUP_STATISTICS]
 
 IDX_MIN = 2
 IDX_AVG = 3
 IDX_MAX = 4
+IDX_UNIX_TIME_AVG = 5
 
-NUMBER_OF_INDICES_AVG = 5
+NUMBER_OF_INDICES_AVG = 6
 
 LABEL_TEMPERATURE = 'Temperature'
 LABEL_PRESSURE_RAW = 'Raw Pressure'
@@ -157,6 +318,15 @@ DICT_IDX_PARAMETERS = {
     IDX_HUMIDITY_ABS : PARAMETERS_HUMIDITY_ABS
 }
 
+# formats of the values of the quantities (as in the data files)
+DICT_IDX_FORMATS = {
+    IDX_TEMPERATURE : '{0:0.1f}',
+    IDX_PRESSURE_RAW : '{0:0.2f}',
+    IDX_PRESSURE_SEA : '{0:0.2f}',
+    IDX_HUMIDITY_REL : '{0:0.1f}',
+    IDX_HUMIDITY_ABS : '{0:0.2f}'
+}
+
 DICT_IDX_LINESTYLES = {
     IDX_MIN : LINESTYLE_MIN,
     IDX_AVG : LINESTYLE_AVG,
@@ -0,0 +1,272 @@
+import os.path
+import time
+import signal
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import (datetime, timedelta)
+
+from constants import *
+from store import DataStore
+
+
+
+
+"""
+Returns the unix time of the next acquisition after a given time.
+The acquisitions take place at the boundaries of TIME_DATA (e.g., at full quarter hours).
+
+@param unix_time    float, unix time
+
+@return             float, unix time of the next acquisition
+"""
+def get_next_acquisition_time(unix_time):
+    return (unix_time//TIME_DATA + 1)*TIME_DATA
+
+
+
+"""
+Returns the unix time of the next plot update of the daemon after a given time.
+The plot updates take place at the boundaries of TIME_PLOT.
+
+@param unix_time    float, unix time
+
+@return             float, unix time of the next plot update
+"""
+def get_next_plot_time(unix_time):
+    return (unix_time//TIME_PLOT + 1)*TIME_PLOT
+
+
+
+"""
+Returns the unix time of the next daily job after a given time.
+The daily job takes place TIME_DAILY_JOB after local midnight.
+
+@param unix_time    float, unix time
+
+@return             float, unix time of the next daily job
+"""
+def get_next_daily_job_time(unix_time):
+    date = datetime.fromtimestamp(unix_time).date()
+    midnight = datetime(date.year, date.month, date.day)
+    time_daily_job = midnight + timedelta(seconds=TIME_DAILY_JOB)
+    if time_daily_job.timestamp() <= unix_time:
+        time_daily_job = midnight + timedelta(days=1, seconds=TIME_DAILY_JOB)
+    return time_daily_job.timestamp()
+
+
+
+"""
+Checks if the last acquisition before a given time has been missed,
+i.e., if the continuous data store has no data for it.
+
+@param unix_time    float, unix time
+
+@return             boolean, 'True' if the last acquisition has been missed
+"""
+def is_acquisition_missed(unix_time):
+    store = DataStore(DIR_CONTINUOUS)
+    if store.is_empty():
+        return True
+    unix_time_last = store.get_slot_times(store.last_slot)
+    return unix_time_last < get_next_acquisition_time(unix_time) - TIME_DATA - TIME_DATA/2
+
+
+
+"""
+Checks if the daily job of the day of a given time has been missed, i.e.,
+if its time has passed, data have been acquired the day before, but the
+file with the daily minimum, average, and maximum values has no line for that day.
+Before the time of the daily job (e.g., between 00:00 and 00:05),
+the job has not been missed, since it is still to come.
+
+@param unix_time    float, unix time
+
+@return             boolean, 'True' if the daily job has been missed
+"""
+def is_daily_job_missed(unix_time):
+    date = datetime.fromtimestamp(unix_time).date()
+    midnight = datetime(date.year, date.month, date.day)
+    if unix_time < (midnight + timedelta(seconds=TIME_DAILY_JOB)).timestamp():
+        return False
+
+    date_yesterday = datetime.fromtimestamp(unix_time - TIME_DAY).strftime('%Y-%m-%d')
+    if not os.path.isfile(os.path.join(PATH_DATA, date_yesterday + '_weather.txt')):
+        return False
+
+    filepath = os.path.join(PATH_DATA, FILE_T_MIN_AVG_MAX)
+    if not os.path.isfile(filepath):
+        return True
+    with open(filepath, 'r') as file_data:
+        lines = [line for line in file_data.read().splitlines() if line.strip()]
+    return len(lines) == 0 or lines[-1].split('\t')[IDX_DATE] != date_yesterday
+
+
+
+"""
+Class for a long-running process that acquires the data at the boundaries
+of TIME_DATA, updates the plots at the boundaries of TIME_PLOT, and runs
+the daily job at TIME_DAILY_JOB after midnight, scheduled by an asyncio 
+event loop. The acquisitions run on one worker thread, the plot updates
+and the daily job one after another on a second one, so that long plot 
+jobs do not delay the acquisitions and the event loop still reacts to signals.
+In contrast to a run by crontab, the modules, sensors, and figures
+(see PlotJobScheduler) are kept in memory between the jobs.
+
+After a start, a missed acquisition and a missed daily job are caught up.
+Acquisitions that are missed while a job is running are caught up once,
+a plot update is skipped if the previous one has not finished yet.
+On SIGTERM or SIGINT, the running jobs are finished before the daemon stops.
+Further signals are ignored once the daemon has stopped, so that the caller
+can flush the data and close the plot workers.
+Optionally, an HttpServer runs on the event loop of the daemon as well.
+
+Members:
+    acquire         function, acquires and stores the data
+    plot            function, creates the plots of the continuous data
+    daily           function, the daily job (min, avg, max, plots, and mail)
+    executor        ThreadPoolExecutor, worker thread for the acquisitions
+    executor_plot   ThreadPoolExecutor, worker thread for the plot updates and the daily job
+    tasks           dict, maps the plot and daily job to the asyncio Task of their last run
+    stop_event      asyncio Event, is set to stop the daemon
+    server          HttpServer that runs with the daemon (None for no server)
+"""
+class WeatherDaemon:
+
+    """
+    Constructor, sets the jobs of the daemon.
+
+    @param acquire      function without parameters, acquires and stores the data
+    @param plot         function without parameters, creates the plots of the continuous data
+    @param daily        function without parameters, the daily job
+    @param server       HttpServer that runs with the daemon, None for no server
+    """
+    def __init__(self, acquire, plot, daily, server=None):
+        self.acquire = acquire
+        self.plot = plot
+        self.daily = daily
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.executor_plot = ThreadPoolExecutor(max_workers=1)
+        self.tasks = {}
+        self.stop_event = None
+        self.server = server
+
+
+
+    """
+    Runs the daemon until it is stopped by SIGTERM or SIGINT.
+    """
+    def run(self):
+        asyncio.run(self.run_schedule())
+        for signal_number in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signal_number, signal.SIG_IGN)
+
+
+
+    """
+    Requests the daemon to stop after the running job.
+    """
+    def stop(self):
+        self.stop_event.set()
+
+
+
+    """
+    Runs a job on a worker thread. Exceptions of the job are logged,
+    so that a failing job does not stop the daemon.
+
+    @param job          function without parameters
+    @param executor     ThreadPoolExecutor, worker thread of the job
+    """
+    async def run_job(self, job, executor):
+        try:
+            await asyncio.get_running_loop().run_in_executor(executor, job)
+        except Exception:
+            logging.exception(LOG_ERROR_JOB + job.__name__)
+
+
+
+    """
+    Starts the plot update or the daily job on the plot worker thread 
+    without waiting for it. A plot update is skipped if the previous
+    one is still pending or running.
+
+    @param job      function without parameters, self.plot or self.daily
+    """
+    def start_plot_job(self, job):
+        task = self.tasks.get(job)
+        if job is self.plot and task is not None and not task.done():
+            return
+        self.tasks[job] = asyncio.ensure_future(self.run_job(job, self.executor_plot))
+
+
+
+    """
+    Waits until a given unix time or until the daemon is stopped. The clock
+    is checked at least every TIME_DAEMON_POLL, so that clock changes
+    (or a suspend of the system) do not delay the jobs.
+
+    @param unix_time    float, unix time to wait for
+
+    @return             boolean, 'True' if the daemon has been stopped
+    """
+    async def wait_until(self, unix_time):
+        while not self.stop_event.is_set():
+            delay = unix_time - time.time()
+            if delay <= 0.:
+                return False
+            try:
+                await asyncio.wait_for(self.stop_event.wait(), min(delay, TIME_DAEMON_POLL))
+            except asyncio.TimeoutError:
+                pass
+        return True
+
+
+
+    """
+    Schedules the jobs until the daemon is stopped.
+    """
+    async def run_schedule(self):
+        self.stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signal_number in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signal_number, self.stop)
+        logging.info(LOG_DAEMON_START)
+        if self.server is not None:
+            await self.server.start()
+
+        unix_time_now = time.time()
+        if is_acquisition_missed(unix_time_now):
+            await self.run_job(self.acquire, self.executor)
+            self.start_plot_job(self.plot)
+        if is_daily_job_missed(unix_time_now):
+            self.start_plot_job(self.daily)
+
+        unix_time_acquisition = get_next_acquisition_time(unix_time_now)
+        unix_time_plot = get_next_plot_time(unix_time_now)
+        unix_time_daily_job = get_next_daily_job_time(unix_time_now)
+
+        while not await self.wait_until(min(unix_time_acquisition, unix_time_plot, unix_time_daily_job)):
+            unix_time_now = time.time()
+
+            if unix_time_now >= unix_time_acquisition:
+                number_of_missed = int((unix_time_now - unix_time_acquisition)//TIME_DATA)
+                if number_of_missed > 0:
+                    logging.warning(LOG_WARNING_MISSED_TICKS.format(number_of_missed))
+                await self.run_job(self.acquire, self.executor)
+                unix_time_acquisition = get_next_acquisition_time(unix_time_now)
+
+            if unix_time_now >= unix_time_plot:
+                self.start_plot_job(self.plot)
+                unix_time_plot = get_next_plot_time(unix_time_now)
+
+            if unix_time_now >= unix_time_daily_job:
+                self.start_plot_job(self.daily)
+                unix_time_daily_job = get_next_daily_job_time(unix_time_now)
+
+        await asyncio.gather(*self.tasks.values())
+        if self.server is not None:
+            await self.server.stop()
+        self.executor.shutdown(wait=True)
+        self.executor_plot.shutdown(wait=True)
+        logging.info(LOG_DAEMON_STOP)
@@ -0,0 +1,44 @@
+// Receives the server-sent events of the weather station (see events.py)
+// and updates the page without reloading it:
+//  * images that have been rendered again are fetched again (only those),
+//  * elements with a data-column attribute (e.g., <span data-column="temperature">)
+//    show the values of the latest measurement of the station.
+// Include it with the URL of the events of the server, e.g.:
+//  <script src="events.js" data-url="http://weather-host:8080/events" data-station="local"></script>
+(function () {
+    var script = document.currentScript;
+    var url = script.getAttribute('data-url') || '/events';
+    var station = script.getAttribute('data-station') || 'local';
+    var source = new EventSource(url);
+
+    source.addEventListener('plots', function (event) {
+        var plots = JSON.parse(event.data).plots.map(function (plot) {
+            return new URL(plot, document.baseURI).href;
+        });
+        Array.prototype.forEach.call(document.images, function (image) {
+            var src = image.src.split('?')[0];
+            if (plots.indexOf(src) >= 0) {
+                image.src = src + '?' + Date.now();
+            }
+        });
+    });
+
+    source.addEventListener('reading', function (event) {
+        var reading = JSON.parse(event.data);
+        if (reading.station !== station) {
+            return;
+        }
+        Array.prototype.forEach.call(document.querySelectorAll('[data-column]'), function (element) {
+            var column = element.getAttribute('data-column');
+            if (!(column in reading)) {
+                return;
+            }
+            var value = reading[column];
+            if (column === 'unix_time') {
+                element.textContent = new Date(value*1000).toLocaleString();
+            } else {
+                element.textContent = value === null ? '-' : value;
+            }
+        });
+    });
+})();
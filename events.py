@@ -0,0 +1,186 @@
+import os.path
+import json
+import asyncio
+import logging
+from http import HTTPStatus
+
+from constants import *
+from httpd import (HttpError, HttpStream)
+
+
+
+
+"""
+Class for pushing new measurements and plots to the web page
+with server-sent events (see events.js), so that the browsers
+do not have to poll the page and all images:
+
+    GET /events
+
+    event: reading
+    data: {"station": "local", "unix_time": 1700000000, "temperature": 21.5, ...}
+
+    event: plots
+    data: {"plots": ["images/24h_Temperature.svg", ...]}
+
+The events are published from the threads of the writes and plots
+(see publish_readings and publish_plots) and passed to the event loop.
+Every client has a queue of at most EVENT_QUEUE_MAX events. Publishing never
+waits for a client: a client whose queue is full is disconnected (and reconnects
+after TIME_EVENT_RETRY), so that a slow client cannot stall the acquisition.
+
+Members:
+    clients     set of asyncio Queues, event queues of the connected clients
+    loop        asyncio event loop of the server (None if not started)
+"""
+class EventHub:
+
+    """
+    Constructor, initiates the clients.
+    """
+    def __init__(self):
+        self.clients = set()
+        self.loop = None
+
+
+
+    """
+    Adds the handler of the events and the keep-alive comments to an HttpServer.
+
+    @param server   HttpServer
+    """
+    def add_routes(self, server):
+        server.add_route('GET', URL_EVENTS, self.handle_events)
+        server.add_task(self.run_heartbeat)
+
+
+
+    """
+    Passes an event to all clients. Runs on the event loop.
+
+    @param chunk    bytes, encoded event, None to disconnect all clients
+    """
+    def broadcast(self, chunk):
+        for queue in list(self.clients):
+            try:
+                queue.put_nowait(chunk)
+            except asyncio.QueueFull:
+                logging.warning(LOG_WARNING_EVENT_CLIENT)
+                self.disconnect(queue)
+
+
+
+    """
+    Disconnects a client. The events in its queue are dropped, since
+    the client loads the current page again after reconnecting.
+
+    @param queue    asyncio Queue of the client
+    """
+    def disconnect(self, queue):
+        self.clients.discard(queue)
+        while not queue.empty():
+            queue.get_nowait()
+        # the stream of the client ends at None
+        queue.put_nowait(None)
+
+
+
+    """
+    Publishes an event. Can be called from any thread.
+
+    @param event    string, name of the event
+    @param data     data of the event, encoded as JSON
+    """
+    def publish(self, event, data):
+        if self.loop is None or self.loop.is_closed():
+            return
+        chunk = 'event: {0}\ndata: {1}\n\n'.format(event, json.dumps(data)).encode('utf-8')
+        self.loop.call_soon_threadsafe(self.broadcast, chunk)
+
+
+
+    """
+    Publishes the latest measurement of a written batch
+    (see listeners of writer.py).
+
+    @param station  string, ID of the station, None for this station
+    @param writers  list of DataFileWriter objects, written measurements
+    """
+    def publish_readings(self, station, writers):
+        writer = writers[-1]
+        reading = {'station': STATION_LOCAL if station is None else station,
+                   COLUMN_UNIX_TIME: writer.unix_time_now}
+        # NaN is not valid JSON
+        reading.update({DICT_IDX_COLUMNS[index] : None if value != value else value 
+                        for index, value in writer.values.items()})
+        self.publish('reading', reading)
+
+
+
+    """
+    Publishes the images that have been rendered again, 
+    with their paths relative to PATH_HTML.
+
+    @param paths    string list, paths of the images
+    """
+    def publish_plots(self, paths):
+        plots = [os.path.relpath(path, PATH_HTML) for path in paths 
+                 if os.path.abspath(path).startswith(os.path.abspath(PATH_HTML) + os.sep)]
+        if len(plots) > 0:
+            self.publish('plots', {'plots': plots})
+
+
+
+    """
+    Yields the events of a client until it is disconnected.
+
+    @param queue    asyncio Queue of the client
+
+    @return         asynchronous iterator of bytes, encoded events
+    """
+    async def get_events(self, queue):
+        try:
+            yield 'retry: {0}\n\n'.format(TIME_EVENT_RETRY*1000).encode('utf-8')
+            while True:
+                chunk = await queue.get()
+                if chunk is None:
+                    return
+                yield chunk
+        finally:
+            self.clients.discard(queue)
+
+
+
+    """
+    Handles a request of the events.
+
+    @param request  HttpRequest
+
+    @return         HttpStream of the events
+    """
+    async def handle_events(self, request):
+        if len(self.clients) >= EVENT_CLIENTS_MAX:
+            raise HttpError(HTTPStatus.SERVICE_UNAVAILABLE, 'Too many clients')
+        queue = asyncio.Queue(EVENT_QUEUE_MAX)
+        self.clients.add(queue)
+        # the page may be served by another server (e.g., nginx on port 80)
+        return HttpStream(self.get_events(queue), 'text/event-stream',
+                          {'Cache-Control': 'no-cache', 'Access-Control-Allow-Origin': '*'})
+
+
+
+    """
+    Sends a comment to all clients every TIME_EVENT_HEARTBEAT,
+    so that idle connections are not closed by proxies. When the server 
+    stops, all clients are disconnected.
+    """
+    async def run_heartbeat(self):
+        self.loop = asyncio.get_running_loop()
+        try:
+            while True:
+                await asyncio.sleep(TIME_EVENT_HEARTBEAT)
+                self.broadcast(b': keep-alive\n\n')
+        finally:
+            self.loop = None
+            for queue in list(self.clients):
+                self.disconnect(queue)
@@ -0,0 +1,224 @@
+import os
+import os.path
+import json
+import shutil
+from datetime import datetime
+import numpy as np
+
+from constants import *
+from store import DataStore
+import rollup
+
+
+
+
+"""
+Returns the statistics that are exported for the quantities of a data source.
+
+@param tier     list, rollup tier (see ROLLUP_TIERS), None for the raw data
+
+@return         string list, 'avg' for the raw data, 'min', 'avg', and 'max' for rollup tiers
+"""
+def get_statistics(tier):
+    return ['avg'] if tier is None else ['min', 'avg', 'max']
+
+
+
+"""
+Reads the exported values of a quantity for a range of slots of a data source.
+
+@param store        DataStore or RollupStore, store of the data source
+@param tier         list, rollup tier (see ROLLUP_TIERS), None for the raw data
+@param index        int, column index (IDX_*) of the quantity
+@param slot_start   int, first slot of the range
+@param slot_end     int, slot after the last slot of the range
+
+@return             dict, maps the statistics (see get_statistics) to numpy arrays
+"""
+def read_values(store, tier, index, slot_start, slot_end):
+    if tier is None:
+        return {'avg': store.read_slots([DICT_IDX_COLUMNS[index]], slot_start, slot_end)[0]}
+
+    (values_min, values_max, values_sum, values_count) = store.read_slots(rollup.get_rollup_columns(index), slot_start, slot_end)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        values_avg = np.where(values_count > 0, values_sum/values_count, np.nan)
+    return {'min': values_min, 'avg': values_avg, 'max': values_max}
+
+
+
+"""
+Class to export the data of the plot windows of the continuous data, so that
+the plots can be drawn by the browser (see viewer.html) instead of being rendered.
+
+Like the plots, every window is taken from the coarsest rollup tier that still
+fills the plot width (or from the raw data). For each of these data sources,
+one binary file of Float32 values is written per quantity and statistic.
+The values are those of consecutive slots of the source (NaN for missing data),
+so no times have to be stored. A JSON manifest describes the sources
+(time of the first value, slot time, number of values) and the windows.
+
+The export is incremental: only the slots since the last exported slot are
+written to the end of the files. The last exported slot is written again,
+since the slot of a rollup tier changes with each new measurement. If a file
+gets longer than EXPORT_COMPACTION_FACTOR times its window, it is rewritten
+with the values of its window only.
+
+Members:
+    windows     list, one list [time_max, indices, parameters_time, prefix] for each window
+    manifest    dict, manifest of the last export (empty if there has been none)
+"""
+class DataExport:
+
+    """
+    Constructor, sets the windows and reads the manifest of the last export.
+
+    @param windows      list, one list [time_max, indices, parameters_time, prefix] for each window
+    """
+    def __init__(self, windows):
+        self.windows = windows
+        self.manifest = {}
+
+        filepath = os.path.join(PATH_EXPORT, FILE_EXPORT_MANIFEST)
+        if os.path.isfile(filepath):
+            with open(filepath, 'r') as file_manifest:
+                self.manifest = json.load(file_manifest)
+
+
+
+    """
+    Returns the name of the data file of a quantity and statistic of a data source.
+
+    @param source       string, name of the data source (name of its store directory)
+    @param index        int, column index (IDX_*) of the quantity
+    @param statistic    string, 'min', 'avg', or 'max'
+
+    @return             string, name of the data file in PATH_EXPORT
+    """
+    def get_filename(self, source, index, statistic):
+        return source + '_' + DICT_IDX_COLUMNS[index] + '_' + statistic + EXPORT_FILE_EXTENSION
+
+
+
+    """
+    Writes the values of a data source for a range of slots to its data files.
+
+    @param store        DataStore or RollupStore, store of the data source
+    @param tier         list, rollup tier (see ROLLUP_TIERS), None for the raw data
+    @param indices      int list, column indices (IDX_*) of the quantities
+    @param first_slot   int, slot of the first value of the data files
+    @param slot_start   int, first slot to be written
+    @param slot_end     int, slot after the last slot to be written
+    """
+    def write_values(self, store, tier, indices, first_slot, slot_start, slot_end):
+        source = os.path.basename(store.path)
+        is_rewrite = slot_start == first_slot
+
+        for index in indices:
+            values = read_values(store, tier, index, slot_start, slot_end)
+            for statistic in get_statistics(tier):
+                filepath = os.path.join(PATH_EXPORT, self.get_filename(source, index, statistic))
+                data = np.asarray(values[statistic], dtype=EXPORT_DTYPE).tobytes()
+                if is_rewrite:
+                    # a rewritten file replaces the old one at once, so that it is never read half-written
+                    with open(filepath + '.tmp', 'wb') as file_data:
+                        file_data.write(data)
+                    os.replace(filepath + '.tmp', filepath)
+                else:
+                    with open(filepath, 'r+b') as file_data:
+                        file_data.seek((slot_start - first_slot)*np.dtype(EXPORT_DTYPE).itemsize)
+                        file_data.write(data)
+                        file_data.truncate()
+
+
+
+    """
+    Exports the new data of a data source and returns its manifest entry.
+
+    @param tier         list, rollup tier (see ROLLUP_TIERS), None for the raw data
+    @param indices      int list, column indices (IDX_*) of the quantities
+    @param time_max     int, longest time span of the windows of the data source in seconds
+
+    @return             dict, manifest entry of the data source, None if it has no data
+    """
+    def export_source(self, tier, indices, time_max):
+        store = DataStore(DIR_CONTINUOUS) if tier is None else rollup.RollupStore(tier)
+        if store.is_empty():
+            return None
+
+        source = os.path.basename(store.path)
+        number_of_slots = -(-time_max//store.time_slot) + 1
+        (slot_available, slot_end) = store.get_slot_range()
+        slot_min = max(slot_available, slot_end - number_of_slots)
+
+        entry = self.manifest.get('sources', {}).get(source)
+        files = [self.get_filename(source, index, statistic) for index in indices for statistic in get_statistics(tier)]
+        is_rewrite = entry is None \
+                     or entry['origin'] != store.origin \
+                     or entry['time_slot'] != store.time_slot \
+                     or entry['files'] != files \
+                     or not all(os.path.isfile(os.path.join(PATH_EXPORT, filename)) for filename in files) \
+                     or entry['first_slot'] + entry['length'] - 1 < slot_available \
+                     or entry['first_slot'] + entry['length'] - 1 > slot_end \
+                     or slot_end - entry['first_slot'] > EXPORT_COMPACTION_FACTOR*number_of_slots
+
+        if is_rewrite:
+            first_slot = slot_start = slot_min
+        else:
+            first_slot = entry['first_slot']
+            slot_start = entry['first_slot'] + entry['length'] - 1
+        self.write_values(store, tier, indices, first_slot, slot_start, slot_end)
+
+        # the values of rollup tiers belong to the centers of their slots
+        time_offset = 0. if tier is None else 0.5*store.time_slot
+        return {'origin': store.origin,
+                'time_slot': store.time_slot,
+                'first_slot': first_slot,
+                'length': slot_end - first_slot,
+                'unix_time_first': store.get_slot_times(first_slot) + time_offset,
+                'statistics': get_statistics(tier),
+                'columns': {DICT_IDX_COLUMNS[index]: {statistic: self.get_filename(source, index, statistic)
+                                                      for statistic in get_statistics(tier)} for index in indices},
+                'files': files}
+
+
+
+    """
+    Exports the data of all windows, writes the manifest,
+    and copies the viewer to PATH_HTML if it has changed.
+    """
+    def write(self):
+        os.makedirs(PATH_EXPORT, exist_ok=True)
+
+        windows_per_source = {}
+        for window in self.windows:
+            tier = rollup.get_tier(window[0])
+            source = DIR_CONTINUOUS if tier is None else tier[0]
+            windows_per_source.setdefault(source, (tier, []))[1].append(window)
+
+        manifest = {'unix_time': datetime.now().timestamp(), 'sources': {}, 'windows': []}
+        for source, (tier, windows_source) in windows_per_source.items():
+            time_max = max(window[0] for window in windows_source)
+            indices = sorted(set(index for window in windows_source for index in window[1]))
+            entry = self.export_source(tier, indices, time_max)
+            if entry is None:
+                continue
+            manifest['sources'][source] = entry
+            for (time_max, indices, parameters_time, prefix) in windows_source:
+                manifest['windows'].append({'name': prefix,
+                                            'source': source,
+                                            'time_max': time_max,
+                                            'quantities': [{'column': DICT_IDX_COLUMNS[index],
+                                                            'label': DICT_IDX_PARAMETERS[index][0],
+                                                            'unit': DICT_IDX_PARAMETERS[index][1],
+                                                            'color': DICT_IDX_PARAMETERS[index][2]} for index in indices]})
+
+        filepath = os.path.join(PATH_EXPORT, FILE_EXPORT_MANIFEST)
+        with open(filepath + '.tmp', 'w') as file_manifest:
+            json.dump(manifest, file_manifest)
+        os.replace(filepath + '.tmp', filepath)
+        self.manifest = manifest
+
+        filepath_viewer = os.path.join(os.path.dirname(os.path.abspath(__file__)), FILE_EXPORT_VIEWER)
+        filepath_viewer_html = os.path.join(PATH_HTML, FILE_EXPORT_VIEWER)
+        if not os.path.isfile(filepath_viewer_html) or os.path.getmtime(filepath_viewer_html) < os.path.getmtime(filepath_viewer):
+            shutil.copyfile(filepath_viewer, filepath_viewer_html)
@@ -0,0 +1,378 @@
+import json
+import signal
+import asyncio
+import logging
+from http import HTTPStatus
+from urllib.parse import (urlsplit, parse_qs)
+
+from constants import *
+
+
+
+
+"""
+Exception of a request handler, which is answered with the given status.
+
+Members:
+    status      int, HTTP status code
+    message     string, message returned in the body of the response
+    headers     dict, additional headers of the response
+"""
+class HttpError(Exception):
+
+    """
+    Constructor, sets the status, the message, and the headers.
+
+    @param status   int, HTTP status code
+    @param message  string, message returned in the body of the response
+    @param headers  dict, additional headers of the response (e.g., Retry-After)
+    """
+    def __init__(self, status, message='', headers=None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.headers = {} if headers is None else headers
+
+
+
+
+"""
+Class for a request to the HttpServer.
+
+Members:
+    method      string, request method (e.g., 'GET' or 'POST')
+    path        string, path of the requested URL
+    query       dict, maps the names of the query parameters to their (last) values
+    headers     dict, maps the lower-case header names to their values
+    body        bytes, body of the request
+"""
+class HttpRequest:
+
+    """
+    Constructor, splits the target of the request into its path and query.
+
+    @param method   string, request method
+    @param target   string, requested URL (path and query)
+    @param headers  dict, maps the lower-case header names to their values
+    @param body     bytes, body of the request
+    """
+    def __init__(self, method, target, headers, body):
+        url = urlsplit(target)
+        self.method = method
+        self.path = url.path
+        self.query = {name : values[-1] for name, values in parse_qs(url.query).items()}
+        self.headers = headers
+        self.body = body
+
+
+
+    """
+    Returns the JSON body of the request.
+
+    @return     decoded JSON body
+    """
+    def get_json(self):
+        try:
+            return json.loads(self.body.decode('utf-8'))
+        except ValueError:
+            raise HttpError(HTTPStatus.BAD_REQUEST, 'Invalid JSON')
+
+
+
+
+"""
+Class for a response of the HttpServer.
+
+Members:
+    status          int, HTTP status code
+    body            bytes, body of the response
+    content_type    string, content type of the body
+    headers         dict, additional headers
+"""
+class HttpResponse:
+
+    """
+    Constructor, sets status, body, and headers of the response.
+
+    @param status           int, HTTP status code
+    @param body             bytes, body of the response
+    @param content_type     string, content type of the body
+    @param headers          dict, additional headers
+    """
+    def __init__(self, status=HTTPStatus.OK, body=b'', content_type='text/plain; charset=utf-8', headers=None):
+        self.status = status
+        self.body = body
+        self.content_type = content_type
+        self.headers = {} if headers is None else headers
+
+
+
+    """
+    Returns the status line and the headers of the response.
+
+    @param keep_alive   boolean, 'True' if the connection is kept open
+
+    @return             bytes, head of the response
+    """
+    def get_head(self, keep_alive):
+        headers = {'Content-Type': self.content_type,
+                   'Connection': 'keep-alive' if keep_alive else 'close'}
+        if self.body is not None:
+            headers['Content-Length'] = str(len(self.body))
+        headers.update(self.headers)
+        lines = ['HTTP/1.1 {0} {1}'.format(int(self.status), HTTPStatus(self.status).phrase)]
+        lines += [name + ': ' + value for name, value in headers.items()]
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+
+
+"""
+Class for a response whose body is streamed to the client (e.g., server-sent
+events). The body has no length, so the connection is closed at its end.
+
+Members:
+    see HttpResponse, body is None
+    chunks      asynchronous generator of bytes, parts of the body
+"""
+class HttpStream(HttpResponse):
+
+    """
+    Constructor, sets the parts of the body.
+
+    @param chunks           asynchronous generator of bytes, parts of the body
+    @param content_type     string, content type of the body
+    @param headers          dict, additional headers
+    """
+    def __init__(self, chunks, content_type, headers=None):
+        super().__init__(HTTPStatus.OK, None, content_type, headers)
+        self.chunks = chunks
+
+
+
+"""
+Returns a response with a JSON body.
+
+@param data     data to be encoded as JSON
+@param status   int, HTTP status code
+
+@return         HttpResponse
+"""
+def get_json_response(data, status=HTTPStatus.OK):
+    return HttpResponse(status, json.dumps(data).encode('utf-8'), 'application/json')
+
+
+
+
+"""
+Class for a minimal HTTP/1.1 server on asyncio streams, so that
+no web framework has to be installed on the Pi. The requests are
+dispatched by method and path to coroutine functions, which return
+an HttpResponse (or raise an HttpError). Connections are kept open
+for further requests until TIME_HTTP_TIMEOUT has passed without one.
+Background tasks run as long as the server (e.g., to write buffered data).
+
+Members:
+    routes          dict, maps (method, path) to the handler of the requests
+    tasks           list of coroutine functions without parameters, background tasks
+    stop_event      asyncio Event, is set to stop the server
+    server          asyncio Server, listening server (None if not started)
+    running_tasks   list of asyncio Tasks of the running background tasks
+"""
+class HttpServer:
+
+    """
+    Constructor, initiates the routes and background tasks.
+    """
+    def __init__(self):
+        self.routes = {}
+        self.tasks = []
+        self.stop_event = None
+        self.server = None
+        self.running_tasks = []
+
+
+
+    """
+    Adds the handler of the requests with the given method and path.
+
+    @param method   string, request method (e.g., 'GET' or 'POST')
+    @param path     string, path of the URL
+    @param handler  coroutine function with the HttpRequest as parameter,
+                    returns an HttpResponse
+    """
+    def add_route(self, method, path, handler):
+        self.routes[(method, path)] = handler
+
+
+
+    """
+    Adds a task that runs in the background as long as the server.
+
+    @param task     coroutine function without parameters
+    """
+    def add_task(self, task):
+        self.tasks.append(task)
+
+
+
+    """
+    Reads a request from a connection.
+
+    @param reader   asyncio StreamReader of the connection
+
+    @return request     HttpRequest, None if the connection has been closed
+    @return keep_alive  boolean, 'True' if the client keeps the connection open
+    """
+    async def read_request(self, reader):
+        request_line = await reader.readline()
+        if not request_line:
+            return None, False
+        words = request_line.decode('latin-1').split()
+        if len(words) != 3 or not words[2].startswith('HTTP/'):
+            raise HttpError(HTTPStatus.BAD_REQUEST, 'Invalid request line')
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            if len(headers) >= HTTP_HEADERS_MAX:
+                raise HttpError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE)
+            (name, separator, value) = line.decode('latin-1').partition(':')
+            if not separator:
+                raise HttpError(HTTPStatus.BAD_REQUEST, 'Invalid header')
+            headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get('content-length', 0))
+        except ValueError:
+            raise HttpError(HTTPStatus.BAD_REQUEST, 'Invalid Content-Length')
+        if length > HTTP_BODY_MAX:
+            raise HttpError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+        body = await reader.readexactly(length) if length > 0 else b''
+
+        connection = headers.get('connection', '').lower()
+        keep_alive = connection != 'close' if words[2] == 'HTTP/1.1' else connection == 'keep-alive'
+        return HttpRequest(words[0], words[1], headers, body), keep_alive
+
+
+
+    """
+    Passes a request to its handler and returns the response.
+    Exceptions of the handler are logged and answered with status 500.
+
+    @param request  HttpRequest
+
+    @return         HttpResponse
+    """
+    async def dispatch(self, request):
+        handler = self.routes.get((request.method, request.path))
+        if handler is None:
+            if any(path == request.path for (method, path) in self.routes):
+                return HttpResponse(HTTPStatus.METHOD_NOT_ALLOWED)
+            return HttpResponse(HTTPStatus.NOT_FOUND)
+        try:
+            return await handler(request)
+        except HttpError as error:
+            return HttpResponse(error.status, error.message.encode('utf-8'), headers=error.headers)
+        except Exception:
+            logging.exception(LOG_ERROR_HTTP + request.method + ' ' + request.path)
+            return HttpResponse(HTTPStatus.INTERNAL_SERVER_ERROR)
+
+
+
+    """
+    Handles the requests of a connection until it is closed.
+
+    @param reader   asyncio StreamReader of the connection
+    @param writer   asyncio StreamWriter of the connection
+    """
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    (request, keep_alive) = await asyncio.wait_for(self.read_request(reader), TIME_HTTP_TIMEOUT)
+                except HttpError as error:
+                    response = HttpResponse(error.status, error.message.encode('utf-8'), headers=error.headers)
+                    writer.write(response.get_head(False) + response.body)
+                    break
+                if request is None:
+                    break
+
+                response = await self.dispatch(request)
+                if isinstance(response, HttpStream):
+                    await self.write_stream(writer, response)
+                    break
+                writer.write(response.get_head(keep_alive) + response.body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, ValueError):
+            # ValueError: line longer than the limit of the StreamReader
+            pass
+        finally:
+            writer.close()
+
+
+
+    """
+    Writes a streamed response to a connection. A client that does not
+    read the stream for TIME_HTTP_TIMEOUT is disconnected.
+
+    @param writer   asyncio StreamWriter of the connection
+    @param response HttpStream
+    """
+    async def write_stream(self, writer, response):
+        writer.write(response.get_head(False))
+        try:
+            async for chunk in response.chunks:
+                writer.write(chunk)
+                await asyncio.wait_for(writer.drain(), TIME_HTTP_TIMEOUT)
+        finally:
+            await response.chunks.aclose()
+
+
+
+    """
+    Runs the server until it is stopped by SIGTERM or SIGINT.
+    """
+    def run(self):
+        asyncio.run(self.serve())
+
+
+
+    """
+    Serves the requests and runs the background tasks until the server is stopped.
+    """
+    async def serve(self):
+        self.stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signal_number in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signal_number, self.stop_event.set)
+
+        await self.start()
+        await self.stop_event.wait()
+        await self.stop()
+
+
+
+    """
+    Starts to serve the requests and to run the background tasks
+    on the running event loop (e.g., the one of the WeatherDaemon).
+    """
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle_connection, SERVER_HOST, SERVER_PORT)
+        self.running_tasks = [asyncio.ensure_future(task()) for task in self.tasks]
+        logging.info(LOG_SERVER_START.format(SERVER_PORT))
+
+
+
+    """
+    Stops to accept connections and cancels the background tasks.
+    """
+    async def stop(self):
+        self.server.close()
+        for task in self.running_tasks:
+            task.cancel()
+        await asyncio.gather(*self.running_tasks, return_exceptions=True)
+        logging.info(LOG_SERVER_STOP)
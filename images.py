@@ -0,0 +1,110 @@
+import io
+import re
+import gzip
+import os.path
+
+from constants import *
+import utils
+
+
+
+
+"""
+Returns the format of the images of the web page for a time span (see IMAGE_FORMATS_WEB).
+
+@param prefix   string, prefix of the time span (e.g., PREFIX_24H)
+
+@return         string, format of the image without dot
+"""
+def get_image_format(prefix):
+    return IMAGE_FORMATS_WEB.get(prefix, IMAGE_FORMAT_WEB)
+
+
+
+"""
+Rounds a number of the coordinates of an svg image to SVG_DECIMALS
+decimal places and drops the trailing zeros.
+
+@param match    re.Match of the number
+
+@return         string, rounded number
+"""
+def round_number(match):
+    text = '{0:.{1}f}'.format(float(match.group(0)), SVG_DECIMALS)
+    if '.' in text:
+        text = text.rstrip('0').rstrip('.')
+    return '0' if text == '-0' else text
+
+
+
+"""
+Reduces the path data of an svg image: the coordinates are rounded and the
+white space around the commands (e.g., 'M 0 345.6 L 460.8 345.6') is removed.
+
+@param path     string, path data (d attribute of a path element)
+
+@return         string, reduced path data
+"""
+def reduce_path(path):
+    path = re.sub(r'-?\d+\.\d+', round_number, path)
+    path = re.sub(r'\s*([MLHVCSQTAZmlhvcsqtaz])\s*', r'\1', path)
+    return re.sub(r'\s+', ' ', path)
+
+
+
+"""
+Reduces the size of an svg image written by matplotlib: the metadata and
+comments are removed, and the path data are reduced (see reduce_path),
+the other numbers (e.g., of the transforms) are kept.
+
+@param data     bytes, svg image
+
+@return         bytes, reduced svg image
+"""
+def reduce_svg(data):
+    text = data.decode('utf-8')
+    text = re.sub(r'<metadata>.*?</metadata>\s*', '', text, flags=re.DOTALL)
+    text = re.sub(r'<!--.*?-->\s*', '', text, flags=re.DOTALL)
+    text = re.sub(r'(\sd=")([^"]*)(")', lambda match: match.group(1) + reduce_path(match.group(2)) + match.group(3), text)
+    return text.encode('utf-8')
+
+
+
+"""
+Saves a figure as image. The format is given by the extension of the file.
+Svg images are reduced (see reduce_svg) and a compressed copy is written
+(see IMAGE_COMPRESSION), raster images (see IMAGE_FORMATS_RASTER)
+are rendered with IMAGE_DPI.
+All files are replaced atomically, so that the web server never
+sends a partially written image.
+
+@param figure       matplotlib Figure, figure to be saved
+@param path_file    string, path of the image
+
+@return             int, number of bytes written
+"""
+def save_figure(figure, path_file):
+    image_format = os.path.splitext(path_file)[1][1:].lower()
+    buffer = io.BytesIO()
+    if image_format == 'svg':
+        figure.savefig(buffer, format=image_format, metadata={'Date': None})
+        data = reduce_svg(buffer.getvalue())
+    elif image_format == 'webp':
+        # the lines of the plots are sharper and even smaller without lossy compression
+        figure.savefig(buffer, format=image_format, dpi=IMAGE_DPI, pil_kwargs={'lossless': True})
+        data = buffer.getvalue()
+    elif image_format in IMAGE_FORMATS_RASTER:
+        figure.savefig(buffer, format=image_format, dpi=IMAGE_DPI)
+        data = buffer.getvalue()
+    else:
+        figure.savefig(buffer, format=image_format)
+        data = buffer.getvalue()
+    utils.write_file_atomic(path_file, data)
+    number_of_bytes = len(data)
+
+    if image_format == 'svg' and IMAGE_COMPRESSION is not None:
+        data_gzip = gzip.compress(data, compresslevel=9, mtime=0)
+        path_compressed = path_file + '.gz' if IMAGE_COMPRESSION == 'gz' else os.path.splitext(path_file)[0] + '.svgz'
+        utils.write_file_atomic(path_compressed, data_gzip)
+        number_of_bytes += len(data_gzip)
+    return number_of_bytes
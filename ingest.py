@@ -0,0 +1,253 @@
+import re
+import hmac
+import math
+import time
+import asyncio
+import logging
+import threading
+from http import HTTPStatus
+from concurrent.futures import ThreadPoolExecutor
+
+from constants import *
+from writer import (DataFileWriter, BufferedDataWriter)
+from httpd import (HttpError, get_json_response)
+import metrics
+
+
+
+
+"""
+Class for a measurement that has been received from another station.
+It has the members of DataAcquisition that are used by the DataFileWriter.
+
+Members:
+    station             string, ID of the station
+    temperature         float, temperature value (in degC)
+    pressure_raw        float, raw pressure value (in hPa)
+    pressure_sea_level  float, sea-level pressure value (in hPa)
+    rel_humidity        float, relative humidity value (in %)
+    unix_time           float, unix time of the measurement
+    spreads             dict, empty (the spreads of the samples are not received)
+    counts              dict, empty (the numbers of the samples are not received)
+"""
+class StationReading:
+
+    """
+    Constructor, takes the values of a received measurement. Quantities that
+    have not been sent (or are null) are stored as missing (NaN).
+
+    @param reading      dict with the keys 'station', 'unix_time', and the names
+                        of the columns of the measured quantities (see DICT_IDX_COLUMNS)
+    @param unix_time_max    float, latest valid unix time of the measurement
+    """
+    def __init__(self, reading, unix_time_max):
+        if not isinstance(reading, dict):
+            raise HttpError(HTTPStatus.BAD_REQUEST, 'Invalid reading')
+        self.station = reading.get('station')
+        if not isinstance(self.station, str) or not re.fullmatch(STATION_ID_PATTERN, self.station) or self.station == STATION_LOCAL:
+            raise HttpError(HTTPStatus.BAD_REQUEST, 'Invalid station ID')
+
+        self.unix_time = self.get_value(reading, COLUMN_UNIX_TIME)
+        # a measurement far in the future would let the ring buffers of the station expire
+        if not 0. < self.unix_time <= unix_time_max:
+            raise HttpError(HTTPStatus.BAD_REQUEST, 'Invalid unix time')
+
+        self.temperature = self.get_value(reading, DICT_IDX_COLUMNS[IDX_TEMPERATURE])
+        self.pressure_raw = self.get_value(reading, DICT_IDX_COLUMNS[IDX_PRESSURE_RAW])
+        self.pressure_sea_level = self.get_value(reading, DICT_IDX_COLUMNS[IDX_PRESSURE_SEA])
+        self.rel_humidity = self.get_value(reading, DICT_IDX_COLUMNS[IDX_HUMIDITY_REL])
+        self.spreads = {}
+        self.counts = {}
+
+
+
+    """
+    Returns a value of a received measurement. Values that are not finite
+    (NaN or Infinity, which are accepted by the JSON parser) are rejected.
+
+    @param reading  dict, received measurement
+    @param key      string, name of the value
+
+    @return         float, value, NaN if it is missing
+    """
+    def get_value(self, reading, key):
+        value = reading.get(key)
+        if value is None:
+            return math.nan
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+            raise HttpError(HTTPStatus.BAD_REQUEST, 'Invalid value of ' + key)
+        return float(value)
+
+
+
+
+"""
+Class for receiving the measurements of other stations over HTTP
+(see client.py). A request contains a batch of measurements, which
+may belong to different stations:
+
+    POST /ingest
+    {"readings": [{"station": "garden", "unix_time": 1700000000,
+                   "temperature": 21.5, "pressure_raw": 990.1,
+                   "pressure_sea": 1015.9, "humidity_rel": 55.0}, ...]}
+
+The measurements are kept in memory and written for all stations in one
+batch on a worker thread (see BufferedDataWriter), as soon as
+INGEST_FLUSH_SAMPLES measurements have been received or TIME_FLUSH
+seconds have passed, so that the requests are answered at once.
+
+Members:
+    writers             dict, maps the IDs of the stations to the lists of their
+                        DataFileWriter objects that have not been written yet
+    number_of_readings  int, number of measurements that have not been written yet
+    unix_time_flush     float, unix time of the last write
+    lock                Lock, serializes the adding and taking of the measurements
+    executor            ThreadPoolExecutor, worker thread for the writes
+    future              Future of the running write (None if there is none)
+"""
+class StationIngest:
+
+    """
+    Constructor, initiates the buffers of the measurements.
+    """
+    def __init__(self):
+        self.writers = {}
+        self.number_of_readings = 0
+        self.unix_time_flush = time.time()
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.future = None
+
+
+
+    """
+    Adds the handler of the measurements and the periodic write to an HttpServer.
+
+    @param server   HttpServer
+    """
+    def add_routes(self, server):
+        server.add_route('POST', URL_INGEST, self.handle_ingest)
+        server.add_task(self.run_flush_timer)
+
+
+
+    """
+    Adds a batch of received measurements. The batch is validated first,
+    so that either all or none of its measurements are added. If the buffer
+    would exceed INGEST_BUFFER_MAX measurements, the batch is rejected with
+    503 and Retry-After, so that the station sends it again after the write.
+
+    @param readings     list of dicts, received measurements (see StationReading)
+
+    @return             int, number of added measurements
+    """
+    def add_readings(self, readings):
+        if not isinstance(readings, list):
+            raise HttpError(HTTPStatus.BAD_REQUEST, 'Invalid readings')
+        unix_time_max = time.time() + TIME_INGEST_AHEAD_MAX
+        readings = [StationReading(reading, unix_time_max) for reading in readings]
+        writers = [(reading.station, DataFileWriter(reading, measure=False)) for reading in readings]
+
+        if len(writers) > INGEST_BUFFER_MAX:
+            raise HttpError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, 'Too many readings')
+
+        with self.lock:
+            if self.number_of_readings + len(writers) > INGEST_BUFFER_MAX:
+                raise HttpError(HTTPStatus.SERVICE_UNAVAILABLE, 'Too many buffered readings',
+                                {'Retry-After': str(TIME_INGEST_RETRY)})
+            for (station, writer) in writers:
+                self.writers.setdefault(station, []).append(writer)
+            self.number_of_readings += len(writers)
+        return len(writers)
+
+
+
+    """
+    @return     boolean, 'True' if the buffered measurements are to be written
+    """
+    def is_flush_due(self):
+        return self.number_of_readings >= INGEST_FLUSH_SAMPLES \
+               or (self.number_of_readings > 0 and time.time() - self.unix_time_flush >= TIME_FLUSH)
+
+
+
+    """
+    Writes the buffered measurements of all stations and the metrics of the writes.
+    A failing station is logged, so that it does not prevent the others from being written.
+    """
+    def flush(self):
+        metrics.set_mode('ingest')
+        with self.lock:
+            (writers, self.writers) = (self.writers, {})
+            number_of_readings = self.number_of_readings
+            self.number_of_readings = 0
+            self.unix_time_flush = time.time()
+        if number_of_readings == 0:
+            return
+
+        with metrics.span('ingest') as record:
+            for station, writers_station in sorted(writers.items()):
+                # the measurements of a station may arrive in any order
+                writers_station.sort(key=lambda writer: writer.unix_time_now)
+                try:
+                    BufferedDataWriter(writers_station, station).write_to_files()
+                except Exception:
+                    logging.exception(LOG_ERROR_INGEST + station)
+            record['rows'] = number_of_readings
+        logging.info(LOG_SUCCESS_INGEST.format(number_of_readings, len(writers)))
+        metrics.write_textfile('ingest')
+
+
+
+    """
+    Starts writing the buffered measurements on the worker thread,
+    unless a write is already running.
+    """
+    def start_flush(self):
+        if self.future is None or self.future.done():
+            self.future = asyncio.get_running_loop().run_in_executor(self.executor, self.flush)
+
+
+
+    """
+    Handles a request with a batch of measurements.
+
+    @param request  HttpRequest
+
+    @return         HttpResponse with the number of accepted measurements
+    """
+    async def handle_ingest(self, request):
+        if INGEST_TOKEN and not hmac.compare_digest(request.headers.get('x-station-token', ''), INGEST_TOKEN):
+            raise HttpError(HTTPStatus.UNAUTHORIZED, 'Invalid token')
+        body = request.get_json()
+        if not isinstance(body, dict):
+            raise HttpError(HTTPStatus.BAD_REQUEST, 'Invalid body')
+
+        try:
+            number_of_readings = self.add_readings(body.get('readings'))
+        finally:
+            # a full buffer is written as well
+            if self.is_flush_due():
+                self.start_flush()
+        return get_json_response({'accepted': number_of_readings})
+
+
+
+    """
+    Writes the buffered measurements at the latest TIME_FLUSH after the last write.
+    """
+    async def run_flush_timer(self):
+        while True:
+            await asyncio.sleep(max(1., self.unix_time_flush + TIME_FLUSH - time.time()))
+            if self.is_flush_due():
+                self.start_flush()
+
+
+
+    """
+    Waits for the running write, writes the remaining measurements,
+    and stops the worker thread.
+    """
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.flush()
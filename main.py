@@ -4,15 +4,15 @@
 
 import os
 import sys
+import math
 import logging
 from datetime import datetime
 
 from constants import *
-import utils
-from reader import DataFileReader
-from writer import DataFileWriter
-from plot import PlotCreation
-from mail import MailSender
+import metrics
+
+# all other modules are imported within the functions that use them,
+# so that the acquisition does not wait for the import of matplotlib and smtplib
 
 logging.basicConfig(format='%(asctime)s %(message)s', filename=os.path.join(PATH_LOGS, FILE_LOG), level=logging.INFO)
 
@@ -20,24 +20,57 @@ logging.basicConfig(format='%(asctime)s %(message)s', filename=os.path.join(PATH
 
 
 """
-Reads data from the last 24h and 15min from the continuous data file
+Reads data from the last 24h and 15min from the continuous data store
 and uses them to compute the daily minimum, maximum, and time average 
 of a given field. Also the average date and time of the given times is computed.
-Then these values are written to a data file.
 
 @param index_column     column index of the quantity to determine min, max, and avg from
-@param file_data        string, name of file to write min, max, average, and date date to
+
+@return                 dict with the keys 'min', 'max', 'avg', and 'unix_time_avg'
 """
-def write_min_max_avg_line_values(index_column, file_data):
-    reader = DataFileReader(FILE_CONTINUOUS, [index_column], TIME_DAY+TIME_DATA)
+def get_min_max_avg_values_from_store(index_column):
+    import aggregate
+    from reader import DataFileReader
+    
+    reader = DataFileReader(DIR_CONTINUOUS, [index_column], TIME_DAY+TIME_DATA)
     reader.read_data()
     
-    values = reader.data[0]
+    # slots of missing measurements are not interpolated
+    stats = aggregate.get_time_weighted_stats(reader.unix_times, reader.data, TIME_GAP_MAX)
+    
+    return {'min': stats['min'][0],
+            'max': stats['max'][0],
+            'avg': stats['mean'][0],
+            'unix_time_avg': stats['unix_time_avg'][0]}
+
+
+
+"""
+Writes the daily minimum, maximum, and time average of a given field
+as well as the average date and time of the day to a data file.
+The values are taken from the daily accumulator, which has been updated
+with each measurement. Only if the accumulator has no values for that day
+(e.g., directly after an update), they are computed from the continuous data store.
+If there are no measurements of that day at all, no line is written.
+
+@param index_column     column index of the quantity to determine min, max, and avg from
+@param file_data        string, name of file to write min, max, average, and date date to
+@param date             string, date of the day, formatted as %Y-%m-%d
+"""
+def write_min_max_avg_line_values(index_column, file_data, date):
+    from accumulator import DailyAccumulator
+    
+    stats = DailyAccumulator().get_day_stats(date, index_column)
+    if stats is None:
+        stats = get_min_max_avg_values_from_store(index_column)
+    if math.isnan(stats['unix_time_avg']) or math.isnan(stats['avg']):
+        logging.warning(LOG_WARNING_NO_DAILY_VALUES + date)
+        return
     
-    minimum = str(min(values))
-    maximum = str(max(values))
-    average = '{0:0.1f}'.format(utils.get_time_avg(reader.unix_times, values))
-    unix_time_avg = utils.get_time_avg(reader.unix_times, reader.unix_times)
+    minimum = str(stats['min'])
+    maximum = str(stats['max'])
+    average = '{0:0.1f}'.format(stats['avg'])
+    unix_time_avg = stats['unix_time_avg']
     
     line_values = ['']*NUMBER_OF_INDICES_AVG
     
@@ -46,6 +79,7 @@ def write_min_max_avg_line_values(index_column, file_data):
     line_values[IDX_MIN] = minimum
     line_values[IDX_AVG] = average
     line_values[IDX_MAX] = maximum
+    line_values[IDX_UNIX_TIME_AVG] = str(round(unix_time_avg))
     
     with open(os.path.join(PATH_DATA, file_data), 'a') as f:
         f.write('\t'.join(line_values) + '\n')
@@ -53,28 +87,34 @@ def write_min_max_avg_line_values(index_column, file_data):
 
 
 """
-Reads data from a given file with average data and creates the corresponding plots.
+Reads data from a given file with average data and adds the corresponding plots
+to the plot job scheduler.
 
 @param file_data            string, name of the data file
+@param scheduler            PlotJobScheduler, scheduler to add the plots to
 """
-def create_avg_data_plots(file_data):
-    reader = DataFileReader(file_data, [IDX_MIN, IDX_AVG, IDX_MAX], TIME_MONTH)
-    reader.read_data()
-    plot = PlotCreation(reader.unix_times, reader.data, PATH_IMAGES_WEB, PREFIX_31D_AVG, IMAGE_FORMAT_WEB, PARAMETERS_TEMPERATURE, PARAMETERS_MONTH)
-    plot.create_plot()
+def create_avg_data_plots(file_data, scheduler):
+    from reader import DataSnapshot
+    import images
     
-    reader = DataFileReader(file_data, [IDX_MIN, IDX_AVG, IDX_MAX], TIME_YEAR)
-    reader.read_data()
-    plot = PlotCreation(reader.unix_times, reader.data, PATH_IMAGES_WEB, PREFIX_365D_AVG, IMAGE_FORMAT_WEB, PARAMETERS_TEMPERATURE, PARAMETERS_YEAR)
-    plot.create_plot()
+    indices = [IDX_MIN, IDX_AVG, IDX_MAX]
+    snapshot = DataSnapshot(file_data, indices, TIME_YEAR)
+    snapshot.read_data()
+    
+    (unix_times, data) = snapshot.get_window(TIME_MONTH, indices)
+    scheduler.add_job(unix_times, data, PATH_IMAGES_WEB, PREFIX_31D_AVG, images.get_image_format(PREFIX_31D), PARAMETERS_TEMPERATURE, PARAMETERS_MONTH)
+    
+    (unix_times, data) = snapshot.get_window(TIME_YEAR, indices)
+    scheduler.add_job(unix_times, data, PATH_IMAGES_WEB, PREFIX_365D_AVG, images.get_image_format(PREFIX_365D), PARAMETERS_TEMPERATURE, PARAMETERS_YEAR)
 
     
 
 """
-Creates plots of raw data (so without evaluating the min, max, and average
-of data).
+Adds plots of raw data (so without evaluating the min, max, and average
+of data) to the plot job scheduler.
 
-@param file_data            string, name of the data file
+@param scheduler            PlotJobScheduler, scheduler to add the plots to
+@param snapshot             DataSnapshot, data from which the plots are created
 @param time_max             int, maximum time in seconds to cover the image data
 @param indices              int list, indices of the columns from the data files
                             from which plots shall be generated
@@ -84,16 +124,120 @@ of data).
 @param image_prefix         string, image prefix (e.g., the date of the data)
 @param image_format         string, format of the image (without dot)
 """
-def create_raw_data_plots(file_data, time_max, indices, parameters_time, image_path, image_prefix, image_format):
-    reader = DataFileReader(file_data, indices, time_max)
-    reader.read_data()
+def create_raw_data_plots(scheduler, snapshot, time_max, indices, parameters_time, image_path, image_prefix, image_format):
+    (unix_times, data) = snapshot.get_window(time_max, indices)
+    if len(unix_times) == 0:
+        return
+    envelopes = snapshot.get_envelopes(time_max, indices)
     
     for i, index in enumerate(indices):
-        plot = PlotCreation(reader.unix_times, [reader.data[i]], 
-                            image_path, image_prefix, image_format, 
-                            DICT_IDX_PARAMETERS[index], parameters_time)
-        plot.create_plot()
-   
+        scheduler.add_job(unix_times, [data[i]], 
+                          image_path, image_prefix, image_format, 
+                          DICT_IDX_PARAMETERS[index], parameters_time, [envelopes[i]])
+
+
+
+"""
+Renders the plot jobs of the scheduler and logs the plots that failed.
+
+@param scheduler    PlotJobScheduler, scheduler with the plot jobs
+
+@return             boolean, 'True' if all plots have been created
+"""
+def run_plot_jobs(scheduler):
+    is_successful = True
+    for (name, error) in scheduler.run():
+        if error is not None:
+            logging.error(LOG_ERROR_PLOT + name + '\n' + error)
+            is_successful = False
+    return is_successful
+
+
+"""
+Reads the data for several plot windows of the continuous data. Every window
+is plotted from the coarsest rollup tier that still fills the plot width
+(or from the raw data if there is no such tier). Each data source is read 
+only once, for all indices and the longest time span of its windows.
+
+@param windows      list, one list [time_max, indices, ...] for each window
+@param station      string, ID of the station, None for this station
+
+@return             dict, maps the time_max of each window to its snapshot
+                    (DataSnapshot or RollupSnapshot)
+"""
+def get_snapshots(windows, station=None):
+    import rollup
+    import utils
+    from reader import DataSnapshot
+    
+    windows_per_tier = {}
+    for window in windows:
+        tier = rollup.get_tier(window[0])
+        key = None if tier is None else tier[0]
+        windows_per_tier.setdefault(key, (tier, []))[1].append(window)
+    
+    snapshots = {}
+    for (tier, windows_tier) in windows_per_tier.values():
+        time_max = max(window[0] for window in windows_tier)
+        indices = sorted(set(index for window in windows_tier for index in window[1]))
+        if tier is None:
+            snapshot = DataSnapshot(utils.get_station_dir(station, DIR_CONTINUOUS), indices, time_max)
+        else:
+            snapshot = rollup.RollupSnapshot(tier, indices, time_max, station)
+        snapshot.read_data()
+        for window in windows_tier:
+            snapshots[window[0]] = snapshot
+    return snapshots
+
+
+
+"""
+Adds the plots of the other stations and the overlay plots, which show
+a quantity of several stations (see OVERLAY_STATIONS) in one plot, 
+to the plot job scheduler. For the overlay plots, the series of the stations
+are placed on a common time grid with the time step of their data source.
+
+@param scheduler        PlotJobScheduler, scheduler to add the plots to
+@param windows          list, one list [time_max, indices, parameters_time, prefix] for each window
+@param snapshots_local  dict, snapshots of this station (see get_snapshots),
+                        None if this station has no data
+"""
+def create_station_plots(scheduler, windows, snapshots_local):
+    import rollup
+    import utils
+    import aggregate
+    import images
+    
+    stations = utils.get_stations()
+    if len(stations) == 0:
+        return
+    
+    snapshots_per_station = {}
+    if snapshots_local is not None:
+        snapshots_per_station[STATION_LOCAL] = snapshots_local
+    os.makedirs(PATH_IMAGES_STATIONS, exist_ok=True)
+    for station in stations:
+        snapshots = get_snapshots(windows, station)
+        snapshots_per_station[station] = snapshots
+        for (time_max, indices, parameters_time, prefix) in windows:
+            create_raw_data_plots(scheduler, snapshots[time_max], time_max, indices, parameters_time, 
+                                  PATH_IMAGES_STATIONS, station+'_'+prefix, images.get_image_format(prefix))
+    
+    stations_overlay = [STATION_LOCAL] + stations if OVERLAY_STATIONS is None else OVERLAY_STATIONS
+    stations_overlay = [station for station in stations_overlay if station in snapshots_per_station]
+    for (time_max, indices, parameters_time, prefix) in windows:
+        tier = rollup.get_tier(time_max)
+        time_step = TIME_DATA if tier is None else tier[1]
+        windows_station = [snapshots_per_station[station][time_max].get_window(time_max, indices) for station in stations_overlay]
+        for i, index in enumerate(indices):
+            series = [(unix_times, data[i]) for (unix_times, data) in windows_station]
+            labels = [station for station, (unix_times, values) in zip(stations_overlay, series) if len(unix_times) > 0]
+            (unix_times, data) = aggregate.get_common_grid([field for field in series if len(field[0]) > 0], time_step)
+            if len(unix_times) == 0:
+                continue
+            scheduler.add_job(unix_times, data, PATH_IMAGES_WEB, prefix+'_'+PREFIX_OVERLAY, images.get_image_format(prefix),
+                              DICT_IDX_PARAMETERS[index], parameters_time, labels=labels)
+
 
 
 """
@@ -101,20 +245,38 @@ Is called by crontab at 00:05 every day.
 * It evaluates min, max, and average for the temperature values the day before.
 * It creates plots of the data aquired the day before.
 * These plots are automatically sent by mail.
+
+@param scheduler    PlotJobScheduler to be reused for the plots,
+                    if None, a new one is created and closed afterwards
 """
-def do_daily_mode():
+def do_daily_mode(scheduler=None):
+    from reader import DataSnapshot
+    from scheduler import PlotJobScheduler
+    from mail import MailSender
+    
     unix_time_yesterday = datetime.now().timestamp() - TIME_DAY
     date_yesterday = datetime.fromtimestamp(unix_time_yesterday).strftime('%Y-%m-%d')
     
+    is_scheduler_owned = scheduler is None
+    if is_scheduler_owned:
+        scheduler = PlotJobScheduler()
+    
     # operations related with average data
-    write_min_max_avg_line_values(IDX_TEMPERATURE, FILE_T_MIN_AVG_MAX)
-    create_avg_data_plots(FILE_T_MIN_AVG_MAX)
-    logging.info(LOG_SUCCESS_AVERAGE_PLOTS)
+    write_min_max_avg_line_values(IDX_TEMPERATURE, FILE_T_MIN_AVG_MAX, date_yesterday)
+    create_avg_data_plots(FILE_T_MIN_AVG_MAX, scheduler)
     
     # operations related with raw data data
     indices = [IDX_TEMPERATURE, IDX_PRESSURE_SEA, IDX_HUMIDITY_REL] 
-    create_raw_data_plots(date_yesterday+'_weather.txt', None, indices, PARAMETERS_DAY, PATH_IMAGES_MAIL, date_yesterday, IMAGE_FORMAT_MAIL)
-    logging.info(LOG_SUCCESS_RAW_DATA_PLOTS)
+    snapshot = DataSnapshot(date_yesterday+'_weather.txt', indices)
+    snapshot.read_data()
+    create_raw_data_plots(scheduler, snapshot, None, indices, PARAMETERS_DAY, PATH_IMAGES_MAIL, date_yesterday, IMAGE_FORMAT_MAIL)
+    
+    # all plots are rendered at once on the available cores
+    if run_plot_jobs(scheduler):
+        logging.info(LOG_SUCCESS_AVERAGE_PLOTS)
+        logging.info(LOG_SUCCESS_RAW_DATA_PLOTS)
+    if is_scheduler_owned:
+        scheduler.close()
     
     # operations related with sending data
     files_images = [os.path.join(PATH_IMAGES_MAIL, i) for i in os.listdir(PATH_IMAGES_MAIL) if os.path.isfile(os.path.join(PATH_IMAGES_MAIL, i)) and i.startswith(date_yesterday)]
@@ -122,19 +284,52 @@ def do_daily_mode():
     files_all = files_images + files_data
 
     my_mail_sender = MailSender(files_all, MAIL_SENDER, MAIL_PASSWORD, MAIL_RECIPENTS, 'Weather from '+date_yesterday, '')
-    my_mail_sender.send_gmail()
+    with metrics.span('mail') as record:
+        my_mail_sender.send_gmail()
+        record['rows'] = len(files_all)
+        record['bytes'] = sum(os.path.getsize(i) for i in files_all)
     logging.info(LOG_SUCCESS_E_MAILS)
 
 
 
 """
-Is called by crontab every 15 minutes and performs a data aquisition 
-and creates new 24 hours, 7 days, 31 days, and 365 days plots 
-with the acquired data. 
+Performs a data aquisition and writes the data to all data files.
+Only the modules needed for that are imported, so that the sensors
+are read right after the start of the script.
+
+@param sensor_data  DataAcquisition object to be reused for the measurement,
+                    if None, a new one is created
+@param buffer       BufferedDataWriter that keeps the measurement until
+                    its batch is written, if None, the data are written at once
+
+@return             boolean, 'True' if the data have been written
+"""
+def do_acquisition_mode(sensor_data=None, buffer=None):
+    from writer import DataFileWriter
+    
+    writer = DataFileWriter(sensor_data)
+    if buffer is None:
+        writer.write_to_files()
+    elif not buffer.add(writer):
+        return False
+    logging.info(LOG_SUCCESS_ACQUISITION)
+    return True
+
+
+
 """
-def do_continuous_mode():
-    writer = DataFileWriter()
-    writer.write_to_files()
+Creates new 24 hours, 48 hours, 7 days, 31 days, and 365 days plots 
+with the data acquired so far. Depending on the configuration, the data 
+of the plots are exported for the browser and/or the images are rendered.
+If PLOT_STATIONS is set, the plots of the other stations and the overlay 
+plots are rendered as well (see create_station_plots).
+
+@param scheduler    PlotJobScheduler to be reused for the plots,
+                    if None, a new one is created and closed afterwards
+"""
+def do_plot_mode(scheduler=None):
+    from scheduler import PlotJobScheduler
+    import images
     
     indices_24h = [IDX_TEMPERATURE, IDX_PRESSURE_SEA, IDX_HUMIDITY_REL]
     indices_48h = [IDX_TEMPERATURE, IDX_PRESSURE_SEA, IDX_HUMIDITY_REL]
@@ -142,13 +337,156 @@ def do_continuous_mode():
     indices_31d = [IDX_PRESSURE_SEA]
     indices_365d = [IDX_PRESSURE_SEA]
     
-    create_raw_data_plots(FILE_CONTINUOUS, TIME_DAY, indices_24h, PARAMETERS_DAY, PATH_IMAGES_WEB, PREFIX_24H, IMAGE_FORMAT_WEB)
-    create_raw_data_plots(FILE_CONTINUOUS, TIME_2DAYS, indices_48h, PARAMETERS_2DAYS, PATH_IMAGES_WEB, PREFIX_48H, IMAGE_FORMAT_WEB)
-    create_raw_data_plots(FILE_CONTINUOUS, TIME_WEEK, indices_7d, PARAMETERS_WEEK, PATH_IMAGES_WEB, PREFIX_7D, IMAGE_FORMAT_WEB)
-    create_raw_data_plots(FILE_CONTINUOUS, TIME_MONTH, indices_31d, PARAMETERS_MONTH, PATH_IMAGES_WEB, PREFIX_31D, IMAGE_FORMAT_WEB)
-    create_raw_data_plots(FILE_CONTINUOUS, TIME_YEAR, indices_365d, PARAMETERS_YEAR, PATH_IMAGES_WEB, PREFIX_365D, IMAGE_FORMAT_WEB)
+    windows = [[TIME_DAY, indices_24h, PARAMETERS_DAY, PREFIX_24H],
+               [TIME_2DAYS, indices_48h, PARAMETERS_2DAYS, PREFIX_48H],
+               [TIME_WEEK, indices_7d, PARAMETERS_WEEK, PREFIX_7D],
+               [TIME_MONTH, indices_31d, PARAMETERS_MONTH, PREFIX_31D],
+               [TIME_YEAR, indices_365d, PARAMETERS_YEAR, PREFIX_365D]]
+    
+    if EXPORT_PLOT_DATA:
+        from export import DataExport
+        with metrics.span('export'):
+            DataExport(windows).write()
+    if not RENDER_PLOT_IMAGES:
+        return
+    
+    is_scheduler_owned = scheduler is None
+    if is_scheduler_owned:
+        scheduler = PlotJobScheduler()
+    
+    # a host that only receives the data of other stations has no data of its own
+    snapshots = None
+    if os.path.exists(os.path.join(PATH_DATA, DIR_CONTINUOUS)):
+        snapshots = get_snapshots(windows)
+        for (time_max, indices, parameters_time, prefix) in windows:
+            create_raw_data_plots(scheduler, snapshots[time_max], time_max, indices, parameters_time, PATH_IMAGES_WEB, prefix, images.get_image_format(prefix))
+    if PLOT_STATIONS:
+        create_station_plots(scheduler, windows, snapshots)
+    
+    if run_plot_jobs(scheduler):
+        logging.info(LOG_SUCCESS_RAW_DATA_PLOTS)
+    if is_scheduler_owned:
+        scheduler.close()
+
+
+
+"""
+Is called by crontab every 15 minutes and performs a data aquisition 
+and creates new plots with the acquired data. 
+
+@param scheduler    PlotJobScheduler to be reused for the plots,
+                    if None, a new one is created and closed afterwards
+"""
+def do_continuous_mode(scheduler=None):
+    do_acquisition_mode()
+    do_plot_mode(scheduler)
+
+
+
+"""
+Runs as a long-running process instead of being called by crontab.
+The data are acquired every TIME_DATA, the plots are updated every TIME_PLOT,
+and the daily job runs at 00:05 (see WeatherDaemon). The sensors and the plot 
+worker processes (with their figure templates) are kept between the jobs.
+The measurements are written in batches (see BufferedDataWriter) on a thread
+of their own, so that the next acquisition (and its burst of samples, see 
+BURST_SAMPLES) does not have to wait for the write.
+If DAEMON_SERVER is set, the daemon also runs the server (see create_server)
+and pushes the rendered plots to the web page.
+"""
+def do_daemon_mode():
+    from concurrent.futures import ThreadPoolExecutor
+    from acqui import DataAcquisition
+    from writer import (DataFileWriter, BufferedDataWriter)
+    from scheduler import PlotJobScheduler
+    from daemon import WeatherDaemon
+    
+    sensor_data = DataAcquisition()
+    buffer = BufferedDataWriter()
+    executor_write = ThreadPoolExecutor(max_workers=1)
+    scheduler = PlotJobScheduler()
+    (server, ingest, hub) = create_server() if DAEMON_SERVER else (None, None, None)
+    
+    def write(writer):
+        metrics.set_mode('acquire')
+        try:
+            if buffer.add(writer):
+                metrics.write_textfile('acquire')
+            logging.info(LOG_SUCCESS_ACQUISITION)
+        except Exception:
+            logging.exception(LOG_ERROR_JOB + write.__name__)
+    
+    # the writer keeps the measured values, so that sensor_data can be reused right away
+    def acquire():
+        metrics.set_mode('acquire')
+        executor_write.submit(write, DataFileWriter(sensor_data))
+    
+    def plot():
+        metrics.set_mode('plot')
+        # waits for the pending writes, so that the plots show the measurement that has just been taken
+        executor_write.submit(lambda: None).result()
+        do_plot_mode(scheduler)
+        if hub is not None and RENDER_PLOT_IMAGES:
+            hub.publish_plots(scheduler.rendered)
+        metrics.write_textfile('plot')
+    
+    def daily():
+        metrics.set_mode('daily')
+        # the data of the last day must have been written (after the pending writes)
+        executor_write.submit(buffer.flush).result()
+        do_daily_mode(scheduler)
+        if hub is not None:
+            hub.publish_plots(scheduler.rendered)
+        metrics.write_textfile('daily')
+    
+    try:
+        WeatherDaemon(acquire, plot, daily, server).run()
+    finally:
+        executor_write.shutdown(wait=True)
+        buffer.flush()
+        scheduler.close()
+        if ingest is not None:
+            ingest.close()
+
+
+
+"""
+Creates the server that receives the measurements of other stations (see StationIngest
+and client.py), answers queries of the data of all stations (see QueryApi),
+and pushes the written measurements to the web page (see EventHub).
+
+@return server  HttpServer
+@return ingest  StationIngest, has to be closed after the server has stopped
+@return hub     EventHub, to publish the rendered plots
+"""
+def create_server():
+    from httpd import HttpServer
+    from ingest import StationIngest
+    from query import QueryApi
+    from events import EventHub
+    import writer
     
-    logging.info(LOG_SUCCESS_RAW_DATA_PLOTS)
+    server = HttpServer()
+    ingest = StationIngest()
+    ingest.add_routes(server)
+    QueryApi().add_routes(server)
+    hub = EventHub()
+    hub.add_routes(server)
+    writer.listeners.append(hub.publish_readings)
+    return server, ingest, hub
+
+
+
+"""
+Runs the server (see create_server) as a process of its own.
+The plots of the stations are created by the 'plot' mode (or the daemon).
+"""
+def do_server_mode():
+    (server, ingest, hub) = create_server()
+    try:
+        server.run()
+    finally:
+        ingest.close()
 
 
 
@@ -156,15 +494,57 @@ def do_continuous_mode():
 Run this script with one of the following parameters:
 
 continuous  Continous data acquisition and plot update.
+acquire     Data acquisition only (fast start, no plot modules are imported).
+plot        Plot update only, e.g., run later than or independent of 'acquire'.
+daemon      Long-running process that performs the tasks of 'continuous'
+            and 'daily' at their times without crontab.
 daily       Generation of the plots from last day's data.
             The corresponding plots are then sent by mail.
+server      Long-running server that receives the measurements 
+            of other stations (see client.py), answers queries
+            of the data (see query.py), and pushes new measurements
+            to the web page (see events.py).
+
+Option:
+--profile   Profiles the run with cProfile and writes the statistics
+            to the logs folder (e.g., continuous.prof, to be read by pstats).
+
+The durations, rows, and bytes of the stages of the run are written to the log
+and to the metrics folder (weather_<parameter>.prom, see metrics.py).
 """
 if __name__ == '__main__':
+    profile = None
+    # the daemon and the server set the modes of their threads themselves
+    is_mode_once = len(sys.argv) > 1 and sys.argv[1] in ('continuous', 'acquire', 'plot', 'daily')
+    if is_mode_once:
+        metrics.set_mode(sys.argv[1])
     try:
+        if '--profile' in sys.argv[2:]:
+            import cProfile
+            profile = cProfile.Profile()
+            profile.enable()
+        
         if sys.argv[1] == 'continuous':
             do_continuous_mode()
+        elif sys.argv[1] == 'acquire':
+            do_acquisition_mode()
+        elif sys.argv[1] == 'plot':
+            do_plot_mode()
+        elif sys.argv[1] == 'daemon':
+            do_daemon_mode()
         elif sys.argv[1] == 'daily':
             do_daily_mode()
+        elif sys.argv[1] == 'server':
+            do_server_mode()
+        
+        # the daemon and the server write their metrics after each job
+        if is_mode_once:
+            metrics.write_textfile(sys.argv[1])
     except:
         logging.exception('Exception stack trace:\n')
+    finally:
+        # a failed run is profiled as well
+        if profile is not None:
+            profile.disable()
+            profile.dump_stats(os.path.join(PATH_LOGS, sys.argv[1] + '.prof'))
 
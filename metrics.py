@@ -0,0 +1,147 @@
+import os
+import os.path
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+from constants import *
+
+
+
+
+"""
+Records of the stages that have been measured in the current process
+since the last metrics file of their mode has been written (see add_record).
+"""
+records = []
+"""
+Lock of the records, which are added by several threads in the daemon and the server.
+"""
+lock = threading.Lock()
+"""
+Mode of the run of the current thread (see set_mode), e.g., the acquisition thread,
+the plot thread, and the ingest thread of the daemon have different modes.
+"""
+context = threading.local()
+
+
+
+
+"""
+Measures the duration of a stage. The record of the stage is yielded,
+so that the number of rows and bytes of the stage can be set.
+If the stage raises an exception, the record is marked as failed.
+The record is not added to the metrics (see span).
+
+Usage:
+    with metrics.measure('plot', '24h_Temperature') as record:
+        ...
+        record['rows'] = len(unix_times)
+
+@param stage    string, name of the stage (e.g., 'acquisition', 'write', 'read', 'plot', 'mail')
+@param name     string, name of the item of the stage (e.g., the file or the plot)
+
+@return         dict with the keys 'stage', 'name', 'duration' (in seconds), 'rows', 'bytes', and 'failed'
+"""
+@contextmanager
+def measure(stage, name=''):
+    record = {'stage': stage, 'name': name, 'duration': 0., 'rows': None, 'bytes': None, 'failed': False}
+    time_start = time.perf_counter()
+    try:
+        yield record
+    except Exception:
+        record['failed'] = True
+        raise
+    finally:
+        record['duration'] = time.perf_counter() - time_start
+
+
+
+"""
+Measures the duration of a stage (see measure) and adds its record to the metrics,
+also if the stage fails, so that the failed runs are counted as well.
+
+@param stage    string, name of the stage
+@param name     string, name of the item of the stage
+
+@return         dict, record of the stage
+"""
+@contextmanager
+def span(stage, name=''):
+    try:
+        with measure(stage, name) as record:
+            yield record
+    finally:
+        add_record(record)
+
+
+
+"""
+Sets the mode of the run of the current thread. The records that are 
+added by the thread belong to that mode (see write_textfile).
+
+@param mode     string, mode of the run (e.g., 'acquire' or 'plot')
+"""
+def set_mode(mode):
+    context.mode = mode
+
+
+
+"""
+Adds the record of a stage to the metrics of the mode of the current thread
+and writes it to the log as JSON. If no mode has been set for the thread,
+the record is only written to the log.
+
+@param record   dict, record of the stage (see measure)
+"""
+def add_record(record):
+    record['mode'] = getattr(context, 'mode', None)
+    if record['mode'] is not None:
+        with lock:
+            records.append(record)
+    logging.info(LOG_METRICS + json.dumps(record, sort_keys=True))
+
+
+
+"""
+Writes the metrics of all stages of a mode since the last call to a file in the 
+textfile format of Prometheus (e.g., for the textfile collector of the node exporter)
+and clears them. Each mode has its own file, so that the runs of different
+modes do not overwrite each other. Stages with the same name are summed up.
+
+@param mode     string, mode of the run (e.g., 'continuous' or 'daily')
+"""
+def write_textfile(mode):
+    global records
+    with lock:
+        records_mode = [record for record in records if record['mode'] == mode]
+        records = [record for record in records if record['mode'] != mode]
+    if not WRITE_METRICS:
+        return
+
+    stages = {}
+    for record in records_mode:
+        stage = stages.setdefault((record['stage'], record['name']), {'duration': 0., 'rows': 0, 'bytes': 0, 'count': 0, 'failed': 0})
+        stage['duration'] += record['duration']
+        stage['rows'] += record['rows'] or 0
+        stage['bytes'] += record['bytes'] or 0
+        stage['count'] += 1
+        stage['failed'] += int(record['failed'])
+
+    lines = ['# HELP weather_run_timestamp_seconds Unix time of the end of the last run.',
+             '# TYPE weather_run_timestamp_seconds gauge',
+             'weather_run_timestamp_seconds{{mode="{0}"}} {1:.3f}'.format(mode, time.time())]
+    for (metric, key, description) in METRICS_STAGES:
+        lines.append('# HELP ' + metric + ' ' + description)
+        lines.append('# TYPE ' + metric + ' gauge')
+        for (stage, name), values in sorted(stages.items()):
+            lines.append('{0}{{mode="{1}",stage="{2}",name="{3}"}} {4}'.format(metric, mode, stage, name, values[key]))
+
+    os.makedirs(PATH_METRICS, exist_ok=True)
+    filepath = os.path.join(PATH_METRICS, 'weather_' + mode + METRICS_FILE_EXTENSION)
+    # the collector must never read a half-written file
+    with open(filepath + '.tmp', 'w') as file_metrics:
+        file_metrics.write('\n'.join(lines) + '\n')
+    os.replace(filepath + '.tmp', filepath)
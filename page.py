@@ -0,0 +1,217 @@
+import os.path
+import gzip
+import logging
+import shutil
+from string import Template
+import numpy as np
+
+from constants import *
+import utils
+import images
+
+
+
+
+"""
+Compiled templates of the web page, which map the paths of the templates
+to tuples (modification time, Template), see get_template.
+"""
+templates = {}
+
+"""
+Maps the paths of the pages that have been written by write_page to their
+modification times (in ns), so that they are not read again to find HTML_MARKER.
+"""
+pages = {}
+
+"""
+Paths of the pages that have been kept (see write_page), the warning is only logged once.
+"""
+pages_kept = set()
+
+
+
+
+"""
+Class for the values of the placeholders of the template of the web page.
+Placeholders without a value (e.g., the 24h statistics before the first
+measurement) are replaced by '-' instead of being left in the page.
+"""
+class PageValues(dict):
+
+    """
+    @param key  string, placeholder without a value
+
+    @return     string, '-'
+    """
+    def __missing__(self, key):
+        return '-'
+
+
+
+
+"""
+Returns the compiled template of the web page. The template is only read
+again if it has been changed since it has been compiled.
+
+@return     string.Template, template of the web page
+"""
+def get_template():
+    filepath = os.path.join(os.path.dirname(os.path.abspath(__file__)), FILE_HTML_TEMPLATE)
+    mtime = os.path.getmtime(filepath)
+    if filepath not in templates or templates[filepath][0] != mtime:
+        with open(filepath, 'r') as file_template:
+            templates[filepath] = (mtime, Template(file_template.read()))
+    return templates[filepath][1]
+
+
+
+"""
+Returns a formatted value of a quantity.
+
+@param index    int, column index (IDX_*) of the quantity
+@param value    float, value (NaN if missing)
+@param sign     boolean, if True, positive values get a '+' sign (e.g., for trends)
+
+@return         string, formatted value, '-' if it is missing
+"""
+def format_value(index, value, sign=False):
+    if value != value:
+        return '-'
+    text = DICT_IDX_FORMATS[index].format(value)
+    return '+' + text if sign and value >= 0. else text
+
+
+
+"""
+Returns the statistics of the last 24 hours and the trends of all quantities
+for the placeholders <column>_min_24h, <column>_max_24h, and <column>_trend
+(the change within TIME_TREND) of the template of the web page.
+
+@param unix_times   float numpy array, unix times of the last 24 hours
+@param data         list of float numpy arrays, values of the quantities
+                    of DICT_IDX_COLUMNS in that order
+
+@return             dict, maps the placeholders to the formatted values
+"""
+def get_summary_values(unix_times, data):
+    values = {}
+    if len(unix_times) == 0:
+        return values
+    # the row of the trend is the last one before or at TIME_TREND ago
+    row_trend = np.searchsorted(unix_times, unix_times[-1] - TIME_TREND, side='right') - 1
+    for index, field in zip(DICT_IDX_COLUMNS, data):
+        column = DICT_IDX_COLUMNS[index]
+        if np.all(np.isnan(field)):
+            continue
+        values[column + '_min_24h'] = format_value(index, np.nanmin(field))
+        values[column + '_max_24h'] = format_value(index, np.nanmax(field))
+        if row_trend >= 0:
+            values[column + '_trend'] = format_value(index, field[-1] - field[row_trend], True)
+    return values
+
+
+
+"""
+Returns the images of the other stations and the overlay plots 
+(see create_station_plots in main.py) for the placeholder $station_images, 
+one section for the overlay plots and one for each station. Only the images
+that have been rendered are included, in the order of their time spans.
+
+@return     string, html of the images, empty if PLOT_STATIONS is not set
+"""
+def get_station_images():
+    if not PLOT_STATIONS:
+        return ''
+    filenames_web = sorted(os.listdir(PATH_IMAGES_WEB)) if os.path.isdir(PATH_IMAGES_WEB) else []
+    filenames_stations = sorted(os.listdir(PATH_IMAGES_STATIONS)) if os.path.isdir(PATH_IMAGES_STATIONS) else []
+    sections = [('All stations', 'images/', filenames_web, '{0}_' + PREFIX_OVERLAY + '_')]
+    sections += [(station, 'images/stations/', filenames_stations, station + '_{0}_') for station in utils.get_stations()]
+
+    lines = []
+    for (title, url, filenames, start) in sections:
+        lines_section = []
+        for prefix in (PREFIX_24H, PREFIX_48H, PREFIX_7D, PREFIX_31D, PREFIX_365D):
+            extension = '.' + images.get_image_format(prefix)
+            for filename in filenames:
+                if filename.startswith(start.format(prefix)) and filename.endswith(extension):
+                    label = filename[len(start.format(prefix)):-len(extension)].replace('_', ' ')
+                    lines_section.append('<img src="{0}" alt="{1}, {2}, {3}">'.format(url + filename, label, title, prefix))
+        if len(lines_section) > 0:
+            lines += ['<h2>' + title + '</h2>'] + lines_section
+    return '\n'.join(lines)
+
+
+
+"""
+Checks if a page has been rendered from the template (i.e., it contains HTML_MARKER)
+or does not exist yet, so that it may be replaced. 
+
+@param filepath     string, path of the page
+
+@return             boolean, 'True' if the page may be replaced
+"""
+def is_page_rendered(filepath):
+    if not os.path.isfile(filepath):
+        return True
+    mtime = os.stat(filepath).st_mtime_ns
+    if pages.get(filepath) == mtime:
+        return True
+    with open(filepath, 'rb') as file_page:
+        return HTML_MARKER.encode('utf-8') in file_page.read()
+
+
+
+"""
+Copies the script that updates the web page with the server-sent events 
+(see FILE_EVENTS_SCRIPT) to PATH_HTML, if it is missing or outdated there.
+"""
+def copy_events_script():
+    filepath_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), FILE_EVENTS_SCRIPT)
+    filepath_script_html = os.path.join(PATH_HTML, FILE_EVENTS_SCRIPT)
+    if not os.path.isfile(filepath_script_html) or os.path.getmtime(filepath_script_html) < os.path.getmtime(filepath_script):
+        shutil.copyfile(filepath_script, filepath_script_html)
+
+
+
+"""
+Renders the web page from its template (see FILE_HTML_TEMPLATE) and writes it
+atomically to PATH_HTML, together with a gzip-compressed copy if WRITE_HTML_GZIP is set.
+If URL_EVENTS_PAGE is set, the page includes the script of the events (see copy_events_script).
+An existing page that has not been rendered from the template is not replaced
+(unless REPLACE_HTML_PAGE is set), the page is written to FILE_HTML_RENDERED instead.
+The template has placeholders like $temperature, $temperature_min_24h,
+$image_format_24h, or $station_images (a '$' that is not a placeholder 
+has to be written as '$$').
+
+@param values   dict, maps the placeholders to their values
+
+@return         int, number of bytes written
+"""
+def write_page(values):
+    values = PageValues(values)
+    values.setdefault('altitude', str(ALTITUDE))
+    values.setdefault('image_format', IMAGE_FORMAT_WEB)
+    for prefix in (PREFIX_24H, PREFIX_48H, PREFIX_7D, PREFIX_31D, PREFIX_365D):
+        values.setdefault('image_format_' + prefix, images.get_image_format(prefix))
+    values.setdefault('events_script', '' if not URL_EVENTS_PAGE else 
+                      '<script src="' + FILE_EVENTS_SCRIPT + '" data-url="' + URL_EVENTS_PAGE + '"></script>')
+    values.setdefault('station_images', get_station_images())
+    if URL_EVENTS_PAGE:
+        copy_events_script()
+    data = (get_template().substitute(values) + HTML_MARKER + '\n').encode('utf-8')
+
+    filepath = os.path.join(PATH_HTML, FILE_HTML)
+    if not REPLACE_HTML_PAGE and not is_page_rendered(filepath):
+        if filepath not in pages_kept:
+            logging.warning(LOG_WARNING_PAGE_KEPT.format(filepath, FILE_HTML_RENDERED))
+            pages_kept.add(filepath)
+        filepath = os.path.join(PATH_HTML, FILE_HTML_RENDERED)
+    utils.write_file_atomic(filepath, data)
+    pages[filepath] = os.stat(filepath).st_mtime_ns
+    number_of_bytes = len(data)
+    if WRITE_HTML_GZIP:
+        data_gzip = gzip.compress(data, compresslevel=9, mtime=0)
+        utils.write_file_atomic(filepath + '.gz', data_gzip)
+        number_of_bytes += len(data_gzip)
+    return number_of_bytes
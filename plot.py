@@ -2,14 +2,19 @@ import os.path
 import matplotlib
 # use matplotlib without GUI
 matplotlib.use('Agg')
-from matplotlib import pyplot as plt
+from matplotlib.figure import Figure
 from matplotlib.ticker import AutoMinorLocator
 from math import (exp, atan)
 from datetime import datetime
+import hashlib
+import pickle
+import numpy as np
 
 from constants import *
 from reader import DataFileReader
 import utils
+import aggregate
+import images
 
 
 
@@ -36,6 +41,14 @@ Members:
     indices                 int list, list of the indices for the fields from self.data to be plotted
     ticks                   float list, list of unix time tick values
     tick_labels             string list, list of tick labels
+    envelopes               list, for each field of self.data either None or a tuple
+                            (lower, upper) of float lists, which is plotted 
+                            as a shaded area around the field (e.g. min and max)
+    labels                  string list, legend label for each field of self.data 
+                            (e.g., the stations of an overlay plot), None for no legend
+    is_downsampled          boolean, if True, each field is reduced to its minimum 
+                            and maximum per pixel column before it is plotted
+    refresh_interval        int, minimum time between two renderings of the image in seconds
     OFFSET_TIME             int, total time offset in seconds (more explanation in ceil_to_next_multiple method
 
 """
@@ -54,13 +67,19 @@ class PlotCreation:
     @param parameters_field         string list, parameters for plotting (e.g. label, unit, color, linestyle)
     @param parameters_time_period   list, parameters that are dependent on the time period of the plot (day, week, month),
                                     i.e.: label for x-axis, maximum time, major and minor ticks for time axis, 
-                                    labels for major ticks
+                                    labels for major ticks, minimum time between two renderings
+    @param envelopes                list, for each field of data either None or a tuple (lower, upper) 
+                                    of float lists to be shaded around the field (None for no envelopes)
+    @param labels                   string list, legend label for each field of data, which are
+                                    then drawn in the colors COLORS_OVERLAY (None for no legend)
     """
-    def __init__(self, unix_times, data, path_image, prefix, image_format, parameters_field, parameters_time_period):
+    def __init__(self, unix_times, data, path_image, prefix, image_format, parameters_field, parameters_time_period, envelopes=None, labels=None):
         filename = '_'.join(parameters_field[0].split(' '))
         
         self.unix_times = unix_times
         self.data = data
+        self.envelopes = [None for field in data] if envelopes is None else envelopes
+        self.labels = labels
         self.path_file = os.path.join(path_image, prefix+'_'+filename+'.'+image_format)
         self.label = parameters_field[0] + ' [' + parameters_field[1] + ']'
         self.color = parameters_field[2]
@@ -70,8 +89,10 @@ class PlotCreation:
         self.time_minor_ticks = parameters_time_period[2]
         self.time_major_ticks =  parameters_time_period[3]
         self.time_major_tick_labels =  parameters_time_period[4]
+        self.refresh_interval = parameters_time_period[5]
         self.ticks = []
         self.tick_labels = []
+        self.is_downsampled = DOWNSAMPLE_PLOTS and self.time_max >= TIME_DOWNSAMPLE_MIN
 
         self.OFFSET_TIME = self.get_time_offset()
 
@@ -179,26 +200,230 @@ class PlotCreation:
 
 
     """
-    Creates the actual plots according from the fields in self.data 
-    which match the indices self.indices.
+    Returns the unix times and values of a field to be plotted. If the plot
+    is downsampled, only the minimum and maximum values per pixel column 
+    of the image are returned (which looks the same in the image).
+
+    @param field            float list, field of self.data
+
+    @return unix_times      list, unix times to be plotted
+    @return values          list, values to be plotted
+    """
+    def get_plot_data(self, field):
+        if self.is_downsampled:
+            return aggregate.get_min_max_envelope(self.unix_times, field, PLOT_WIDTH_PIXELS)
+        return self.unix_times, field
+
+
+
+    """
+    Returns the unix times and bounds of an envelope to be plotted. If the plot 
+    is downsampled, the bounds are reduced to their extremes per pixel column.
+
+    @param envelope         tuple (lower, upper) of float lists
+
+    @return unix_times      list, unix times to be plotted
+    @return lower           list, lower bounds to be plotted
+    @return upper           list, upper bounds to be plotted
+    """
+    def get_plot_envelope(self, envelope):
+        if self.is_downsampled:
+            return aggregate.get_binned_envelope(self.unix_times, envelope[0], envelope[1], PLOT_WIDTH_PIXELS)
+        return (self.unix_times,) + tuple(envelope)
+
+
+
+    """
+    Returns the figure template for this plot. Templates are kept for the 
+    lifetime of the process and are shared by all plots of the same quantity 
+    and time period. If CACHE_FIGURE_TEMPLATES is set, they are also 
+    pickled to PATH_CACHE so that following runs can reuse them.
+
+    @return     FigureTemplate, template for this plot
+    """
+    def get_figure_template(self):
+        key = (self.label, self.color, self.linestyle, self.xlabel, 
+               self.time_major_ticks, self.time_minor_ticks, len(self.data), 
+               None if self.labels is None else tuple(self.labels))
+        if key in figure_templates:
+            return figure_templates[key]
+        
+        filepath = os.path.join(PATH_CACHE, hashlib.md5(repr(key).encode('utf-8')).hexdigest() + '.pickle')
+        template = None
+        if CACHE_FIGURE_TEMPLATES and os.path.isfile(filepath):
+            with open(filepath, 'rb') as file_template:
+                template = pickle.load(file_template)
+        if template is None:
+            template = FigureTemplate(self)
+            if CACHE_FIGURE_TEMPLATES:
+                os.makedirs(PATH_CACHE, exist_ok=True)
+                with open(filepath, 'wb') as file_template:
+                    pickle.dump(template, file_template)
+        
+        figure_templates[key] = template
+        return template
+
+
+
+    """
+    Checks if the minimum time between two renderings of the image has passed.
+
+    @return     boolean, 'True' if the image does not exist or is older than self.refresh_interval
+    """
+    def is_refresh_due(self):
+        if not os.path.isfile(self.path_file):
+            return True
+        return datetime.now().timestamp() - os.path.getmtime(self.path_file) >= self.refresh_interval
+
+
+
+    """
+    Returns the path of the file storing the render key of the image (see get_render_key).
+
+    @return     string, path of the render key file in PATH_CACHE
+    """
+    def get_render_key_path(self):
+        return os.path.join(PATH_CACHE, hashlib.md5(self.path_file.encode('utf-8')).hexdigest() + RENDER_KEY_EXTENSION)
+
+
+
+    """
+    Returns a hash of everything that determines the image: the (downsampled) 
+    data and envelopes to be plotted, the styling, the ticks, and the image settings.
+    If the render key of a plot is the same as the one of the existing image,
+    the image would be identical and does not have to be rendered again.
+
+    @param plot_data        list, one tuple (unix_times, values) for each line
+    @param plot_envelopes   list, one tuple (unix_times, lower, upper) 
+                            or None for each line
+
+    @return                 string, render key
+    """
+    def get_render_key(self, plot_data, plot_envelopes):
+        render_hash = hashlib.md5(repr((self.path_file, self.label, self.color, self.linestyle, self.xlabel, 
+                                        self.time_major_ticks, self.time_minor_ticks,
+                                        self.ticks, self.tick_labels, self.labels,
+                                        IMAGE_DPI, SVG_DECIMALS, IMAGE_COMPRESSION)).encode('utf-8'))
+        for arrays in plot_data + [envelope for envelope in plot_envelopes if envelope is not None]:
+            for array in arrays:
+                render_hash.update(np.asarray(array, dtype=STORE_DTYPE).tobytes())
+        return render_hash.hexdigest()
+
+
+
+    """
+    Creates the actual plots according from the fields in self.data.
+    Instead of building a new figure, only the data, limits, and ticks
+    of the figure template of the plot are updated. The image is not 
+    rendered again if its minimum refresh interval has not passed yet
+    or if it would be identical to the existing image (see get_render_key).
+
+    @return     boolean, 'True' if the image has been rendered
     """
     def create_plot(self):    
-        fig, ax = plt.subplots()
-            
-        ax.set_xticks(self.ticks)
-        ax.set_xticklabels(self.tick_labels) #, rotation='vertical')
-        ax.xaxis.set_minor_locator(AutoMinorLocator(self.time_major_ticks//self.time_minor_ticks))
-        ax.tick_params(which='minor', length=3)
-        ax.tick_params(which='major', length=6)
+        if not self.is_refresh_due():
+            return False
+        
+        plot_data = [self.get_plot_data(field) for field in self.data]
+        plot_envelopes = [None if envelope is None else self.get_plot_envelope(envelope) 
+                          for envelope in self.envelopes]
+        
+        render_key = self.get_render_key(plot_data, plot_envelopes)
+        filepath_render_key = self.get_render_key_path()
+        if os.path.isfile(self.path_file) and os.path.isfile(filepath_render_key):
+            with open(filepath_render_key, 'r') as file_render_key:
+                if file_render_key.read() == render_key:
+                    return False
         
+        template = self.get_figure_template()
+        template.update(plot_data, plot_envelopes, self.ticks, self.tick_labels)
+        images.save_figure(template.figure, self.path_file)
+        
+        os.makedirs(PATH_CACHE, exist_ok=True)
+        with open(filepath_render_key, 'w') as file_render_key:
+            file_render_key.write(render_key)
+        return True
+
 
-        for field in self.data:
-            plt.plot(self.unix_times, field, color=self.color, linestyle=self.linestyle)
-        plt.margins(x=0.0)
-        plt.xlabel(self.xlabel)
-        plt.ylabel(self.label)
-        plt.grid(color='#dddddd')
-        plt.savefig(self.path_file)
-        plt.clf()
-        plt.cla()
-        plt.close()
+
+
+"""
+Figure templates of the current process (see PlotCreation.get_figure_template).
+"""
+figure_templates = {}
+
+
+
+
+"""
+Class for a reusable figure. The figure, its axes, the styling, 
+and the line artists are created only once. For each plot, only the line data, 
+envelopes, limits, and ticks are updated before the figure is saved.
+
+Members:
+    figure      matplotlib Figure, the figure
+    axes        matplotlib Axes, the axes of the figure
+    lines       list of matplotlib Line2D, one line for each field of data
+    envelopes   list of matplotlib PolyCollection, shaded envelopes of the last update
+"""
+class FigureTemplate:
+    
+    """
+    Constructor, creates the figure with the styling of a given plot.
+    
+    @param plot     PlotCreation, plot that defines the styling
+    """
+    def __init__(self, plot):
+        # the figure is not managed by pyplot, so it does not need to be closed
+        self.figure = Figure()
+        self.axes = self.figure.subplots()
+        self.envelopes = []
+        
+        self.axes.xaxis.set_minor_locator(AutoMinorLocator(plot.time_major_ticks//plot.time_minor_ticks))
+        self.axes.tick_params(which='minor', length=3)
+        self.axes.tick_params(which='major', length=6)
+        if plot.labels is None:
+            self.lines = [self.axes.plot([], [], color=plot.color, linestyle=plot.linestyle)[0] for field in plot.data]
+        else:
+            self.lines = [self.axes.plot([], [], color=COLORS_OVERLAY[i % len(COLORS_OVERLAY)], linestyle=plot.linestyle, label=label)[0] 
+                          for i, label in enumerate(plot.labels)]
+            self.axes.legend(loc='upper left', fontsize='small')
+        self.axes.margins(x=0.0)
+        self.axes.set_xlabel(plot.xlabel)
+        self.axes.set_ylabel(plot.label)
+        self.axes.grid(color='#dddddd')
+
+
+
+    """
+    Updates the data, envelopes, limits, and ticks of the figure.
+    
+    @param plot_data        list, one tuple (unix_times, values) for each line
+    @param plot_envelopes   list, one tuple (unix_times, lower, upper) 
+                            or None for each line
+    @param ticks            float list, list of unix time tick values
+    @param tick_labels      string list, list of tick labels
+    """
+    def update(self, plot_data, plot_envelopes, ticks, tick_labels):
+        for envelope in self.envelopes:
+            envelope.remove()
+        self.envelopes = []
+        
+        for line, (unix_times, values) in zip(self.lines, plot_data):
+            line.set_data(unix_times, values)
+        
+        self.axes.relim()
+        for plot_envelope in plot_envelopes:
+            if plot_envelope is None:
+                continue
+            (unix_times, lower, upper) = plot_envelope
+            self.envelopes.append(self.axes.fill_between(unix_times, lower, upper, color=self.lines[0].get_color(), 
+                                                         alpha=ALPHA_ENVELOPE, linewidth=0))
+            # relim() does not take the envelopes into account
+            for bounds in (lower, upper):
+                points = np.column_stack((unix_times, bounds))
+                self.axes.update_datalim(points[~np.isnan(points).any(axis=1)])
+        self.axes.autoscale_view()
+        
+        self.axes.set_xticks(ticks)
+        self.axes.set_xticklabels(tick_labels) #, rotation='vertical')
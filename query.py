@@ -0,0 +1,336 @@
+import os
+import os.path
+import re
+import time
+from collections import OrderedDict
+from http import HTTPStatus
+import numpy as np
+
+from constants import *
+from store import DataStore
+from httpd import (HttpError, HttpResponse, get_json_response)
+import utils
+import aggregate
+
+
+
+
+"""
+Class for a copy of the continuous data store of a station in memory.
+The column files are copied once, afterwards only the slots that have been
+written since the last update are copied (see DataStore.written_slots), which
+may lie before the last slot, e.g., for late measurements of a station.
+An update is triggered by a new header of the store, which is written after
+every batch of measurements, so the data are only read from the storage 
+when there are new measurements.
+All read methods of DataStore (e.g., read_columns) work on the copy.
+
+Members:
+    see DataStore
+    arrays          dict, maps the names of the columns to numpy arrays
+                    with the slots of the ring buffer
+    mtime_header    int, modification time of the header of the copied data (in ns)
+"""
+class StoreIndex(DataStore):
+
+    """
+    Constructor, copies the store of a station. The store is not created
+    by a query, a missing store is empty until it is written.
+
+    @param station  string, ID of the station, None for this station
+    """
+    def __init__(self, station=None):
+        super().__init__(utils.get_station_dir(station, DIR_CONTINUOUS), create=False)
+        self.arrays = {}
+        self.mtime_header = None
+        self.update()
+
+
+
+    """
+    Returns the in-memory copy of a column.
+
+    @param column   string, name of the column
+    @param mode     string, only 'r' is supported by the copy
+
+    @return         numpy array of all slots of the column
+    """
+    def map_column(self, column, mode='r'):
+        return self.arrays[column]
+
+
+
+    """
+    Copies the slots that have been written since the last update,
+    if the header of the store has changed. The whole store is copied
+    if its layout has changed (e.g., after a resize) or if more than one
+    write has taken place since the last update, since only the slots
+    of the last write are known.
+
+    @return     boolean, 'True' if the copy has been updated
+    """
+    def update(self):
+        filepath = os.path.join(self.path, FILE_STORE_HEADER)
+        mtime_header = os.stat(filepath).st_mtime_ns if os.path.isfile(filepath) else None
+        if mtime_header == self.mtime_header:
+            return False
+
+        layout = (self.capacity, self.time_slot, self.origin)
+        writes = self.writes
+        self.read_header()
+        if self.is_empty():
+            self.arrays = {}
+            self.mtime_header = mtime_header
+            return True
+
+        if len(self.arrays) == 0 or layout != (self.capacity, self.time_slot, self.origin) \
+           or self.writes != writes + 1 or self.written_slots is None:
+            self.arrays = {column : np.fromfile(self.get_column_path(column), dtype=STORE_DTYPE) for column in self.columns}
+        else:
+            slots = np.arange(max(self.written_slots[0], self.last_slot - self.capacity + 1), self.written_slots[1])
+            positions = slots % self.capacity
+            for column in self.columns:
+                self.arrays[column][positions] = DataStore.map_column(self, column)[positions]
+        self.mtime_header = mtime_header
+        return True
+
+
+
+
+"""
+Class for the query API of the server, which returns the latest measurement
+and the measurements of a time range of a station as JSON or binary data:
+
+    GET /api/latest?station=garden
+    GET /api/range?station=garden&start=1700000000&end=1700086400
+                  &columns=temperature,pressure_sea&step=3600&format=binary
+
+Without station, the data of this station are returned. The rows later than start
+and not later than end are returned, without start and end, the ones of the last
+TIME_QUERY_DEFAULT seconds up to the latest measurement.
+With step, the rows are resampled to the means of bins of that length 
+(in seconds). The binary format consists of the float64 (little-endian) 
+columns of the unix times and the requested quantities one after another.
+
+The queries are answered from in-memory copies of the stores (see StoreIndex),
+which are checked for new measurements at most every TIME_QUERY_CHECK seconds.
+The responses are kept in an LRU cache until the data of their station change,
+so that many clients polling the same data do not cost any work.
+
+Members:
+    indices             OrderedDict, maps the stations to their StoreIndex objects
+                        (least recently used first, at most QUERY_INDICES_MAX)
+    unix_times_check    dict, maps the stations to the unix times of the last check
+                        for new measurements
+    cache               OrderedDict, maps the queries to their responses
+                        (least recently used first, at most QUERY_CACHE_ENTRIES)
+"""
+class QueryApi:
+
+    """
+    Constructor, initiates the indices and the cache.
+    """
+    def __init__(self):
+        self.indices = OrderedDict()
+        self.unix_times_check = {}
+        self.cache = OrderedDict()
+
+
+
+    """
+    Adds the handlers of the queries to an HttpServer.
+
+    @param server   HttpServer
+    """
+    def add_routes(self, server):
+        server.add_route('GET', URL_QUERY_LATEST, self.handle_latest)
+        server.add_route('GET', URL_QUERY_RANGE, self.handle_range)
+
+
+
+    """
+    Returns the up-to-date in-memory copy of the store of a station.
+    If the copy has been updated, the cached responses of the station are dropped.
+
+    @param station  string, ID of the station, None for this station
+
+    @return         StoreIndex
+    """
+    def get_index(self, station):
+        index = self.indices.get(station)
+        if index is None:
+            # a store must not be created by a query
+            if station is not None and not os.path.isdir(os.path.join(PATH_DATA, utils.get_station_dir(station, DIR_CONTINUOUS))):
+                raise HttpError(HTTPStatus.NOT_FOUND, 'Unknown station')
+            index = StoreIndex(station)
+            self.indices[station] = index
+            self.unix_times_check[station] = time.time()
+            if len(self.indices) > QUERY_INDICES_MAX:
+                (station_removed, index_removed) = self.indices.popitem(last=False)
+                del self.unix_times_check[station_removed]
+        elif time.time() - self.unix_times_check[station] >= TIME_QUERY_CHECK:
+            self.unix_times_check[station] = time.time()
+            if index.update():
+                for key in [key for key in self.cache if key[0] == station]:
+                    del self.cache[key]
+        self.indices.move_to_end(station)
+        return index
+
+
+
+    """
+    Returns the station of a query.
+
+    @param request  HttpRequest
+
+    @return         string, ID of the station, None for this station
+    """
+    def get_station(self, request):
+        station = request.query.get('station', STATION_LOCAL)
+        if station == STATION_LOCAL:
+            return None
+        if not re.fullmatch(STATION_ID_PATTERN, station):
+            raise HttpError(HTTPStatus.BAD_REQUEST, 'Invalid station ID')
+        return station
+
+
+
+    """
+    Returns the cached response of a query or creates it.
+
+    @param station      string, ID of the station, None for this station
+    @param request      HttpRequest
+    @param get_response function with the StoreIndex and the HttpRequest as parameters,
+                        returns the HttpResponse
+
+    @return             HttpResponse
+    """
+    def get_cached_response(self, station, request, get_response):
+        index = self.get_index(station)
+        key = (station, request.path, tuple(sorted(request.query.items())))
+        response = self.cache.get(key)
+        if response is None:
+            response = get_response(index, request)
+            self.cache[key] = response
+            if len(self.cache) > QUERY_CACHE_ENTRIES:
+                self.cache.popitem(last=False)
+        self.cache.move_to_end(key)
+        return response
+
+
+
+    """
+    Handles a query of the latest measurement.
+
+    @param request  HttpRequest
+
+    @return         HttpResponse
+    """
+    async def handle_latest(self, request):
+        return self.get_cached_response(self.get_station(request), request, get_latest_response)
+
+
+
+    """
+    Handles a query of a time range.
+
+    @param request  HttpRequest
+
+    @return         HttpResponse
+    """
+    async def handle_range(self, request):
+        return self.get_cached_response(self.get_station(request), request, get_range_response)
+
+
+
+
+"""
+Returns a float parameter of a query.
+
+@param request  HttpRequest
+@param name     string, name of the parameter
+@param default  float, value if the parameter is missing
+
+@return         float, value of the parameter
+"""
+def get_float_parameter(request, name, default=None):
+    value = request.query.get(name)
+    if value is None:
+        return default
+    try:
+        value = float(value)
+    except ValueError:
+        value = float('nan')
+    if not np.isfinite(value):
+        raise HttpError(HTTPStatus.BAD_REQUEST, 'Invalid ' + name)
+    return value
+
+
+
+"""
+Returns the JSON values of a numpy array (missing values as null).
+
+@param values   float numpy array
+
+@return         list of floats and None
+"""
+def get_json_values(values):
+    return [None if value != value else value for value in values.tolist()]
+
+
+
+"""
+Returns the response to a query of the latest measurement of a station.
+
+@param index    StoreIndex of the station
+@param request  HttpRequest
+
+@return         HttpResponse
+"""
+def get_latest_response(index, request):
+    if index.is_empty():
+        raise HttpError(HTTPStatus.NOT_FOUND, 'No data')
+    arrays = index.read_slots(index.columns, index.last_slot, index.last_slot + 1)
+    return get_json_response({column : get_json_values(values)[0] for column, values in zip(index.columns, arrays)})
+
+
+
+"""
+Returns the response to a query of a time range of a station.
+
+@param index    StoreIndex of the station
+@param request  HttpRequest
+
+@return         HttpResponse
+"""
+def get_range_response(index, request):
+    columns = request.query.get('columns')
+    indices_columns = {column : index_column for index_column, column in DICT_IDX_COLUMNS.items()}
+    columns = list(indices_columns) if columns is None else columns.split(',')
+    if any(column not in indices_columns for column in columns):
+        raise HttpError(HTTPStatus.BAD_REQUEST, 'Invalid columns')
+    indices = [indices_columns[column] for column in columns]
+
+    unix_time_last = 0. if index.is_empty() else float(index.read_slots([COLUMN_UNIX_TIME], index.last_slot, index.last_slot + 1)[0][0])
+    end = get_float_parameter(request, 'end', unix_time_last)
+    start = get_float_parameter(request, 'start', end - TIME_QUERY_DEFAULT)
+    (unix_times, data) = index.read_columns(indices, start)
+    row_end = np.searchsorted(unix_times, end, side='right')
+    unix_times = unix_times[:row_end]
+    data = [values[:row_end] for values in data]
+
+    step = get_float_parameter(request, 'step')
+    if step is not None:
+        if step <= 0.:
+            raise HttpError(HTTPStatus.BAD_REQUEST, 'Invalid step')
+        (unix_times, data) = aggregate.get_resampled_means(unix_times, data, step)
+    if len(unix_times) > QUERY_ROWS_MAX:
+        raise HttpError(HTTPStatus.BAD_REQUEST, 'Too many rows, use a larger step')
+
+    if request.query.get('format', 'json') == 'binary':
+        body = b''.join(np.asarray(values, dtype='<f8').tobytes() for values in [unix_times] + data)
+        return HttpResponse(HTTPStatus.OK, body, 'application/octet-stream',
+                            {'X-Columns': ','.join([COLUMN_UNIX_TIME] + columns), 'X-Rows': str(len(unix_times))})
+    response = {COLUMN_UNIX_TIME: unix_times.tolist()}
+    response.update({column : get_json_values(values) for column, values in zip(columns, data)})
+    return get_json_response(response)
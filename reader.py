@@ -2,18 +2,22 @@ from datetime import datetime
 from math import (exp, atan)
 
 import os.path
+import numpy as np
+
 from constants import *
+from store import DataStore
 import utils
+import metrics
 
 
 
 
 """
-Class for reading data from data files 
+Class for reading data from data files or from the binary store
 and extracting data values as a two-dimensional list.
 
 Members:
-    filename    string, filename to be read
+    filename    string, filename (or directory name of the store) to be read
     indices     int list, indices of columns whose data 
                 should be extracted  
     time_max    int, maximum time from now to the past in seconds 
@@ -21,6 +25,7 @@ Members:
     unix_times  int list, list of unix times 
                 that correspond to the read data
     data        list of float lists, 2D list that contains the read data
+    unix_time_now   float, unix time at which the data have been read
 """
 class DataFileReader:
     
@@ -40,6 +45,7 @@ class DataFileReader:
         self.time_max = time_max
         self.unix_times = []
         self.data = [[0.0]*len(indices)]
+        self.unix_time_now = None
 
 
 
@@ -54,7 +60,7 @@ class DataFileReader:
     """
     def is_within_time_range(self, line):
         words = line.split('\t')
-        unix_time = utils.get_unix_time(words[IDX_DATE], words[IDX_TIME])
+        unix_time = utils.get_unix_time_of_words(words)
         if (unix_time > unix_time_now - time_max):
             return True
         return False
@@ -63,35 +69,121 @@ class DataFileReader:
     
     """
     Reads the data from self.filename and fills self.data with the extracted fields.
+    If self.filename is the directory of a binary store, the data are read from 
+    the store, otherwise from the tab-separated text file.
+    The duration, rows, and bytes of the read are added to the metrics.
     """
     def read_data(self):
-        unix_time_now = datetime.now().timestamp()
+        self.unix_time_now = datetime.now().timestamp()
         filepath = os.path.join(PATH_DATA, self.filename)
         
-        lines_all = []
-        lines = []
-       
-        with open(filepath, 'r') as file_data:
-            lines_all = file_data.readlines()
+        with metrics.span('read', self.filename) as record:
+            if os.path.isdir(filepath):
+                record['bytes'] = self.read_data_store(self.unix_time_now)
+            else:
+                record['bytes'] = self.read_data_text(filepath, self.unix_time_now)
+            record['rows'] = len(self.unix_times)
+
+
+
+    """
+    Reads the data from the binary store self.filename. self.unix_times 
+    and the fields of self.data are zero-copy slices of the memory-mapped store.
+
+    @param unix_time_now    float, current unix time
+
+    @return                 int, number of bytes of the read data
+    """
+    def read_data_store(self, unix_time_now):
+        store = DataStore(self.filename)
+        time_min = None if self.time_max is None else unix_time_now - self.time_max
+        (self.unix_times, self.data) = store.read_columns(self.indices, time_min)
+        return self.unix_times.nbytes + sum(field.nbytes for field in self.data)
+
+
+
+    """
+    Reads the data from the tab-separated text file.
+
+    @param filepath         string, path of the file to be read
+    @param unix_time_now    float, current unix time
+
+    @return                 int, number of bytes read
+    """
+    def read_data_text(self, filepath, unix_time_now):
+        self.data = [[] for index in self.indices]
         
-        if self.time_max is None:
-            count = 0
+        with open(filepath, 'rb') as file_data:
+            offset = 0
+            if self.time_max is not None:
+                offset = utils.get_offset_of_first_line_within_time_range(file_data, unix_time_now - self.time_max)
+                file_data.seek(offset)
+            
+            # only the lines within the time range are read
+            for line in file_data:
+                words = line.decode('utf-8').split('\t')
+                unix_time = utils.get_unix_time_of_words(words)
+                
+                self.unix_times.append(unix_time)
+                for i, index in enumerate(self.indices):
+                    self.data[i].append(float(words[index]))
+            return file_data.tell() - offset
+
+
+
+
+"""
+Class for a snapshot of the data that is read only once and then
+shared by several time windows (e.g., by the 24h, 48h, 7d, 31d, 
+and 365d plots). The data of all columns needed by any window 
+are read in one pass for the largest time window and kept in memory. 
+The windows are then slices of these in-memory arrays.
+
+Members:
+    see DataFileReader, unix_times and the fields of data are numpy arrays
+"""
+class DataSnapshot(DataFileReader):
+    
+    """
+    Reads the data of the snapshot and copies them into memory
+    (so that the snapshot does not change if the store is written to).
+    """
+    def read_data(self):
+        super().read_data()
+        self.unix_times = np.array(self.unix_times, dtype=float)
+        self.data = [np.array(field, dtype=float) for field in self.data]
+
+
+
+    """
+    Returns the data of a time window of the snapshot.
+    
+    @param time_max     int, maximum time from the time of the snapshot 
+                        to the past, if None, all data are returned
+    @param indices      int list, column indices of the fields to be returned,
+                        they must be a subset of self.indices
+    
+    @return unix_times  numpy array, unix times of the window
+    @return data        list of numpy arrays, one array for each index
+    """
+    def get_window(self, time_max, indices):
+        if time_max is None:
+            start = 0
         else:
-            count = utils.get_index_of_first_line_within_time_range(lines_all, unix_time_now, self.time_max)
-        lines = lines_all[count:]
+            start = np.searchsorted(self.unix_times, self.unix_time_now - time_max, side='right')
         
-        self.data = [[0.0 for x in range(len(lines))] for y in range(len(self.indices))]
+        return self.unix_times[start:], [self.data[self.indices.index(index)][start:] for index in indices]
 
-        for j, line in enumerate(lines):
-            words = line.split('\t')
-            unix_time = utils.get_unix_time(words[IDX_DATE], words[IDX_TIME])
-            
-            self.unix_times.append(unix_time)
-            for i, index in enumerate(self.indices):
-                self.data[i][j] = float(words[index])
-            
-        
-        
 
 
- 
+    """
+    Returns the envelopes of a time window of the snapshot. Raw data have
+    no envelopes, this method exists for compatibility with RollupSnapshot.
+    
+    @param time_max     int, maximum time from the time of the snapshot to the past
+    @param indices      int list, column indices of the fields
+    
+    @return             list, None for each index
+    """
+    def get_envelopes(self, time_max, indices):
+        return [None for index in indices]
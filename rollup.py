@@ -0,0 +1,333 @@
+from datetime import (datetime, timedelta)
+import numpy as np
+
+from constants import *
+from store import DataStore
+import utils
+import metrics
+
+
+
+
+"""
+Returns the coarsest rollup tier that still has at least one slot
+per pixel column for a plot over the given time span.
+
+@param time_max     int, time span of the plot in seconds
+
+@return             list, rollup tier (see ROLLUP_TIERS),
+                    None if the raw data should be plotted
+"""
+def get_tier(time_max):
+    if time_max is None:
+        return None
+    for tier in ROLLUP_TIERS:
+        (dirname, time_slot, capacity) = tier
+        if time_max//time_slot >= PLOT_WIDTH_PIXELS and time_max <= time_slot*capacity:
+            return tier
+    return None
+
+
+
+"""
+Returns the names of the rollup columns of a quantity.
+
+@param index    int, column index (IDX_*) of the quantity
+
+@return         string list, names of the minimum, maximum, sum, and count columns
+"""
+def get_rollup_columns(index):
+    return [DICT_IDX_COLUMNS[index] + '_' + statistic for statistic in ROLLUP_STATISTICS]
+
+
+
+"""
+Class for a rollup tier of the continuous data. A rollup tier is
+a ring buffer store (see DataStore), whose slots cover a longer time
+(e.g., an hour, a day, or a week) and contain the minimum, maximum, sum,
+and number of the measured values of every quantity within that time.
+The slots are updated incrementally with each new measurement.
+
+The slots of all tiers begin at local midnight of a Monday
+(for the time zone offset at the creation of the store).
+
+Members:
+    see DataStore
+"""
+class RollupStore(DataStore):
+
+    """
+    Constructor, sets the columns of the rollup store.
+
+    @param tier     list, rollup tier (see ROLLUP_TIERS)
+    @param station  string, ID of the station, None for this station
+    """
+    def __init__(self, tier, station=None):
+        (dirname, time_slot, capacity) = tier
+        super().__init__(utils.get_station_dir(station, dirname), capacity, time_slot)
+        self.columns = ROLLUP_COLUMNS
+
+
+
+    """
+    Returns the origin of a new rollup store, i.e.
+    the last local midnight of a Monday before the first data.
+
+    @param unix_time    float, unix time of the first data to be written
+
+    @return             float, unix time of slot 0
+    """
+    def get_origin(self, unix_time):
+        date = datetime.fromtimestamp(unix_time).date()
+        monday = date - timedelta(days=date.weekday())
+        return datetime(monday.year, monday.month, monday.day).timestamp()
+
+
+
+    """
+    Returns the slot containing a given unix time.
+
+    @param unix_time    float, unix time
+
+    @return             int, slot
+    """
+    def get_slot(self, unix_time):
+        return int((unix_time - self.origin)//self.time_slot)
+
+
+
+    """
+    Adds a batch of measurements to the slots of their unix times.
+    Slots that have been skipped since the last written slot are marked as missing.
+    Data that are older than the capacity of the ring buffer are ignored.
+
+    @param unix_times   float list, unix times of the measurements
+    @param rows         list, one dict for each measurement that maps 
+                        the column indices (IDX_*) to the values
+    """
+    def update_rows(self, unix_times, rows):
+        if len(unix_times) == 0:
+            return
+
+        if self.is_empty():
+            self.create(unix_times[0])
+            self.first_slot = self.last_slot = self.get_slot(unix_times[0])
+
+        unix_times = np.asarray(unix_times, dtype=STORE_DTYPE)
+        slots = ((unix_times - self.origin)//self.time_slot).astype(np.int64)
+        slot_max = int(slots.max())
+        if slot_max > self.last_slot:
+            self.write_missing_slots(self.last_slot + 1, slot_max + 1)
+            self.last_slot = slot_max
+
+        keep = np.flatnonzero(slots > self.last_slot - self.capacity)
+        if len(keep) == 0:
+            return
+
+        # sorted by slot, so that the measurements of a slot are a contiguous range
+        keep = keep[np.argsort(slots[keep], kind='stable')]
+        (slots_unique, starts) = np.unique(slots[keep], return_index=True)
+        current = self.read_slots(self.columns[1:], int(slots_unique[0]), int(slots_unique[-1]) + 1)
+        current = {column : array[slots_unique - slots_unique[0]] for column, array in zip(self.columns[1:], current)}
+
+        row = {}
+        for index in DICT_IDX_COLUMNS:
+            (column_min, column_max, column_sum, column_count) = get_rollup_columns(index)
+            value = np.array([rows[i][index] for i in keep], dtype=STORE_DTYPE)
+            is_nan = np.isnan(value)
+            count = np.add.reduceat(~is_nan, starts).astype(STORE_DTYPE)
+            count_current = np.nan_to_num(current[column_count])
+            row[column_min] = np.fmin(current[column_min], np.where(count > 0, np.minimum.reduceat(np.where(is_nan, np.inf, value), starts), np.nan))
+            row[column_max] = np.fmax(current[column_max], np.where(count > 0, np.maximum.reduceat(np.where(is_nan, -np.inf, value), starts), np.nan))
+            row[column_sum] = np.where(count > 0, np.nan_to_num(current[column_sum]) + np.add.reduceat(np.where(is_nan, 0., value), starts), current[column_sum])
+            row[column_count] = np.where(count > 0, count_current + count, current[column_count])
+
+        self.write_slots(slots_unique, self.get_slot_times(slots_unique), row)
+        self.write_header()
+
+
+
+    """
+    Adds a measurement to the slot of its unix time (see update_rows).
+
+    @param unix_time    float, unix time of the measurement
+    @param values       dict, maps the column indices (IDX_*) to the values
+    """
+    def update(self, unix_time, values):
+        self.update_rows([unix_time], [values])
+
+
+
+    """
+    Writes a series of measurements to a new rollup store.
+    Measurements that do not fit into the capacity of the ring buffer are dropped.
+
+    @param unix_times   float list, sorted unix times of the measurements
+    @param values       dict, maps the column indices (IDX_*) to float lists
+                        of the measured values
+    """
+    def import_rows(self, unix_times, values):
+        if len(unix_times) == 0:
+            return
+
+        unix_times = np.asarray(unix_times, dtype=STORE_DTYPE)
+        self.create(unix_times[0])
+        slots = ((unix_times - self.origin)//self.time_slot).astype(np.int64)
+
+        self.last_slot = int(slots[-1])
+        keep = slots > self.last_slot - self.capacity
+        self.first_slot = int(slots[keep][0])
+        self.write_missing_slots(self.first_slot, self.last_slot + 1)
+
+        # the slots are sorted, so the measurements of a slot are a contiguous range
+        (slots_unique, starts) = np.unique(slots[keep], return_index=True)
+        row = {}
+        for index in DICT_IDX_COLUMNS:
+            (column_min, column_max, column_sum, column_count) = get_rollup_columns(index)
+            value = np.asarray(values[index], dtype=STORE_DTYPE)[keep]
+            is_nan = np.isnan(value)
+            count = np.add.reduceat(~is_nan, starts).astype(STORE_DTYPE)
+            row[column_min] = np.where(count > 0, np.minimum.reduceat(np.where(is_nan, np.inf, value), starts), np.nan)
+            row[column_max] = np.where(count > 0, np.maximum.reduceat(np.where(is_nan, -np.inf, value), starts), np.nan)
+            row[column_sum] = np.add.reduceat(np.where(is_nan, 0., value), starts)
+            row[column_count] = count
+
+        self.write_slots(slots_unique, self.get_slot_times(slots_unique), row)
+        self.write_header()
+
+
+
+    """
+    Reads the minimum, average, and maximum values of the given quantities
+    for all slots that end later than time_min.
+
+    @param indices      int list, column indices (IDX_*) to be read
+    @param time_min     float, only slots ending later than this unix time are read,
+                        if None, all slots within the ring are read
+
+    @return unix_times  numpy array, unix times of the centers of the slots
+    @return minima      list of numpy arrays, minimum values for each index
+    @return averages    list of numpy arrays, average values for each index
+    @return maxima      list of numpy arrays, maximum values for each index
+    """
+    def read_rollup(self, indices, time_min=None):
+        if self.is_empty():
+            empty = [np.empty(0) for index in indices]
+            return np.empty(0), empty, empty, empty
+
+        (slot_start, slot_end) = self.get_slot_range(time_min)
+        unix_times = self.get_slot_times(np.arange(slot_start, slot_end)) + 0.5*self.time_slot
+
+        minima = []
+        averages = []
+        maxima = []
+        for index in indices:
+            (values_min, values_max, values_sum, values_count) = self.read_slots(get_rollup_columns(index), slot_start, slot_end)
+            minima.append(values_min)
+            maxima.append(values_max)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                averages.append(np.where(values_count > 0, values_sum/values_count, np.nan))
+
+        return unix_times, minima, averages, maxima
+
+
+
+"""
+Class for a snapshot of a rollup tier that is read only once and then
+shared by several time windows (like DataSnapshot for the raw data).
+The windows contain the averages of the slots as data
+and their minima and maxima as envelopes.
+
+Members:
+    tier            list, rollup tier (see ROLLUP_TIERS)
+    station         string, ID of the station, None for this station
+    indices         int list, column indices (IDX_*) to be read
+    time_max        int, maximum time from now to the past in seconds
+    unix_time_now   float, unix time at which the data have been read
+    unix_times      numpy array, unix times of the centers of the slots
+    minima          list of numpy arrays, minimum values for each index
+    data            list of numpy arrays, average values for each index
+    maxima          list of numpy arrays, maximum values for each index
+"""
+class RollupSnapshot:
+
+    """
+    Constructor, sets the tier, indices, and the maximum time.
+
+    @param tier         list, rollup tier (see ROLLUP_TIERS)
+    @param indices      int list, list of column indices
+    @param time_max     int, maximum time from now to the past
+                        for which data should still be read
+    @param station      string, ID of the station, None for this station
+    """
+    def __init__(self, tier, indices, time_max, station=None):
+        self.tier = tier
+        self.station = station
+        self.indices = indices
+        self.time_max = time_max
+        self.unix_time_now = None
+        self.unix_times = np.empty(0)
+        self.minima = []
+        self.data = []
+        self.maxima = []
+
+
+
+    """
+    Reads the data of the snapshot and copies them into memory.
+    The duration, rows, and bytes of the read are added to the metrics.
+    """
+    def read_data(self):
+        self.unix_time_now = datetime.now().timestamp()
+        with metrics.span('read', utils.get_station_dir(self.station, self.tier[0])) as record:
+            store = RollupStore(self.tier, self.station)
+            (self.unix_times, minima, averages, maxima) = store.read_rollup(self.indices, self.unix_time_now - self.time_max)
+            self.minima = [np.array(field) for field in minima]
+            self.data = [np.array(field) for field in averages]
+            self.maxima = [np.array(field) for field in maxima]
+            record['rows'] = len(self.unix_times)
+            record['bytes'] = sum(field.nbytes for field in self.minima + self.data + self.maxima)
+
+
+
+    """
+    Returns the index of the first slot of a time window.
+
+    @param time_max     int, maximum time from the time of the snapshot to the past
+
+    @return             int, index of the first slot
+    """
+    def get_window_start(self, time_max):
+        return np.searchsorted(self.unix_times, self.unix_time_now - time_max, side='right')
+
+
+
+    """
+    Returns the averages of a time window of the snapshot.
+
+    @param time_max     int, maximum time from the time of the snapshot to the past
+    @param indices      int list, column indices of the fields to be returned,
+                        they must be a subset of self.indices
+
+    @return unix_times  numpy array, unix times of the window
+    @return data        list of numpy arrays, one array for each index
+    """
+    def get_window(self, time_max, indices):
+        start = self.get_window_start(time_max)
+        return self.unix_times[start:], [self.data[self.indices.index(index)][start:] for index in indices]
+
+
+
+    """
+    Returns the minima and maxima of a time window of the snapshot.
+
+    @param time_max     int, maximum time from the time of the snapshot to the past
+    @param indices      int list, column indices of the fields to be returned,
+                        they must be a subset of self.indices
+
+    @return             list, one tuple (minima, maxima) of numpy arrays for each index
+    """
+    def get_envelopes(self, time_max, indices):
+        start = self.get_window_start(time_max)
+        return [(self.minima[self.indices.index(index)][start:],
+                 self.maxima[self.indices.index(index)][start:]) for index in indices]
@@ -0,0 +1,204 @@
+import os
+import os.path
+import signal
+import tempfile
+import traceback
+import multiprocessing
+import numpy as np
+
+from constants import *
+from plot import PlotCreation
+import metrics
+
+
+
+
+"""
+Class to render a list of plots in parallel on a pool of worker processes.
+
+The data of all plot jobs are packed into one binary file in PATH_CACHE,
+which the workers memory-map, so each worker gets its data slice without
+pickling the data lists. A job only carries the offsets of its arrays
+in that file. Failures are caught and reported per job, so that
+a failing plot does not prevent the other plots from being created.
+If only one process is used, the plots are rendered in the current process.
+
+The pool is kept until close() is called, so that the workers
+(and their figure templates) can be reused by following runs.
+The workers are spawned as new interpreters (see PLOT_START_METHOD) instead of
+forking the current process, which may already run other threads (e.g., the
+writer thread and the server of the daemon) whose locks would be copied
+in a locked state. Each worker imports matplotlib once, since the pool is kept.
+
+Members:
+    processes   int, number of worker processes
+    jobs        list of dicts, plot jobs that have been added since the last run
+    pool        multiprocessing Pool, pool of worker processes (None if not started)
+    rendered    string list, paths of the images that have been rendered by the last run
+                (images that would not have changed are not rendered, see PlotCreation)
+"""
+class PlotJobScheduler:
+
+    """
+    Constructor, sets the number of worker processes.
+
+    @param processes    int, number of worker processes,
+                        if None, one process per CPU core is used
+    """
+    def __init__(self, processes=PLOT_PROCESSES):
+        self.processes = os.cpu_count() if processes is None else processes
+        self.jobs = []
+        self.pool = None
+        self.rendered = []
+
+
+
+    """
+    Adds a plot job. The parameters are the ones of PlotCreation.
+
+    @param unix_times               list, unix time values for the time to be set at the x-axis
+    @param data                     2D list, data to be plotted
+    @param path_image               string, path to the folder to store the created images
+    @param prefix                   string, prefix of image file name
+    @param image_format             string, format of the image without dot
+    @param parameters_field         string list, parameters for plotting
+    @param parameters_time_period   list, parameters that are dependent on the time period of the plot
+    @param envelopes                list, for each field of data either None or a tuple (lower, upper)
+    @param labels                   string list, legend label for each field of data (None for no legend)
+    """
+    def add_job(self, unix_times, data, path_image, prefix, image_format, parameters_field, parameters_time_period, envelopes=None, labels=None):
+        self.jobs.append({'name': prefix + '_' + parameters_field[0],
+                          'unix_times': unix_times,
+                          'data': data,
+                          'envelopes': [None for field in data] if envelopes is None else envelopes,
+                          'labels': labels,
+                          'arguments': (path_image, prefix, image_format, parameters_field, parameters_time_period)})
+
+
+
+    """
+    Renders all jobs that have been added since the last run.
+    The records of the plots (see run_plot_job) are added to the metrics.
+
+    @return     list, one tuple (name, error) for each job, where error
+                is None on success and the formatted exception otherwise
+    """
+    def run(self):
+        (jobs, self.jobs) = (self.jobs, [])
+        if self.processes <= 1 or len(jobs) <= 1:
+            results = [run_plot_job(job) for job in jobs]
+        else:
+            os.makedirs(PATH_CACHE, exist_ok=True)
+            (file_descriptor, filepath) = tempfile.mkstemp(suffix=STORE_FILE_EXTENSION, dir=PATH_CACHE)
+            try:
+                with os.fdopen(file_descriptor, 'wb') as file_data:
+                    references = {}
+                    jobs_packed = [pack_plot_job(job, file_data, filepath, references) for job in jobs]
+                if self.pool is None:
+                    context = multiprocessing.get_context(PLOT_START_METHOD)
+                    self.pool = context.Pool(self.processes, initializer=init_worker)
+                results = self.pool.map(run_plot_job, jobs_packed)
+            finally:
+                os.remove(filepath)
+
+        for (name, error, record, path_file) in results:
+            if record is not None:
+                metrics.add_record(record)
+        self.rendered = [path_file for (name, error, record, path_file) in results if path_file is not None]
+        return [(name, error) for (name, error, record, path_file) in results]
+
+
+
+    """
+    Terminates the worker processes.
+    """
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+
+
+
+"""
+Initializes a worker process. SIGINT and SIGTERM are ignored, since the terminal
+and systemd send them to all processes of the group, so that the main process
+can finish the running plots and close the pool.
+"""
+def init_worker():
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+
+
+
+"""
+Writes the arrays of a plot job to the data file and replaces them by
+references (offset, length) to their position in that file. An array
+that is shared by several jobs (e.g., the unix times of the plots 
+of a time span) is only written once.
+
+@param job          dict, plot job
+@param file_data    binary file object of the data file, opened for writing
+@param filepath     string, path of the data file
+@param references   dict, maps the ids of the arrays that have already been
+                    written to their references, is updated
+
+@return             dict, plot job with references instead of arrays
+"""
+def pack_plot_job(job, file_data, filepath, references):
+    def pack(values):
+        if id(values) not in references:
+            array = np.asarray(values, dtype=STORE_DTYPE)
+            offset = file_data.tell()//array.itemsize
+            file_data.write(array.tobytes())
+            references[id(values)] = (offset, len(array))
+        return references[id(values)]
+
+    job_packed = dict(job)
+    job_packed['filepath'] = filepath
+    job_packed['unix_times'] = pack(job['unix_times'])
+    job_packed['data'] = [pack(field) for field in job['data']]
+    job_packed['envelopes'] = [None if envelope is None else (pack(envelope[0]), pack(envelope[1]))
+                               for envelope in job['envelopes']]
+    return job_packed
+
+
+
+"""
+Renders the plot of a job. This function runs in the worker processes.
+If the job has been packed, its arrays are slices of the memory-mapped data file
+(which is not mapped if it is empty, i.e., if all arrays are empty).
+The plot is measured, but its record is returned instead of being added 
+to the metrics of the worker process.
+
+@param job      dict, plot job
+
+@return         tuple (name, error, record, path_file), where error is None on success
+                and the formatted exception otherwise, record is the record
+                of the plot (see metrics.measure, marked as failed if the plot has
+                failed, None if the data could not be read), and path_file is the path of the image if it has been rendered
+"""
+def run_plot_job(job):
+    record = None
+    try:
+        if 'filepath' in job:
+            if os.path.getsize(job['filepath']) > 0:
+                values = np.memmap(job['filepath'], dtype=STORE_DTYPE, mode='r')
+            else:
+                values = np.empty(0, dtype=STORE_DTYPE)
+            unpack = lambda reference: values[reference[0]:reference[0]+reference[1]]
+            job = dict(job)
+            job['unix_times'] = unpack(job['unix_times'])
+            job['data'] = [unpack(field) for field in job['data']]
+            job['envelopes'] = [None if envelope is None else (unpack(envelope[0]), unpack(envelope[1]))
+                                for envelope in job['envelopes']]
+
+        with metrics.measure('plot', job['name']) as record:
+            plot = PlotCreation(job['unix_times'], job['data'], *job['arguments'], job['envelopes'], job['labels'])
+            is_rendered = plot.create_plot()
+            record['rows'] = len(job['unix_times'])
+            record['bytes'] = os.path.getsize(plot.path_file) if is_rendered else 0
+        return job['name'], None, record, plot.path_file if is_rendered else None
+    except Exception:
+        return job['name'], traceback.format_exc(), record, None
@@ -0,0 +1,525 @@
+import os
+import os.path
+import json
+import numpy as np
+
+from constants import *
+import utils
+
+
+
+
+"""
+Class for storing the continuous data in a binary columnar ring buffer.
+
+Every quantity is kept in a separate, preallocated file of fixed-width
+float64 values, plus one file for the unix times of the values.
+All files of a store are placed in one directory below PATH_DATA.
+The files consist of 'capacity' slots, each slot covering 'time_slot' seconds.
+The slot of a given unix time is (unix_time - origin)/time_slot and it is
+stored at the position slot % capacity of the files. Hence, new data
+are written in place and old data expire implicitly when the ring wraps around.
+Slots without a measurement contain NaN values and their nominal unix time.
+
+Since the slots are fixed-width, the files can be memory-mapped and
+any time window is a slice of the mapped arrays whose position
+is computed directly from the time (zero-copy, unless the window wraps around).
+
+Members:
+    path        string, path of the directory containing the column files
+    columns     string list, names of the columns, the first one holds the unix times
+    capacity    int, number of slots of the ring buffer
+    time_slot   int, time covered by one slot in seconds
+    origin      float, unix time of slot 0
+    first_slot  int, first slot that has ever been written (None if the store is empty)
+    last_slot   int, latest slot that has been written (None if the store is empty)
+    writes      int, number of headers that have been written to the store
+    written_slots   list [slot_start, slot_end] of the slots written before the current header
+                    (None if no slots have been written), readers of the store (see StoreIndex)
+                    only copy these slots, since they may lie before last_slot
+    slots_pending   list [slot_start, slot_end] of the slots written since the current header
+    bytes_written   int, number of bytes written to the files of the store by this object
+"""
+class DataStore:
+
+    """
+    Constructor, sets the path of the store, creates the store directory
+    if it does not exist yet, and reads the header of an existing store.
+    The given capacity and slot time are only used for new stores.
+
+    @param dirname      string, name of the store directory in PATH_DATA
+    @param capacity     int, number of slots of the ring buffer
+    @param time_slot    int, time covered by one slot in seconds
+    @param create       boolean, if 'False', a missing store directory is not created
+                        (for stores that are only read)
+    """
+    def __init__(self, dirname, capacity=TIME_STORE_MAX//TIME_DATA, time_slot=TIME_DATA, create=True):
+        self.path = os.path.join(PATH_DATA, dirname)
+        self.columns = STORE_COLUMNS
+        self.capacity = capacity
+        self.time_slot = time_slot
+        self.origin = 0.
+        self.first_slot = None
+        self.last_slot = None
+        self.writes = 0
+        self.written_slots = None
+        self.slots_pending = None
+        self.bytes_written = 0
+
+        if create:
+            os.makedirs(self.path, exist_ok=True)
+        self.read_header()
+
+
+
+    """
+    Returns the path of the file storing the given column.
+
+    @param column   string, name of the column
+
+    @return         string, path of the column file
+    """
+    def get_column_path(self, column):
+        return os.path.join(self.path, column + STORE_FILE_EXTENSION)
+
+
+
+    """
+    Reads capacity, slot time, origin, the first and last written slot,
+    and the slots of the last write from the header file of the store (if it exists).
+    """
+    def read_header(self):
+        filepath = os.path.join(self.path, FILE_STORE_HEADER)
+        if not os.path.isfile(filepath):
+            return
+
+        with open(filepath, 'r') as file_header:
+            header = json.load(file_header)
+
+        self.capacity = header['capacity']
+        self.time_slot = header['time_slot']
+        self.origin = header['origin']
+        self.first_slot = header['first_slot']
+        self.last_slot = header['last_slot']
+        # headers of older versions do not count the writes
+        self.writes = header.get('writes', 0)
+        self.written_slots = header.get('written_slots')
+
+
+
+    """
+    Writes the header file of the store with the slots that have been
+    written since the last header. The file is replaced atomically
+    so that an interrupted write never leaves a corrupt header behind.
+    """
+    def write_header(self):
+        filepath = os.path.join(self.path, FILE_STORE_HEADER)
+        self.writes += 1
+        (self.written_slots, self.slots_pending) = (self.slots_pending, None)
+        header = {'capacity': self.capacity,
+                  'time_slot': self.time_slot,
+                  'origin': self.origin,
+                  'first_slot': self.first_slot,
+                  'last_slot': self.last_slot,
+                  'writes': self.writes,
+                  'written_slots': self.written_slots}
+
+        data = json.dumps(header)
+        with open(filepath + '.tmp', 'w') as file_header:
+            file_header.write(data)
+            utils.sync_file(file_header)
+        os.replace(filepath + '.tmp', filepath)
+        self.bytes_written += len(data)
+
+
+
+    """
+    @return     boolean, 'True' if no data have been written to the store yet
+    """
+    def is_empty(self):
+        return self.last_slot is None
+
+
+
+    """
+    Returns the slot of a given unix time. The time is rounded
+    to the nearest slot, so that small delays of the measurement
+    do not shift the data into the following slot.
+
+    @param unix_time    float, unix time
+
+    @return             int, slot
+    """
+    def get_slot(self, unix_time):
+        return int(round((unix_time - self.origin)/self.time_slot))
+
+
+
+    """
+    Returns the nominal unix times of the given slots.
+
+    @param slots    int numpy array, slots
+
+    @return         float numpy array, unix times
+    """
+    def get_slot_times(self, slots):
+        return self.origin + slots*float(self.time_slot)
+
+
+
+    """
+    Returns the origin of a new store, i.e. the beginning
+    of the slot of the first data to be written.
+
+    @param unix_time    float, unix time of the first data to be written
+
+    @return             float, unix time of slot 0
+    """
+    def get_origin(self, unix_time):
+        return float(unix_time - unix_time % self.time_slot)
+
+
+
+    """
+    Creates the preallocated column files filled with NaN values
+    and sets the origin of the store.
+
+    @param unix_time    float, unix time of the first data to be written
+    """
+    def create(self, unix_time):
+        self.origin = self.get_origin(unix_time)
+
+        for column in self.columns:
+            np.full(self.capacity, np.nan, dtype=STORE_DTYPE).tofile(self.get_column_path(column))
+        self.bytes_written += len(self.columns)*self.capacity*np.dtype(STORE_DTYPE).itemsize
+
+
+
+    """
+    Memory-maps a column of the store.
+
+    @param column   string, name of the column
+    @param mode     string, 'r' for read-only, 'r+' for writing access
+
+    @return         numpy memmap of all slots of the column
+    """
+    def map_column(self, column, mode='r'):
+        return np.memmap(self.get_column_path(column), dtype=STORE_DTYPE, mode=mode, shape=(self.capacity,))
+
+
+
+    """
+    Writes unix times and values to the given slots. The mapped files
+    are only forced to the storage if FSYNC_POLICY is 'flush'.
+    The written values are counted in bytes_written (although the
+    operating system writes the mapped files back in whole pages).
+
+    @param slots        int numpy array, slots to be written
+    @param unix_times   float numpy array, unix times of the slots
+    @param values       dict, maps the names of the columns (except for the one 
+                        of the unix times) to float numpy arrays of the values of the slots
+    """
+    def write_slots(self, slots, unix_times, values):
+        if len(slots) == 0:
+            return
+        positions = slots % self.capacity
+        slot_range = [int(slots.min()), int(slots.max()) + 1]
+        if self.slots_pending is not None:
+            slot_range = [min(slot_range[0], self.slots_pending[0]), max(slot_range[1], self.slots_pending[1])]
+        self.slots_pending = slot_range
+
+        for column in self.columns:
+            column_data = self.map_column(column, 'r+')
+            column_data[positions] = unix_times if column == self.columns[0] else values[column]
+            if FSYNC_POLICY == 'flush':
+                column_data.flush()
+        self.bytes_written += len(self.columns)*len(positions)*np.dtype(STORE_DTYPE).itemsize
+
+
+
+    """
+    Marks the slots in the given range as missing, i.e.
+    sets their values to NaN and their unix times to the nominal ones.
+    Only the last 'capacity' slots of the range are written.
+
+    @param slot_start   int, first slot of the range
+    @param slot_end     int, slot after the last slot of the range
+    """
+    def write_missing_slots(self, slot_start, slot_end):
+        slots = np.arange(max(slot_start, slot_end - self.capacity), slot_end)
+        if len(slots) == 0:
+            return
+
+        missing = np.full(len(slots), np.nan)
+        self.write_slots(slots, self.get_slot_times(slots), {column : missing for column in self.columns[1:]})
+
+
+
+    """
+    Returns the values of rows as written to the column files.
+
+    @param rows     list, one dict for each row that maps 
+                    the column indices (IDX_*) to the values
+
+    @return         dict, maps the names of the columns (except for the one 
+                    of the unix times) to numpy arrays of the values of the rows
+    """
+    def get_rows(self, rows):
+        return {DICT_IDX_COLUMNS[index] : np.array([values[index] for values in rows], dtype=STORE_DTYPE)
+                for index in DICT_IDX_COLUMNS}
+
+
+
+    """
+    Writes a batch of rows of data to the slots of their unix times. 
+    The column files are mapped and the header is written only once per batch.
+    Slots that have been skipped since the last written slot are marked as missing.
+    Data that are older than the capacity of the ring buffer are ignored.
+
+    @param unix_times   float list, unix times of the rows
+    @param rows         list, one dict of values for each row (see get_rows)
+    """
+    def append_rows(self, unix_times, rows):
+        if len(unix_times) == 0:
+            return
+
+        if self.is_empty():
+            self.create(unix_times[0])
+            self.first_slot = self.last_slot = self.get_slot(unix_times[0])
+
+        unix_times = np.asarray(unix_times, dtype=STORE_DTYPE)
+        slots = np.array([self.get_slot(unix_time) for unix_time in unix_times])
+        slot_max = int(slots.max())
+        if slot_max > self.last_slot:
+            self.write_missing_slots(self.last_slot + 1, slot_max)
+            self.last_slot = slot_max
+
+        keep = slots > self.last_slot - self.capacity
+        if not keep.any():
+            return
+
+        self.write_slots(slots[keep], unix_times[keep], self.get_rows([values for (values, is_kept) in zip(rows, keep) if is_kept]))
+        self.write_header()
+
+
+
+    """
+    Writes one row of data to the slot of the given unix time (see append_rows).
+
+    @param unix_time    float, unix time of the row
+    @param values       dict, maps the column indices (IDX_*) to the values (see get_rows)
+    """
+    def append(self, unix_time, values):
+        self.append_rows([unix_time], [values])
+
+
+
+    """
+    Returns the range of slots that contain data later than time_min.
+
+    @param time_min     float, only slots later than this unix time are considered,
+                        if None, all slots within the ring are considered
+
+    @return slot_start  int, first slot of the range
+    @return slot_end    int, slot after the last slot of the range
+    """
+    def get_slot_range(self, time_min=None):
+        slot_start = max(self.first_slot, self.last_slot - self.capacity + 1)
+        if time_min is not None:
+            slot_start = max(slot_start, self.get_slot(time_min))
+        return slot_start, max(slot_start, self.last_slot + 1)
+
+
+
+    """
+    Reads the given columns of a range of slots. The returned arrays are slices 
+    of the memory-mapped column files, only if the range wraps around 
+    the end of the files, they are copies.
+
+    @param columns      string list, names of the columns to be read
+    @param slot_start   int, first slot of the range
+    @param slot_end     int, slot after the last slot of the range
+
+    @return             list of numpy arrays, one array for each column
+    """
+    def read_slots(self, columns, slot_start, slot_end):
+        position_start = slot_start % self.capacity
+        position_end = position_start + (slot_end - slot_start)
+
+        arrays = []
+        for column in columns:
+            column_data = self.map_column(column)
+            if position_end <= self.capacity:
+                arrays.append(column_data[position_start:position_end])
+            else:
+                arrays.append(np.concatenate((column_data[position_start:],
+                                              column_data[:position_end - self.capacity])))
+        return arrays
+
+
+
+    """
+    Reads the given columns of all slots with a unix time later than time_min.
+    The returned arrays are slices of the memory-mapped column files,
+    only if the time window wraps around the end of the files, they are copies.
+
+    @param indices      int list, column indices (IDX_*) to be read
+    @param time_min     float, only slots later than this unix time are read,
+                        if None, all slots within the ring are read
+
+    @return unix_times  numpy array, unix times of the read slots
+    @return data        list of numpy arrays, one array for each index,
+                        missing data are NaN
+    """
+    def read_columns(self, indices, time_min=None):
+        if self.is_empty():
+            return np.empty(0), [np.empty(0) for index in indices]
+
+        columns = [COLUMN_UNIX_TIME] + [DICT_IDX_COLUMNS[index] for index in indices]
+        arrays = self.read_slots(columns, *self.get_slot_range(time_min))
+
+        # the slot of time_min may still contain an earlier measurement
+        start = 0 if time_min is None else np.searchsorted(arrays[0], time_min, side='right')
+        return arrays[0][start:], [array[start:] for array in arrays[1:]]
+
+
+
+    """
+    Writes a series of rows to a new store. Skipped slots are marked as missing,
+    rows that do not fit into the capacity of the ring buffer are dropped.
+
+    @param unix_times   float list, sorted unix times of the rows
+    @param values       dict, maps the column indices (IDX_*) to float lists
+                        of the values of the rows
+    """
+    def import_rows(self, unix_times, values):
+        self.import_columns(unix_times, {DICT_IDX_COLUMNS[index] : values[index] for index in DICT_IDX_COLUMNS})
+
+
+
+    """
+    Writes a series of rows to a new store (see import_rows).
+
+    @param unix_times   float list, sorted unix times of the rows
+    @param values       dict, maps the names of the columns (except for the one 
+                        of the unix times) to float lists of the values of the rows
+    """
+    def import_columns(self, unix_times, values):
+        if len(unix_times) == 0:
+            return
+
+        unix_times = np.asarray(unix_times, dtype=STORE_DTYPE)
+        self.create(unix_times[0])
+        slots = np.rint((unix_times - self.origin)/self.time_slot).astype(np.int64)
+
+        self.last_slot = int(slots[-1])
+        keep = slots > self.last_slot - self.capacity
+        self.first_slot = int(slots[keep][0])
+
+        self.write_missing_slots(self.first_slot, self.last_slot + 1)
+        self.write_slots(slots[keep], unix_times[keep],
+                         {column : np.asarray(values[column], dtype=STORE_DTYPE)[keep] for column in self.columns[1:]})
+        self.write_header()
+
+
+
+    """
+    Moves the data of the store into a new ring buffer with the given 
+    capacity and slot time, e.g., after TIME_DATA has been changed. 
+    Slots without data are dropped, if several rows fall into the same
+    new slot, the latest one is kept.
+
+    @param capacity     int, number of slots of the new ring buffer
+    @param time_slot    int, time covered by one slot of the new ring buffer in seconds
+
+    @return             boolean, 'True' if the store has been resized
+    """
+    def resize(self, capacity, time_slot):
+        if self.is_empty() or (self.capacity, self.time_slot) == (capacity, time_slot):
+            return False
+
+        # copies, since the column files are recreated
+        arrays = [np.array(array) for array in self.read_slots(self.columns, *self.get_slot_range())]
+        has_data = np.any(~np.isnan(np.array(arrays[1:])), axis=0)
+        (self.capacity, self.time_slot) = (capacity, time_slot)
+        self.first_slot = self.last_slot = None
+        self.import_columns(arrays[0][has_data], {column : array[has_data] for column, array in zip(self.columns[1:], arrays[1:])})
+        if self.is_empty():
+            self.write_header()
+        return True
+
+
+
+    """
+    Imports the rows of a tab-separated data file (as written by the
+    DataFileWriter) into a new store. This is used to migrate the existing
+    continuous data file on the first run with the binary store.
+
+    @param filepath     string, path of the tab-separated file to be imported
+    """
+    def import_text_file(self, filepath):
+        unix_times = []
+        values = {index : [] for index in DICT_IDX_COLUMNS}
+
+        with open(filepath, 'r') as file_data:
+            for line in file_data:
+                words = line.split('\t')
+                unix_times.append(utils.get_unix_time_of_words(words))
+                for index in DICT_IDX_COLUMNS:
+                    values[index].append(float(words[index]))
+
+        self.import_rows(unix_times, values)
+
+
+
+    """
+    Imports the column files of a store without header, in which the rows
+    have been appended one after another, into a new ring buffer store.
+
+    @return     boolean, 'True' if such column files existed and have been imported
+    """
+    def import_appended_columns(self):
+        filepath_time = self.get_column_path(COLUMN_UNIX_TIME)
+        if not os.path.isfile(filepath_time):
+            return False
+
+        columns = {column : np.fromfile(self.get_column_path(column), dtype=STORE_DTYPE)
+                   for column in STORE_COLUMNS}
+        rows = min(len(column_data) for column_data in columns.values())
+
+        self.import_rows(columns[COLUMN_UNIX_TIME][:rows],
+                         {index : columns[DICT_IDX_COLUMNS[index]][:rows] for index in DICT_IDX_COLUMNS})
+        return True
+
+
+
+"""
+Class for storing the spread and the number of the samples of each
+measurement (see BURST_SAMPLES) in a ring buffer next to the continuous data.
+
+Members:
+    see DataStore, the columns are BURST_COLUMNS
+"""
+class BurstStore(DataStore):
+
+    """
+    Constructor, sets the columns of the burst store.
+
+    @param capacity     int, number of slots of the ring buffer
+    """
+    def __init__(self, capacity=TIME_STORE_MAX//TIME_DATA):
+        super().__init__(DIR_BURST, capacity)
+        self.columns = BURST_COLUMNS
+
+
+
+    """
+    Returns the spreads and numbers of samples of rows as written to the column files.
+
+    @param rows     list, one dict for each row that maps the names of the columns to the values
+
+    @return         dict, maps the names of the columns (except for the one 
+                    of the unix times) to numpy arrays of the values of the rows
+    """
+    def get_rows(self, rows):
+        return {column : np.array([values[column] for values in rows], dtype=STORE_DTYPE) for column in self.columns[1:]}
@@ -1,6 +1,10 @@
+import os
+import re
 from datetime import datetime
+from functools import lru_cache
 
 from constants import *
+import aggregate
 
 
 
@@ -11,42 +15,99 @@ Utility methods that are not directly connect to class members.
 
 
 
+"""
+Returns the unix time of the beginning of an hour of a given date.
+The results are cached, so that consecutive lines of a data file
+(which mostly share the same date and hour) only need a dictionary lookup.
+
+@param date     string, date, formatted as YYYY-MM-DD
+@param hour     string, hour of the day, formatted as hh
+
+@return         float, unix time of the beginning of the hour
+"""
+@lru_cache(maxsize=1024)
+def get_unix_time_of_hour(date, hour):
+    (year, month, day) = date.split('-')
+    return datetime(int(year), int(month), int(day), int(hour)).timestamp()
+
+
+
 """
 Returns the unix time for a given date and time of the day.     .
  
 @param date     string, date, formatted as YYYY-MM-DD
-@param time     string, time of the day, formatted as hh:mm 
+@param time     string, time of the day, formatted as hh:mm:ss 
+                (or hh:mm in files of older versions)
 
-@return         datetime object for the given date and time string
+@return         float, unix time for the given date and time string
 """
 def get_unix_time(date, time):
-    (year, month, day) = date.split('-')
-    (hour, minute) = time.split(':')
-    return datetime(int(year), int(month), int(day), int(hour), int(minute)).timestamp()
+    (hour, minute, *second) = time.split(':')
+    return get_unix_time_of_hour(date, hour) + 60*int(minute) + (int(second[0]) if second else 0)
 
 
 
 """
-Returns the index of the first line that is still within the given time range.
+Returns the unix time of the fields of a line of a data file.
+Lines written by newer versions store the unix time as their last field
+(data files: IDX_UNIX_TIME, average files: IDX_UNIX_TIME_AVG), which is
+unambiguous during daylight saving time transitions. For lines of older
+files, the unix time is computed from the date and time fields.
 
-@param time_max         
-@param unix_time_now    
+@param words    string list, tab-separated fields of the line
 
-@return                 int, index of line 
-                        that is still within the given time range
+@return         float, unix time of the line
 """
-def get_index_of_first_line_within_time_range(lines, unix_time_now, time_max):
-    count = 0
-    words = lines[count].split('\t')
-    
-    unix_time_first = get_unix_time(words[0], words[1])
-        
-    while unix_time_first <= unix_time_now - time_max:
-        count += 1
-        words = lines[count].split('\t')
-        unix_time_first = get_unix_time(words[0], words[1])
+def get_unix_time_of_words(words):
+    if len(words) == NUMBER_OF_INDICES:
+        return float(words[IDX_UNIX_TIME])
+    if len(words) == NUMBER_OF_INDICES_AVG:
+        return float(words[IDX_UNIX_TIME_AVG])
+    return get_unix_time(words[IDX_DATE], words[IDX_TIME])
 
-    return count
+
+
+"""
+Returns the byte offset of the first line of a sorted data file that is 
+later than the given unix time. Instead of parsing the file from its 
+beginning, the offset is found by a binary search on the byte offsets 
+of the file, so only a logarithmic number of lines has to be parsed.
+
+@param file_data        binary file object of the data file, opened for reading
+@param unix_time_min    float, unix time the line has to be later than
+
+@return                 int, byte offset of the first line later than unix_time_min 
+                        (the file size if there is no such line)
+"""
+def get_offset_of_first_line_within_time_range(file_data, unix_time_min):
+    is_within_time_range = lambda line: get_unix_time_of_words(line.decode('utf-8').split('\t')) > unix_time_min
+    
+    # lo: start of a line, all lines before are outside of the time range
+    # hi: start of a line within the time range (or end of file)
+    lo = 0
+    hi = file_data.seek(0, os.SEEK_END)
+    
+    while lo < hi:
+        mid = (lo + hi)//2
+        file_data.seek(mid)
+        if mid > 0:
+            # skip the rest of the line mid points into
+            file_data.readline()
+        start = file_data.tell()
+        if start >= hi:
+            break
+        if is_within_time_range(file_data.readline()):
+            hi = start
+        else:
+            lo = file_data.tell()
+    
+    # at most one line is left between lo and hi
+    file_data.seek(lo)
+    while file_data.tell() < hi:
+        start = file_data.tell()
+        if is_within_time_range(file_data.readline()):
+            return start
+    return hi
 
 
 
@@ -59,16 +120,65 @@ Computes the time average for a given list of values.
 @return         float, time average of the given list
 """
 def get_time_avg(times, values):
-    N = len(times) 
-    if N != len(values):
+    if len(times) != len(values):
         print('ERROR, length of times and values differ.')
         return 
     
-    avg = 0.
+    return aggregate.get_time_weighted_stats(times, [values])['mean'][0]
 
-    for i in range(1, N):
-        dt = times[i] - times[i-1]
-        val_avg = 0.5*(values[i-1]+values[i])
-        avg += dt*val_avg
 
-    return avg/(times[N-1]-times[0])
+
+"""
+Forces the written data of a file to the storage, if FSYNC_POLICY is 'flush'.
+
+@param file_data    file object, opened for writing
+"""
+def sync_file(file_data):
+    if FSYNC_POLICY == 'flush':
+        file_data.flush()
+        os.fsync(file_data.fileno())
+
+
+
+"""
+Returns the name of a data file or store of a station relative to PATH_DATA.
+The data of the other stations are kept in one subdirectory of 
+DIR_STATIONS per station, with the same names as the ones of this station.
+
+@param station  string, ID of the station, None for this station
+@param name     string, name of the data file or store
+
+@return         string, name relative to PATH_DATA
+"""
+def get_station_dir(station, name):
+    return name if station is None else os.path.join(DIR_STATIONS, station, name)
+
+
+
+"""
+Returns the IDs of the other stations of which data have been received.
+
+@return     string list, sorted IDs of the stations
+"""
+def get_stations():
+    path = os.path.join(PATH_DATA, DIR_STATIONS)
+    if not os.path.isdir(path):
+        return []
+    return sorted(station for station in os.listdir(path) 
+                  if re.fullmatch(STATION_ID_PATTERN, station) and os.path.isdir(os.path.join(path, station)))
+
+
+
+"""
+Writes a file atomically: the data are written to a temporary file,
+which then replaces the file, so that a reader (e.g., the web server)
+gets either the old or the new file, but never a partially written one.
+
+@param filepath     string, path of the file
+@param data         bytes, content of the file
+"""
+def write_file_atomic(filepath, data):
+    with open(filepath + '.tmp', 'wb') as file_data:
+        file_data.write(data)
+        sync_file(file_data)
+    os.replace(filepath + '.tmp', filepath)
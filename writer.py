@@ -1,10 +1,29 @@
 import os.path
+import time
+import logging
+import threading
 from datetime import datetime
 from math import (exp, atan)
 
 from constants import *
 from acqui import DataAcquisition
+from store import (DataStore, BurstStore)
+from rollup import RollupStore
+from accumulator import DailyAccumulator
 import utils
+import metrics
+import page
+
+
+
+
+"""
+Functions that are called with the station (None for this station) and the
+DataFileWriter objects of every batch of measurements that has been written
+(e.g., to push the new measurements to the web page, see EventHub).
+They are called on the thread of the write and must return quickly.
+"""
+listeners = []
 
 
 
@@ -18,26 +37,45 @@ Members:
     line_data       string, line with data written to the data files,
                     this line stores the following data separated by tabs:
                      * date, formatted as: %Y-%m-%d
-                     * time, formatted as: %H:%M
+                     * time, formatted as: %H:%M:%S
                      * temperature (in degC, 1 decimal place)
                      * pressure (in Pa, no decimal places)
                      * humidity (in %, 1 decimal place)
+                     * unix time (in s, no decimal places)
     line_html       string, line with formated data for html file
+    page_values     dict, maps the placeholders of the web page (see page.py)
+                    to the formatted values of the measurement
+    values          dict, maps the column indices (IDX_*) to the
+                    (rounded) values of line_data
+    burst_values    dict, maps the columns of the burst store (BURST_COLUMNS)
+                    to the spread and number of the samples of the measurement
     date_now        string, date of today, formatted as YY-mm-dd
-    time_now        string, current time, formatted as HH:MM 
-    unix_time_now   int, unix time when script is called
+    time_now        string, current time, formatted as HH:MM:SS 
+    unix_time_now   float, unix time of the measurement
 """
 class DataFileWriter:
 
     """
-    Constructor, declares line_data, date_now, time_now, and unix_time_now.
+    Constructor, measures the data and declares line_data, date_now, time_now, and unix_time_now.
+    The data are kept by the writer, so that the sensor data object can be reused.
+
+    @param sensor_data  DataAcquisition object to be reused for the measurement,
+                        if None, a new one is created
+    @param measure      boolean, if False, the data of sensor_data are not measured 
+                        (e.g., if they have been received from another station)
     """
-    def __init__(self):
-        self.sensor_data = DataAcquisition()
-        self.sensor_data.measure_data()
+    def __init__(self, sensor_data=None, measure=True):
+        self.sensor_data = DataAcquisition() if sensor_data is None else sensor_data
+        if measure:
+            with metrics.span('acquisition') as record:
+                self.sensor_data.measure_data()
+                record['rows'] = 1
 
         self.line_data = ''
         self.line_html = ''
+        self.page_values = {}
+        self.values = {}
+        self.burst_values = {}
         self.date_now = ''
         self.time_now = ''
         self.unix_time_now = ''
@@ -48,14 +86,14 @@ class DataFileWriter:
 
 
     """
-    Sets date_now and time_now with the current date and time.
+    Sets date_now and time_now with the date and time of the measurement.
      * self.date_now, formatted as: %Y-%m-%d
-     * self.time_now, formatted as: %H:%M
+     * self.time_now, formatted as: %H:%M:%S
     """
     def set_time_data(self):
-        now = datetime.now()
+        now = datetime.fromtimestamp(self.sensor_data.unix_time)
         self.unix_time_now = now.timestamp()
-        self.time_now = now.strftime('%H:%M')
+        self.time_now = now.strftime('%H:%M:%S')
         self.date_now = now.strftime('%Y-%m-%d')
 
     
@@ -81,8 +119,13 @@ class DataFileWriter:
         line_values[IDX_PRESSURE_SEA] = pressure_sea_level
         line_values[IDX_HUMIDITY_REL] = humidity_rel
         line_values[IDX_HUMIDITY_ABS] = humidity_abs
+        line_values[IDX_UNIX_TIME] = str(round(self.unix_time_now))
 
         self.line_data = '\t'.join(line_values) + '\n'
+        self.values = {index : float(line_values[index]) for index in DICT_IDX_COLUMNS}
+        for index in BURST_INDICES:
+            self.burst_values[DICT_IDX_COLUMNS[index] + '_spread'] = self.sensor_data.spreads.get(index, float('nan'))
+            self.burst_values[DICT_IDX_COLUMNS[index] + '_count'] = self.sensor_data.counts.get(index, 0)
         self.line_html = '<table><tr><td>Last Update: </td><td>' + self.date_now + ', ' + self.time_now + '</td></tr>' \
                        + '<tr><td>Temperature: </td><td>' + temperature + ' &#8451;</td><tr>' \
                        + '<tr><td>Raw pressure: </td><td>' + pressure_raw + ' hPa</td></tr>' \
@@ -90,74 +133,272 @@ class DataFileWriter:
                        + '<tr><td>Relative Humidity: </td><td>' + humidity_rel + ' %</td></tr>' \
                        + '<tr><td>Absolute Humidity: </td><td>' + humidity_abs + ' g/m&sup3;</td></tr>' \
                        + '<tr><td>Altitude: </td><td>' + str(ALTITUDE) + ' m</td></tr></table>\n' 
+        self.page_values = {DICT_IDX_COLUMNS[index] : page.format_value(index, self.values[index]) for index in DICT_IDX_COLUMNS}
+        self.page_values.update({'date': self.date_now, 'time': self.time_now, 'table': self.line_html})
+
+
+
+    """
+    Writes the new data line to the daily file, the stores, 
+    and the html file (see BufferedDataWriter).
+    """
+    def write_to_files(self):
+        BufferedDataWriter([self]).write_to_files()
+
+
 
 
+"""
+Class for writing the measurements of several DataFileWriter objects
+in one batch. In this way, every file is opened (and forced to the storage, 
+see FSYNC_POLICY) only once per batch instead of once per measurement.
+The daemon keeps the measurements in memory with add until FLUSH_SAMPLES 
+measurements have been taken or TIME_FLUSH seconds have passed.
+The measurements of other stations are written to their own
+data files and stores (see utils.get_station_dir).
+
+Members:
+    writers             list of DataFileWriter objects, measurements that
+                        have not been written yet (sorted by time)
+    station             string, ID of the station, None for this station
+    summary             dict, statistics of the last 24 hours for the web page
+                        (see page.get_summary_values), taken from the store
+                        while the new data are written
+    unix_time_flush     float, unix time of the last write
+    lock                Lock, serializes the adding and writing of the measurements
+"""
+class BufferedDataWriter:
 
     """
-    Writes data a line to the daily file.
+    Constructor, sets the measurements to be written.
+
+    @param writers  list of DataFileWriter objects
+    @param station  string, ID of the station, None for this station
+    """
+    def __init__(self, writers=None, station=None):
+        self.writers = [] if writers is None else writers
+        self.station = station
+        self.summary = {}
+        self.unix_time_flush = time.time()
+        self.lock = threading.Lock()
+
+
+
+    """
+    Adds a measurement and writes all measurements, if FLUSH_SAMPLES 
+    measurements have been taken or TIME_FLUSH seconds have passed.
+
+    @param writer   DataFileWriter object of the measurement
+
+    @return         boolean, 'True' if the measurements have been written
+    """
+    def add(self, writer):
+        with self.lock:
+            self.writers.append(writer)
+            if len(self.writers) < FLUSH_SAMPLES and time.time() - self.unix_time_flush < TIME_FLUSH:
+                return False
+            self.write_to_files()
+            return True
+
+
+
+    """
+    Writes all measurements that have not been written yet.
+    """
+    def flush(self):
+        with self.lock:
+            if len(self.writers) > 0:
+                self.write_to_files()
+
+
+
+    """
+    Writes the data lines to the daily files.
+
+    @return     int, number of bytes written
     """
     def write_data_daily(self):
-        filepath = os.path.join(PATH_DATA, self.date_now+'_weather.txt')
+        lines_per_date = {}
+        for writer in self.writers:
+            lines_per_date.setdefault(writer.date_now, []).append(writer.line_data)
 
-        with open(filepath, 'a') as file_data:
-            file_data.write(self.line_data)
+        # the directory of a new station does not exist yet
+        os.makedirs(os.path.join(PATH_DATA, utils.get_station_dir(self.station, '')), exist_ok=True)
+        number_of_bytes = 0
+        for date, lines in lines_per_date.items():
+            data = ''.join(lines)
+            with open(os.path.join(PATH_DATA, utils.get_station_dir(self.station, date + '_weather.txt')), 'a') as file_data:
+                file_data.write(data)
+                utils.sync_file(file_data)
+            number_of_bytes += len(data.encode('utf-8'))
+        return number_of_bytes
 
         
         
     """
-    Writes the new data line to the continuous data file. 
-    After adding this new line of data, it checks if there 
+    Writes the new data lines to the continuous data file. 
+    After adding the new lines of data, it checks if there 
     are lines that are older than a given maximum time compared
-    to the time of the newly added line. If so, these line are removed.
+    to the time of the latest line. If so, these line are removed.
     
     @param filename     string, name of the file to be edited 
                         (24h, 7d, or 31d data file)
     @param time_max     int, maximum time (in seconds) between 
-                        the newly added data line and the oldest
+                        the latest data line and the oldest
                         data line still remaining in the file
+
+    @return             int, number of bytes written
     """
     def write_data_continuous(self, filename, time_max):
-        filepath = os.path.join(PATH_DATA, filename)
+        filepath = os.path.join(PATH_DATA, utils.get_station_dir(self.station, filename))
+        data_new = ''.join(writer.line_data for writer in self.writers).encode('utf-8')
         
-        with open(filepath, 'r') as file_temp:
-            lines = file_temp.readlines()
+        data_remaining = b''
+        if os.path.isfile(filepath):
+            with open(filepath, 'rb') as file_temp:
+                file_temp.seek(utils.get_offset_of_first_line_within_time_range(file_temp, self.writers[-1].unix_time_now - time_max))
+                data_remaining = file_temp.read()
         
-        count = utils.get_index_of_first_line_within_time_range(lines, self.unix_time_now, time_max)
-        
-        with open(filepath, 'w') as file_data:
-            file_data.writelines(lines[count:])
-            file_data.write(self.line_data)
+        with open(filepath, 'wb') as file_data:
+            file_data.write(data_remaining)
+            file_data.write(data_new)
+            utils.sync_file(file_data)
+        return len(data_remaining) + len(data_new)
 
 
 
     """
-    Writes the html index file and updates 
-    the 'Last Update: ' line of that file 
-    with the current date, time, and data.
+    Writes the new data to the ring buffer store of the continuous data.
+    If the store does not exist yet, the existing continuous text file 
+    (or the column files of an earlier append-only store) are imported first. 
+    If TIME_DATA or the maximum time have been changed, the store is resized.
+    Data older than the given maximum time expire when the ring wraps around.
+    For this station, the statistics of the last 24 hours for the web page
+    are computed from the mapped store as well (see self.summary).
+
+    @param dirname      string, name of the store directory
+    @param time_max     int, maximum time (in seconds) between 
+                        the new data and the oldest data
+                        still remaining in the store
+
+    @return             int, number of bytes written
     """
-    def write_html(self):
-        filepath = os.path.join(PATH_HTML, FILE_HTML)
+    def write_data_store(self, dirname, time_max):
+        store = DataStore(utils.get_station_dir(self.station, dirname), time_max//TIME_DATA)
+        filepath_text = os.path.join(PATH_DATA, utils.get_station_dir(self.station, FILE_CONTINUOUS))
         
-        with open(filepath, 'r') as file_temp:
-            lines_html = file_temp.readlines()
+        if store.is_empty() and not store.import_appended_columns() and os.path.isfile(filepath_text):
+            store.import_text_file(filepath_text)
+        if store.resize(time_max//TIME_DATA, TIME_DATA):
+            logging.warning(LOG_WARNING_STORE_RESIZED + store.path)
         
-        # Find line in html file containing the 'Last Update:' expression
-        for i in range(len(lines_html)):
-            if 'Last Update' in lines_html[i]:
-                break
-        
-        lines_html[i] = self.line_html
-        
-        with open(filepath, 'w') as file_index:
-            file_index.writelines(lines_html)
+        store.append_rows([writer.unix_time_now for writer in self.writers], [writer.values for writer in self.writers])
+        if self.station is None:
+            self.summary = page.get_summary_values(*store.read_columns(list(DICT_IDX_COLUMNS), self.writers[-1].unix_time_now - TIME_DAY))
+        return store.bytes_written
+
+
+
+    """
+    Writes the spread and the number of the samples of each 
+    measured quantity to the burst store.
+
+    @return     int, number of bytes written
+    """
+    def write_burst_stats(self):
+        store = BurstStore()
+        if store.resize(TIME_STORE_MAX//TIME_DATA, TIME_DATA):
+            logging.warning(LOG_WARNING_STORE_RESIZED + DIR_BURST)
+        store.append_rows([writer.unix_time_now for writer in self.writers], [writer.burst_values for writer in self.writers])
+        return store.bytes_written
+
+
+
+    """
+    Adds the new data to the rollup tiers. If a tier does not exist yet,
+    it is initialized from the data of the continuous data store.
+
+    @return     int, number of bytes written
+    """
+    def write_rollups(self):
+        number_of_bytes = 0
+        for tier in ROLLUP_TIERS:
+            store = RollupStore(tier, self.station)
+            if store.is_empty():
+                (unix_times, data) = DataStore(utils.get_station_dir(self.station, DIR_CONTINUOUS)).read_columns(list(DICT_IDX_COLUMNS))
+                store.import_rows(unix_times, dict(zip(DICT_IDX_COLUMNS, data)))
+            else:
+                store.update_rows([writer.unix_time_now for writer in self.writers], [writer.values for writer in self.writers])
+            number_of_bytes += store.bytes_written
+        return number_of_bytes
+
+
+
+    """
+    Adds the new data to the running statistics of the daily accumulator.
+
+    @return     int, number of bytes written
+    """
+    def write_accumulator(self):
+        accumulator = DailyAccumulator(utils.get_station_dir(self.station, FILE_DAILY_ACCUMULATOR))
+        for writer in self.writers:
+            accumulator.update(writer.unix_time_now, writer.values)
+        return accumulator.write()
+
+
+
+    """
+    Renders the html index file from its template with the values of
+    the latest measurement and the statistics of the last 24 hours.
+
+    @return     int, number of bytes written
+    """
+    def write_html(self):
+        values = dict(self.writers[-1].page_values)
+        values.update(self.summary)
+        return page.write_page(values)
+
+
+
+    """
+    Runs one of the write methods and adds its duration
+    and the number of bytes written to the metrics.
+
+    @param name         string, name of the written file
+    @param write        method, write method that returns the number of bytes written
+    @param arguments    arguments of the write method
+    """
+    def write_file(self, name, write, *arguments):
+        with metrics.span('write', name) as record:
+            record['bytes'] = write(*arguments)
+            record['rows'] = len(self.writers)
 
 
 
     """
-    Writes a new data line to the daily file, 
-    the 365 days data file, and the html file. 
+    Writes the new data lines to the daily files, the continuous data store 
+    (and optionally its text export and the burst store), the rollup tiers, 
+    the daily accumulator, and the html file. The burst store and the html
+    file are only written for this station. Then, the listeners are notified
+    of the written measurements. Afterwards, the measurements
+    are removed from the writer (even if a write has failed, so that
+    they are not written twice to the files that have succeeded).
     """
     def write_to_files(self):
-        self.write_data_daily()
-        self.write_data_continuous(FILE_CONTINUOUS, TIME_YEAR)
-        self.write_html()
+        try:
+            is_local = self.station is None
+            self.write_file(utils.get_station_dir(self.station, self.writers[-1].date_now+'_weather.txt'), self.write_data_daily)
+            self.write_file(utils.get_station_dir(self.station, DIR_CONTINUOUS), self.write_data_store, DIR_CONTINUOUS, TIME_STORE_MAX)
+            if STORE_BURST_STATS and is_local:
+                self.write_file(DIR_BURST, self.write_burst_stats)
+            self.write_file(utils.get_station_dir(self.station, 'rollups'), self.write_rollups)
+            self.write_file(utils.get_station_dir(self.station, FILE_DAILY_ACCUMULATOR), self.write_accumulator)
+            if EXPORT_CONTINUOUS_TEXT:
+                self.write_file(utils.get_station_dir(self.station, FILE_CONTINUOUS), self.write_data_continuous, FILE_CONTINUOUS, TIME_YEAR)
+            if is_local:
+                self.write_file(FILE_HTML, self.write_html)
+            for listener in listeners:
+                listener(self.station, self.writers)
+        finally:
+            self.writers = []
+            self.unix_time_flush = time.time()